@@ -0,0 +1,227 @@
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import resource
+import argparse
+import subprocess
+import multiprocessing
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument('-w', '--WORKLOADS', type=str, nargs='+', default=['startup', 'generation', 'classification'],
+                    choices=['startup', 'generation', 'classification'], dest='WORKLOADS',
+                    help="Which benchmarks to run")
+parser.add_argument('-ne', '--NUMBER_OF_EDGES', type=int, nargs='+', default=[9, 10, 11, 12], dest='NUMBER_OF_EDGES',
+                    help="Edge counts of the generation workloads")
+parser.add_argument('-cr', '--CONFINEMENT_RADIUS', type=float, nargs='+', default=[1.01, 1.1, 1.5],
+                    dest='CONFINEMENT_RADIUS', help="Confinement radii of the generation workloads")
+parser.add_argument('-mi', '--MAX_ITERATIONS', type=int, default=10000, dest='MAX_ITERATIONS',
+                    help="The number of polygons to generate in each generation workload")
+parser.add_argument('-rs', '--RANDOM_SEED', type=int, default=1003189127625852959, dest='RANDOM_SEED',
+                    help="Seed for every generation workload, so runs are comparable")
+parser.add_argument('-kd', '--KNOT_DIRECTORY', type=str, default='stick_number/mseq_knots', dest='KNOT_DIRECTORY',
+                    help="Directory of KnotPlot files to replay through the classifiers")
+parser.add_argument('-nk', '--NUMBER_OF_KNOTS', type=int, dest='NUMBER_OF_KNOTS',
+                    help="Only classify this many of the knot files (all by default)")
+parser.add_argument('-sm', '--STARTUP_MODULES', type=str, nargs='+',
+                    default=['identify_knot', 'generate_random_stick_knots'], dest='STARTUP_MODULES',
+                    help="Modules whose import time the startup workloads measure")
+parser.add_argument('-sr', '--STARTUP_REPEATS', type=int, default=5, dest='STARTUP_REPEATS',
+                    help="The number of fresh interpreters to time each import in; the median is reported")
+parser.add_argument('-st', '--STARTUP_TARGET', type=float, default=0.5, dest='STARTUP_TARGET',
+                    help="Seconds within which each module should import, beyond starting the interpreter. "
+                         "Slower imports are reported as regressions")
+parser.add_argument('-o', '--OUT', type=str, dest='OUT',
+                    help="Path to write the results as json")
+parser.add_argument('-c', '--COMPARE', type=str, dest='COMPARE',
+                    help="Path of an earlier json result to compare throughput against")
+parser.add_argument('-tol', '--TOLERANCE', type=float, default=0.1, dest='TOLERANCE',
+                    help="Fractional slowdown relative to --COMPARE which is reported as a regression")
+
+
+def peak_memory_kb():
+    #ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform == 'darwin' else peak
+
+
+def run_isolated(function, argument):
+    #runs each workload in a fresh process so peak memory is measured per workload
+    pool = multiprocessing.Pool(processes=1, maxtasksperchild=1)
+    try:
+        return pool.apply(function, (argument,))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def generation_workload(parameters):
+    import generate_random_stick_knots
+    from instrumentation import StageTimer
+    from identify_knot import classification_cache
+
+    num_edges, confinement_radius, max_iterations, random_seed = parameters
+    args = generate_random_stick_knots.parse_args(['-ne', str(num_edges), '-cr', str(confinement_radius),
+                                                   '-mi', str(max_iterations), '-rs', str(random_seed),
+                                                   '-csv', os.devnull])
+    classification_cache.clear()
+    generator = generate_random_stick_knots.StickKnotGenerator(args)
+    generator.timer = StageTimer()
+
+    start = time.time()
+    generator.run()
+    seconds = time.time() - start
+
+    stages = generator.timer.summary()
+    integrand_seconds = stages.get('integrand', {}).get('total_seconds', 0.0)
+    iterations = generator.step_counter['iteration']
+    return {
+        'name': 'generation/%d_edges/%s' % (num_edges, confinement_radius),
+        'polygons': iterations,
+        'seconds': seconds,
+        'polygons_per_second': iterations / seconds if seconds else None,
+        #everything outside the integrand is the Markov chain itself
+        'mcmc_seconds': seconds - integrand_seconds,
+        'stages': stages,
+        'peak_memory_kb': peak_memory_kb(),
+    }
+
+
+def time_import(module, repeats):
+    #median seconds to start a fresh interpreter and import the module (or nothing)
+    statement = 'import %s' % module if module else 'pass'
+    times = []
+    for i in range(repeats):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', statement], cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(time.time() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def startup_workload(module, repeats, target_seconds):
+    interpreter_seconds = time_import(None, repeats)
+    import_seconds = max(0.0, time_import(module, repeats) - interpreter_seconds)
+    return {
+        'name': 'startup/%s' % module,
+        'seconds': import_seconds,
+        'startups_per_second': 1.0 / import_seconds if import_seconds else None,
+        'interpreter_seconds': interpreter_seconds,
+        'target_seconds': target_seconds,
+        'meets_target': import_seconds <= target_seconds,
+    }
+
+
+def classification_workload(knot_files):
+    from identify_knot import get_vertices_from_file, plcurve_classify, pyknotid_classify, classification_cache
+    from instrumentation import StageTimer
+
+    classification_cache.clear()
+    timer = StageTimer()
+    matches = {'plcurve': 0, 'pyknotid': 0, 'pyknotid_ambiguous': 0}
+
+    start = time.time()
+    for knot_file in knot_files:
+        identifier = os.path.splitext(os.path.basename(knot_file))[0]
+        vertices = list(get_vertices_from_file(knot_file, sep='\t'))
+
+        stage_start = time.time()
+        plcurve_id = plcurve_classify(vertices)
+        timer.add('plcurve', time.time() - stage_start)
+        matches['plcurve'] += (plcurve_id == identifier)
+
+        stage_start = time.time()
+        pyknotid_id = pyknotid_classify(vertices)
+        timer.add('pyknotid', time.time() - stage_start)
+        if isinstance(pyknotid_id, list):
+            matches['pyknotid_ambiguous'] += (identifier in pyknotid_id)
+        else:
+            matches['pyknotid'] += (pyknotid_id == identifier)
+    seconds = time.time() - start
+
+    return {
+        'name': 'classification/%s' % os.path.basename(os.path.dirname(knot_files[0]) if knot_files else ''),
+        'polygons': len(knot_files),
+        'seconds': seconds,
+        'polygons_per_second': len(knot_files) / seconds if seconds else None,
+        'matches': matches,
+        'stages': timer.summary(),
+        'peak_memory_kb': peak_memory_kb(),
+    }
+
+
+def workload_rate(workload):
+    #polygons per second, or startups per second for the startup workloads
+    if 'startups_per_second' in workload:
+        return workload['startups_per_second']
+    return workload['polygons_per_second']
+
+
+def compare_results(results, baseline, tolerance):
+    #prints throughput relative to baseline and returns the names of regressed workloads
+    baseline_rates = dict((w['name'], workload_rate(w)) for w in baseline['workloads'])
+    regressions = []
+    print("\n%-40s %12s %12s %8s" % ('workload', 'baseline/s', 'current/s', 'ratio'))
+    for workload in results['workloads']:
+        old_rate = baseline_rates.get(workload['name'])
+        new_rate = workload_rate(workload)
+        if not old_rate or not new_rate:
+            continue
+        ratio = new_rate / old_rate
+        flag = ''
+        if ratio < 1.0 - tolerance:
+            regressions.append(workload['name'])
+            flag = ' REGRESSION'
+        print("%-40s %12.1f %12.1f %8.3f%s" % (workload['name'], old_rate, new_rate, ratio, flag))
+    return regressions
+
+
+if __name__ == "__main__":
+
+    args = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'workloads': [],
+    }
+
+    regressions = []
+
+    if 'startup' in args.WORKLOADS:
+        for module in args.STARTUP_MODULES:
+            workload = startup_workload(module, args.STARTUP_REPEATS, args.STARTUP_TARGET)
+            print("%s: %.3f s to import (target %.3f s)%s" % (workload['name'], workload['seconds'],
+                                                               args.STARTUP_TARGET,
+                                                               '' if workload['meets_target'] else ' TOO SLOW'))
+            if not workload['meets_target']:
+                regressions.append(workload['name'])
+            results['workloads'].append(workload)
+
+    if 'generation' in args.WORKLOADS:
+        for num_edges in args.NUMBER_OF_EDGES:
+            for confinement_radius in args.CONFINEMENT_RADIUS:
+                workload = run_isolated(generation_workload,
+                                        (num_edges, confinement_radius, args.MAX_ITERATIONS, args.RANDOM_SEED))
+                print("%s: %.1f polygons/s" % (workload['name'], workload['polygons_per_second'] or 0))
+                results['workloads'].append(workload)
+
+    if 'classification' in args.WORKLOADS:
+        knot_files = sorted(glob.glob(os.path.join(args.KNOT_DIRECTORY, '*.txt')))[:args.NUMBER_OF_KNOTS]
+        workload = run_isolated(classification_workload, knot_files)
+        print("%s: %.1f polygons/s" % (workload['name'], workload['polygons_per_second'] or 0))
+        results['workloads'].append(workload)
+
+    if args.OUT:
+        with open(args.OUT, 'w') as fout:
+            json.dump(results, fout, indent=2, sort_keys=True)
+
+    if args.COMPARE:
+        with open(args.COMPARE, 'r') as fin:
+            regressions += compare_results(results, json.load(fin), args.TOLERANCE)
+    if regressions:
+        sys.exit(1)
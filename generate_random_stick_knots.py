@@ -3,11 +3,23 @@ from libpl.pdcode import plctopology
 import numpy as np
 import random
 import sys
+import os
+import time
 from collections import Counter
-import pandas as pd
 import pickle
 import argparse
-from identify_knot import pyknotid_classify, knot_string_to_tuple, knot_tuple_to_string
+from result_writer import ResultWriter
+from polygon_store import PolygonRecordWriter
+from seeds import derive_seed
+from instrumentation import StageTimer, ProgressReporter, EffectiveSampleSize
+from knot_counts import knot_label
+from knot_tables import equilateral_stick_number, has_non_unique_homfly, superbridge_index_bounds, knot_string_to_tuple, \
+    knot_tuple_to_string
+from superbridge import superbridge_number
+from pipeline import run_pipeline, cache_settings
+from stick_geometry import random_unit_vectors, is_certified_unknot, batch_certified_unknots, is_straight_line_isotopic
+from identify_knot import pyknotid_classify, classification_cache, homfly_index, disambiguator, DISAMBIGUATION_STAGE_NAMES, \
+    configure_caches
 
 
 ##################
@@ -28,313 +40,120 @@ parser.add_argument('-v', '--VERBOSITY', type=int, default=2, dest='VERBOSITY',
                     help="Verbosity level")
 parser.add_argument('-csv', '--CSV_OUT', type=str, dest='CSV_OUT',
                     help="The path to output results as csv. If not provided will print to command line")
+parser.add_argument('-pq', '--PARQUET_OUT', type=str, dest='PARQUET_OUT',
+                    help="The path to additionally output results as parquet (requires pyarrow)")
+parser.add_argument('-bin', '--BINARY_OUT', type=str, dest='BINARY_OUT',
+                    help="The path to write the recorded polygons to as binary records (see polygon_store.py), "
+                         "instead of as text in the string_repr column")
+parser.add_argument('-bp', '--BINARY_PRECISION', type=str, default='f8', choices=['f4', 'f8'], dest='BINARY_PRECISION',
+                    help="Store binary vertex coordinates as float64 (f8) or float32 (f4)")
+parser.add_argument('-blw', '--BINARY_LABEL_WIDTH', type=int, default=64, dest='BINARY_LABEL_WIDTH',
+                    help="Characters of knot label each binary record, and spool record, has room for. A longer "
+                         "label, such as a long list of candidates, stops the run")
+parser.add_argument('-sp', '--SPOOL_OUT', type=str, dest='SPOOL_OUT',
+                    help="Instead of classifying polygons which need pyknotid during the run, append them to this "
+                         "binary polygon file and count them as Pending, for reclassify_spool.py to settle later. "
+                         "Cannot be combined with -tk")
+parser.add_argument('-cs', '--CHUNK_SIZE', type=int, default=10000, dest='CHUNK_SIZE',
+                    help="The number of recorded knots to buffer before writing them out")
 parser.add_argument('-kc', '--KNOT_COUNTS_OUT', type=str, dest='KNOT_COUNTS_OUT',
                     help="The path to output knot frequency counts as a pickled python object")
 parser.add_argument('-rs', '--RANDOM_SEED', type=int, dest='RANDOM_SEED',
                     help="Integer seed for the random number generator")
+parser.add_argument('-pf', '--PREFILTER_PROJECTIONS', type=int, default=0, dest='PREFILTER_PROJECTIONS',
+                    help="Number of random projections to check before classifying; polygons with a projection "
+                         "of fewer than 3 crossings are counted as unknots without calling plCurve. 0 disables")
+parser.add_argument('-pfv', '--PREFILTER_VERIFY', type=float, default=0.0, dest='PREFILTER_VERIFY',
+                    help="Fraction of prefiltered unknots to also classify with plCurve, to validate the prefilter")
+parser.add_argument('-cc', '--CLASSIFICATION_CACHE', type=str, dest='CLASSIFICATION_CACHE',
+                    help="Path of a file in which to keep the pyknotid classification cache between runs")
+parser.add_argument('-ccs', '--CLASSIFICATION_CACHE_SIZE', type=int, default=100000, dest='CLASSIFICATION_CACHE_SIZE',
+                    help="Maximum number of invariant tuples to keep in the pyknotid classification cache")
+parser.add_argument('-hi', '--HOMFLY_INDEX', type=str, dest='HOMFLY_INDEX',
+                    help="Path of a file in which to keep an index from HOMFLY polynomials to catalogue knots. "
+                         "If given, polygons whose HOMFLY matches exactly one catalogue knot are identified "
+                         "from the HOMFLY alone")
+parser.add_argument('-dc', '--DISAMBIGUATION_CACHE', type=str, dest='DISAMBIGUATION_CACHE',
+                    help="Path of a file in which to keep the catalogue invariants of each set of candidate knots "
+                         "pyknotid can't decide between. If given, such polygons go through the disambiguation "
+                         "stages, cheapest first, until one candidate is left")
+parser.add_argument('-ds', '--DISAMBIGUATION_STAGES', type=str, nargs='+', choices=DISAMBIGUATION_STAGE_NAMES,
+                    dest='DISAMBIGUATION_STAGES',
+                    help="With -dc, only use these disambiguation stages. By default all are used")
+parser.add_argument('-pi', '--PROGRESS_INTERVAL', type=int, default=0, dest='PROGRESS_INTERVAL',
+                    help="Print a progress line with throughput and time remaining every this many seconds. 0 disables")
+parser.add_argument('-so', '--STATS_OUT', type=str, dest='STATS_OUT',
+                    help="The path to periodically write per-stage timings and counts as json")
+parser.add_argument('-th', '--THIN', type=int, default=1, dest='THIN',
+                    help="Only classify every k-th polygon of the chain, skipping the others entirely")
+parser.add_argument('-rc', '--REUSE_CLASSIFICATION', action='store_true', dest='REUSE_CLASSIFICATION',
+                    help="Reuse the last classification when the polygon provably has the same knot type as the "
+                         "last classified polygon, because no edge can have passed through another since")
+parser.add_argument('-nc', '--NUM_CHAINS', type=int, default=1, dest='NUM_CHAINS',
+                    help="Split the run between this many independent Markov chains, each seeded from the random "
+                         "seed, whose polygons are collected and classified in batches")
+parser.add_argument('-bs', '--CLASSIFY_BATCH_SIZE', type=int, default=1000, dest='CLASSIFY_BATCH_SIZE',
+                    help="With more than one chain, the number of polygons to collect before classifying them")
+parser.add_argument('-pw', '--PIPELINE_WORKERS', type=int, default=0, dest='PIPELINE_WORKERS',
+                    help="Run the chains (see -nc) in their own processes, handing polygons through shared memory "
+                         "to this many classifier processes, so sampling never waits on classification. 0 disables")
+parser.add_argument('-psw', '--PIPELINE_SLOW_WORKERS', type=int, default=1, dest='PIPELINE_SLOW_WORKERS',
+                    help="With -pw, the number of separate processes classifying the polygons which need pyknotid")
+parser.add_argument('-psl', '--PIPELINE_SLOTS', type=int, default=4096, dest='PIPELINE_SLOTS',
+                    help="With -pw, the number of polygons which can be waiting for classification before the "
+                         "chains pause")
+parser.add_argument('-tk', '--TARGET_KNOTS', type=str, nargs='+', dest='TARGET_KNOTS',
+                    help="Search for these knots (e.g. 9_29 10_83): only polygons of these knot types are written, "
+                         "and the run stops once all of them have been found")
+parser.add_argument('-sb', '--SUPERBRIDGE', action='store_true', dest='SUPERBRIDGE',
+                    help="Compute the superbridge number of each polygon of a knot whose superbridge index is not "
+                         "known exactly, and write polygons which lower the upper bound of "
+                         "superbridge_index/superbridge_values.csv with status SBRIDGE")
+parser.add_argument('-cp', '--CHECKPOINT', type=str, dest='CHECKPOINT',
+                    help="Path of a checkpoint file. The run is saved there periodically, and if the file "
+                         "already exists the run resumes from it")
+parser.add_argument('-ci', '--CHECKPOINT_ITERATIONS', type=int, default=1000000, dest='CHECKPOINT_ITERATIONS',
+                    help="The number of polygons to generate between checkpoints, and between checks whether "
+                         "all target knots have been found")
+
+
+#run parameters which must agree between a checkpoint and the run resuming from it
+CHECKPOINT_PARAMETERS = ['CONFINEMENT_RADIUS', 'NUMBER_OF_EDGES', 'MAX_ITERATIONS', 'VERBOSITY',
+                         'RANDOM_SEED', 'CHECKPOINT_ITERATIONS', 'PREFILTER_PROJECTIONS', 'THIN',
+                         'REUSE_CLASSIFICATION', 'TARGET_KNOTS']
+
+
+def parse_args(argv=None):
+    #argv is a list of command line arguments, as for the command line itself
+    args = parser.parse_args(argv)
+    if args.TARGET_KNOTS:
+        for knot in args.TARGET_KNOTS:
+            if knot_string_to_tuple(knot) is None:
+                parser.error("Could not parse target knot %s" % knot)
+        #a spooled polygon of a target knot would never be counted as found
+        if args.SPOOL_OUT:
+            parser.error("-sp cannot be combined with -tk: target knots must be classified during the run")
+    if not args.RANDOM_SEED:
+        args.RANDOM_SEED = int(random.getrandbits(64))
+    return args
 
-args = parser.parse_args()
 
 BURN_IN_ITERATIONS = 101 #appears to be default for plCurve
-
-#############
-### SETUP ###
-#############
-
-rng = plcurve.RandomGenerator()
-rp = tsmcmc.RunParameters.default_confined()
-
-if not args.RANDOM_SEED:
-    args.RANDOM_SEED = int(random.getrandbits(64))
-rng.set(args.RANDOM_SEED)
-
-knot_counter = Counter()
-step_counter = Counter() #this has to be a Counter object because of cython weirdness
-
-#to log information about the generated polygons
-df = pd.DataFrame(columns=['random_seed', 'is_best', 'knot', 'num_edges', 'confinement_radius', 'string_repr'])
-
-#best-known stick numbers for minimal stick knots
-#http://www.colab.sfu.ca/KnotPlot/sticknumbers/
-#now updated with results from new paper
-stick_numbers = {
-(0, 1):[3, 3],
-(3, 1):[6, 6],
-(4, 1):[7, 7],
-(5, 1):[8, 8],
-(5, 2):[8, 8],
-(6, 1):[8, 8],
-(6, 2):[8, 8],
-(6, 3):[8, 8],
-(7, 1):[9, 9],
-(7, 2):[9, 9],
-(7, 3):[9, 9],
-(7, 4):[9, 9],
-(7, 5):[9, 9],
-(7, 6):[9, 9],
-(7, 7):[9, 9],
-(8, 1):[10, 10],
-(8, 2):[10, 10],
-(8, 3):[10, 10],
-(8, 4):[10, 10],
-(8, 5):[10, 10],
-(8, 6):[10, 10],
-(8, 7):[10, 10],
-(8, 8):[10, 10],
-(8, 9):[10, 10],
-(8, 10):[10, 10],
-(8, 11):[10, 10],
-(8, 12):[10, 10],
-(8, 13):[10, 10],
-(8, 14):[10, 10],
-(8, 15):[10, 10],
-(8, 16):[9, 9],
-(8, 17):[9, 9],
-(8, 18):[9, 9],
-(8, 19):[8, 8],
-(8, 20):[8, 8],
-(8, 21):[9, 9],
-(9, 1):[10, 10],
-(9, 2):[10, 10],
-(9, 3):[10, 10],
-(9, 4):[10, 10],
-(9, 5):[10, 10],
-(9, 6):[11, 11],
-(9, 7):[10, 10],
-(9, 8):[10, 10],
-(9, 9):[10, 10],
-(9, 10):[10, 10],
-(9, 11):[10, 10],
-(9, 12):[10, 10],
-(9, 13):[10, 10],
-(9, 14):[10, 10],
-(9, 15):[10, 10],
-(9, 16):[10, 10],
-(9, 17):[10, 10],
-(9, 18):[10, 10],
-(9, 19):[10, 10],
-(9, 20):[10, 10],
-(9, 21):[10, 10],
-(9, 22):[10, 10],
-(9, 23):[11, 11],
-(9, 24):[10, 10],
-(9, 25):[10, 10],
-(9, 26):[10, 10],
-(9, 27):[10, 10],
-(9, 28):[10, 10],
-(9, 29):[9, 10],
-(9, 30):[10, 10],
-(9, 31):[10, 10],
-(9, 32):[10, 10],
-(9, 33):[10, 10],
-(9, 34):[9, 9],
-(9, 35):[9, 9],
-(9, 36):[11, 11],
-(9, 37):[10, 10],
-(9, 38):[10, 10],
-(9, 39):[9, 9],
-(9, 40):[9, 9],
-(9, 41):[9, 9],
-(9, 42):[9, 9],
-(9, 43):[9, 9],
-(9, 44):[9, 9],
-(9, 45):[9, 9],
-(9, 46):[9, 9],
-(9, 47):[9, 9],
-(9, 48):[9, 9],
-(9, 49):[9, 9],
-(10, 1):[11, 11],
-(10, 2):[11, 11],
-(10, 3):[11, 11],
-(10, 4):[11, 11],
-(10, 5):[11, 11],
-(10, 6):[11, 11],
-(10, 7):[11, 11],
-(10, 8):[10, 10],
-(10, 9):[11, 11],
-(10, 10):[11, 11],
-(10, 11):[11, 11],
-(10, 12):[11, 11],
-(10, 13):[11, 11],
-(10, 14):[11, 11],
-(10, 15):[11, 11],
-(10, 16):[10, 10],
-(10, 17):[10, 10],
-(10, 18):[10, 10],
-(10, 19):[11, 11],
-(10, 20):[11, 11],
-(10, 21):[11, 11],
-(10, 22):[11, 11],
-(10, 23):[11, 11],
-(10, 24):[11, 11],
-(10, 25):[11, 11],
-(10, 26):[11, 11],
-(10, 27):[11, 11],
-(10, 28):[11, 11],
-(10, 29):[11, 11],
-(10, 30):[11, 11],
-(10, 31):[11, 11],
-(10, 32):[11, 11],
-(10, 33):[11, 11],
-(10, 34):[11, 11],
-(10, 35):[11, 11],
-(10, 36):[11, 11],
-(10, 37):[12, 12],
-(10, 38):[11, 11],
-(10, 39):[11, 11],
-(10, 40):[11, 11],
-(10, 41):[11, 11],
-(10, 42):[11, 11],
-(10, 43):[11, 11],
-(10, 44):[11, 11],
-(10, 45):[11, 11],
-(10, 46):[11, 11],
-(10, 47):[11, 11],
-(10, 48):[10, 10],
-(10, 49):[11, 11],
-(10, 50):[11, 11],
-(10, 51):[11, 11],
-(10, 52):[11, 11],
-(10, 53):[11, 11],
-(10, 54):[11, 11],
-(10, 55):[11, 11],
-(10, 56):[10, 10],
-(10, 57):[11, 11],
-(10, 58):[11, 11],
-(10, 59):[11, 11],
-(10, 60):[11, 11],
-(10, 61):[11, 11],
-(10, 62):[11, 11],
-(10, 63):[11, 11],
-(10, 64):[11, 11],
-(10, 65):[11, 11],
-(10, 66):[11, 11],
-(10, 67):[11, 11],
-(10, 68):[10, 10],
-(10, 69):[11, 11],
-(10, 70):[11, 11],
-(10, 71):[11, 11],
-(10, 72):[11, 11],
-(10, 73):[11, 11],
-(10, 74):[11, 11],
-(10, 75):[11, 11],
-(10, 76):[12, 12],
-(10, 77):[11, 11],
-(10, 78):[11, 11],
-(10, 79):[11, 11],
-(10, 80):[11, 11],
-(10, 81):[11, 11],
-(10, 82):[10, 10],
-(10, 83):[11, 11],
-(10, 84):[10, 10],
-(10, 85):[10, 10],
-(10, 86):[11, 11],
-(10, 87):[11, 11],
-(10, 88):[11, 11],
-(10, 89):[11, 11],
-(10, 90):[10, 10],
-(10, 91):[10, 10],
-(10, 92):[11, 11],
-(10, 93):[10, 10],
-(10, 94):[10, 10],
-(10, 95):[11, 11],
-(10, 96):[11, 11],
-(10, 97):[11, 11],
-(10, 98):[11, 11],
-(10, 99):[11, 11],
-(10, 100):[10, 10],
-(10, 101):[11, 11],
-(10, 102):[10, 10],
-(10, 103):[10, 10],
-(10, 104):[10, 10],
-(10, 105):[10, 10],
-(10, 106):[10, 10],
-(10, 107):[10, 10],
-(10, 108):[10, 10],
-(10, 109):[10, 10],
-(10, 110):[10, 10],
-(10, 111):[10, 10],
-(10, 112):[10, 10],
-(10, 113):[10, 10],
-(10, 114):[10, 10],
-(10, 115):[10, 10],
-(10, 116):[10, 10],
-(10, 117):[10, 10],
-(10, 118):[10, 10],
-(10, 119):[10, 10],
-(10, 120):[10, 10],
-(10, 121):[10, 10],
-(10, 122):[10, 10],
-(10, 123):[11, 11],
-(10, 124):[10, 10],
-(10, 125):[10, 10],
-(10, 126):[10, 10],
-(10, 127):[10, 10],
-(10, 128):[10, 10],
-(10, 129):[10, 10],
-(10, 130):[10, 10],
-(10, 131):[10, 10],
-(10, 132):[10, 10],
-(10, 133):[10, 10],
-(10, 134):[10, 10],
-(10, 135):[10, 10],
-(10, 136):[10, 10],
-(10, 137):[10, 10],
-(10, 138):[10, 10],
-(10, 139):[10, 10],
-(10, 140):[10, 10],
-(10, 141):[10, 10],
-(10, 142):[10, 10],
-(10, 143):[10, 10],
-(10, 144):[10, 10],
-(10, 145):[10, 10],
-(10, 146):[10, 10],
-(10, 147):[10, 10],
-(10, 148):[10, 10],
-(10, 149):[10, 10],
-(10, 150):[10, 10],
-(10, 151):[10, 10],
-(10, 152):[10, 10],
-(10, 153):[10, 10],
-(10, 154):[11, 11],
-(10, 155):[10, 10],
-(10, 156):[10, 10],
-(10, 157):[10, 10],
-(10, 158):[10, 10],
-(10, 159):[10, 10],
-(10, 160):[10, 10],
-(10, 161):[10, 10],
-(10, 162):[10, 10],
-(10, 163):[10, 10],
-(10, 164):[10, 10],
-(10, 165):[10, 10]
-}
-
-#All the knots <= 10 crossings which are known to have non-unique HOMFLYs
-#We must double-check any identified as this type through pyknotid
-non_unique_homfly_knots = set(
-['10_35', '10_129', '10_122', '10_127', '9_36', '9_33', '9_32', '10_96',
-'10_32', '10_33', '10_30', '10_31', '10_34', '10_38', '10_39', '9_7', '10_137',
-'10_132', '9_20', '9_22', '9_26', '9_27', '9_28', '10_23', '10_22', '10_25',
-'9_9', '10_27', '10_29', '10_28', '9_8', '10_103', '10_102', '10_100', '10_107',
-'10_106', '10_105', '10_109', '10_108', '9_14', '9_17', '9_16', '9_11', '6_2',
-'8_16', '8_14', '9_19', '10_54', '10_56', '10_50', '10_51', '10_52', '8_6',
-'8_7', '8_4', '8_5', '10_59', '8_9', '10_89', '10_110', '10_111', '10_112',
-'10_114', '10_116', '10_117', '10_119', '8_8', '10_150', '10_49', '10_57',
-'10_43', '10_42', '10_41', '10_40', '10_47', '10_46', '10_45', '10_44', '8_2',
-'10_162', '5_1', '7_5', '7_1', '7_3', '10_76', '10_75', '10_72', '10_70',
-'9_31', '10_69', '10_68', '10_66', '10_60', '10_90', '10_92', '10_93', '10_94',
-'10_95', '10_149', '10_141', '10_82', '10_18', '10_19', '10_10', '10_14',
-'10_15', '10_16', '9_18', '10_155', '10_156', '10_9', '9_41', '10_2', '10_5',
-'10_87', '10_86', '10_85', '10_84', '10_83', '10_81', '10_80', '10_157',
-'10_88'])
-
+UNKNOT_TUPLE = ((0, 1),)
+#the knot counter entry of polygons spooled for later classification
+PENDING_LABEL = "Pending"
 
 
 ###############
 ### METHODS ###
 ###############
 
+def make_plcurve(vertices):
+    plc = plcurve.PlCurve()
+    plc.add_component([tuple(v) for v in np.asarray(vertices).tolist()])
+    return plc
+
+
 def make_knotplot_polygon_string(poly):
     #should change tabs to newlines before knotplot
     return '\t'.join(map(lambda x: "%s %s %s" % (x[0], x[1], x[2]), poly))
@@ -345,118 +164,687 @@ def get_numpy_coordinate_array(plc):
 
 
 def is_best_known_equilateral_stick_number(crossing_number, index, edges):
-    prime_knot_tuple = (crossing_number, index)
-    if prime_knot_tuple in stick_numbers:
-        if stick_numbers[prime_knot_tuple][1] > edges:
+    #the table is loaded from stick_number/stick_number_upper_bounds.csv, see knot_tables
+    sticks = equilateral_stick_number(crossing_number, index)
+    if sticks is not None:
+        if sticks > edges:
             return True #EUREKA!
-        elif stick_numbers[prime_knot_tuple][1] == edges:
+        elif sticks == edges:
             return None #Equivalent to best known
         else:
             return False #Worse than best known, not interesting
 
 
-def integrand(plc):
-
-    step_counter['iteration'] += 1
-    num_factors, crossing_num, ind, num_poss = plctopology.plc_classify_knot(rng, plc)
+class StickKnotGenerator(object):
+    """Holds the state of one generation run: the random generators, knot counts and recorded knots.
+
+    The integrand method is the callback handed to tsmcmc, which classifies and
+    records each polygon the Markov chain produces.
+
+    With thinning only every THIN-th polygon is counted. With
+    REUSE_CLASSIFICATION a polygon which is certainly isotopic to the last
+    classified polygon of the same chain (see
+    stick_geometry.is_straight_line_isotopic) is counted with the same knot type
+    without being classified again. Either way the counted samples stay
+    correlated, so an effective sample size is estimated for each knot type.
+
+    With more than one chain, the chains are run one after another with seeds
+    derived from the random seed and the chain number. The callback only copies
+    each polygon into a buffer, and a full buffer is classified at once (the
+    prefilter is applied to the whole batch) using a separate random generator,
+    so each chain's polygons depend only on its own seed.
+
+    In pipeline mode the chains run at the same time in their own processes,
+    and their polygons are classified by separate worker processes (see
+    pipeline.run_pipeline). This process only counts and records them.
+
+    With target knots, only polygons of those knot types are written, and the
+    run is generated in segments (as for checkpointing) so that it can stop
+    once every target has been found. `found_targets` may be a dictionary shared
+    with other processes (see generate_stick_knots_batch.py), in which case
+    targets found by any of them count.
+
+    With a checkpoint file the run is split into segments of CHECKPOINT_ITERATIONS
+    polygons. Each segment is a separate chain whose seed is derived from the
+    random seed and the segment number, and the state is saved after each one,
+    so a resumed run produces exactly what an uninterrupted run would have.
+    """
+
+    def __init__(self, args, found_targets=None):
+        self.args = args
+
+        self.rng = plcurve.RandomGenerator()
+        self.rng.set(args.RANDOM_SEED)
+        self.rp = tsmcmc.RunParameters.default_confined()
+        #used by the classifiers; separate from the chain's generator when running several chains
+        self.classify_rng = self.rng
+
+        self.knot_counter = Counter()
+        self.step_counter = Counter() #this has to be a Counter object because of cython weirdness
+        self.prefilter_counter = Counter()
+
+        #the prefilter draws its projection directions from its own seeded stream
+        self.prefilter_random_state = np.random.RandomState([args.RANDOM_SEED & 0xffffffff, args.RANDOM_SEED >> 32])
+
+        #optional instrumentation.StageTimer, timing the stages of each sample
+        self.timer = None
+        self.progress = None
+        if args.PROGRESS_INTERVAL or args.STATS_OUT:
+            self.timer = StageTimer()
+        #how samples made their way through the classifiers
+        self.path_counter = Counter()
+
+        #the last classified polygon of the current chain and its knot type, for REUSE_CLASSIFICATION
+        self.reference_vertices = None
+        self.reference_knot = None
+        self.ess = None
+        #batch means need the samples in chain order, which the pipeline doesn't keep
+        if (args.THIN > 1 or args.REUSE_CLASSIFICATION) and not args.PIPELINE_WORKERS:
+            self.ess = EffectiveSampleSize(int(np.sqrt(args.MAX_ITERATIONS // args.THIN)))
+
+        #knot tuples to search for, those found by this process, and the (possibly shared) record of those found
+        self.target_knots = None
+        if args.TARGET_KNOTS:
+            self.target_knots = set(knot_string_to_tuple(knot) for knot in args.TARGET_KNOTS)
+        self.found_targets = set()
+        self.shared_found_targets = found_targets
+
+        #with SUPERBRIDGE, the number of polygons checked and the smallest superbridge number seen of each knot
+        self.superbridge_counter = Counter()
+        self.superbridge_minima = {}
+
+        self.segment = 0
+        self.elapsed_seconds = 0.0
+        if args.PIPELINE_WORKERS:
+            if args.CHECKPOINT or args.TARGET_KNOTS or args.REUSE_CLASSIFICATION:
+                raise ValueError("Checkpointing, target knots and reusing classifications are not supported "
+                                 "in pipeline mode")
+            if args.PIPELINE_SLOW_WORKERS < 1:
+                raise ValueError("Pipeline mode needs at least one slow worker")
+        elif args.NUM_CHAINS > 1:
+            if args.CHECKPOINT or args.TARGET_KNOTS:
+                raise ValueError("Checkpointing and target knots are not supported with more than one chain")
+            self.classify_rng = plcurve.RandomGenerator()
+            self.classify_rng.set(derive_seed(args.RANDOM_SEED, 'classify'))
+            self.batch_vertices = np.empty((args.CLASSIFY_BATCH_SIZE, args.NUMBER_OF_EDGES, 3))
+            self.batch_iterations = np.empty(args.CLASSIFY_BATCH_SIZE, dtype=np.int64)
+            #'size' is the number of filled slots, 'collected' the polygons collected so far over all chains
+            self.batch_counter = Counter()
+
+        checkpoint = self.load_checkpoint()
+
+        #to log information about the generated polygons, written out in chunks as we go
+        self.writer = ResultWriter(args.CSV_OUT, args.PARQUET_OUT, args.CHUNK_SIZE,
+                                   resume_offset=checkpoint['csv_offset'] if checkpoint else None,
+                                   binary_out=args.BINARY_OUT, num_edges=args.NUMBER_OF_EDGES,
+                                   binary_precision=args.BINARY_PRECISION, binary_label_width=args.BINARY_LABEL_WIDTH,
+                                   binary_resume_offset=checkpoint.get('binary_offset') if checkpoint else None)
+        if checkpoint:
+            self.writer.status_counts.update(checkpoint['status_counts'])
+
+        #polygons left for reclassify_spool.py, appended one at a time as they are rare
+        self.spool = None
+        if args.SPOOL_OUT:
+            self.spool = PolygonRecordWriter(args.SPOOL_OUT, args.NUMBER_OF_EDGES, label_width=args.BINARY_LABEL_WIDTH,
+                                             resume_offset=checkpoint.get('spool_offset') if checkpoint else None)
+
+    def load_checkpoint(self):
+        args = self.args
+        if not (args.CHECKPOINT and os.path.exists(args.CHECKPOINT)):
+            return None
+        if args.PARQUET_OUT:
+            raise ValueError("Parquet output cannot be resumed from a checkpoint")
+
+        with open(args.CHECKPOINT, 'rb') as fin:
+            checkpoint = pickle.load(fin)
+        for name in CHECKPOINT_PARAMETERS:
+            if checkpoint['parameters'][name] != getattr(args, name):
+                raise ValueError("Checkpoint %s was made with %s=%s, not %s" %
+                                 (args.CHECKPOINT, name, checkpoint['parameters'][name], getattr(args, name)))
+
+        self.knot_counter.update(checkpoint['knot_counter'])
+        self.prefilter_counter.update(checkpoint['prefilter_counter'])
+        self.step_counter['iteration'] = checkpoint['iteration']
+        self.segment = checkpoint['segment']
+        self.elapsed_seconds = checkpoint['elapsed_seconds']
+        self.path_counter.update(checkpoint['path_counter'])
+        self.ess = checkpoint['ess']
+        self.found_targets.update(checkpoint['found_targets'])
+        self.superbridge_counter.update(checkpoint.get('superbridge_counter', {}))
+        self.superbridge_minima.update(checkpoint.get('superbridge_minima', {}))
+        return checkpoint
+
+    def save_checkpoint(self, complete=False):
+        args = self.args
+        checkpoint = {
+            'parameters': dict((name, getattr(args, name)) for name in CHECKPOINT_PARAMETERS),
+            'complete': complete,
+            'segment': self.segment,
+            'iteration': self.step_counter['iteration'],
+            'elapsed_seconds': self.elapsed_seconds,
+            'knot_counter': self.knot_counter,
+            'prefilter_counter': self.prefilter_counter,
+            'path_counter': self.path_counter,
+            'ess': self.ess,
+            'found_targets': self.found_targets,
+            'superbridge_counter': self.superbridge_counter,
+            'superbridge_minima': self.superbridge_minima,
+            'csv_offset': self.writer.csv_offset(),
+            'binary_offset': self.writer.binary_offset(),
+            'spool_offset': self.spool.offset() if self.spool is not None else None,
+            'status_counts': self.writer.status_counts,
+        }
+        #write then rename, so a job killed mid-write leaves the previous checkpoint intact
+        with open(args.CHECKPOINT + '.tmp', 'wb') as fout:
+            pickle.dump(checkpoint, fout, protocol=2)
+        os.rename(args.CHECKPOINT + '.tmp', args.CHECKPOINT)
+        if args.CLASSIFICATION_CACHE:
+            classification_cache.save(args.CLASSIFICATION_CACHE)
+        if args.HOMFLY_INDEX:
+            homfly_index.save(args.HOMFLY_INDEX)
+        if args.DISAMBIGUATION_CACHE:
+            disambiguator.save(args.DISAMBIGUATION_CACHE)
+
+    def record_knot(self, is_best, knot, plc):
+        if self.timer is None:
+            return self.write_knot(is_best, knot, plc)
+        start = time.time()
+        self.write_knot(is_best, knot, plc)
+        self.timer.add('record', time.time() - start)
+
+    def write_knot(self, is_best, knot, plc):
+        args = self.args
+        vertices = get_numpy_coordinate_array(plc)
+        if args.BINARY_OUT:
+            self.writer.record(self.step_counter['iteration'], args.RANDOM_SEED, is_best, knot, args.NUMBER_OF_EDGES,
+                               args.CONFINEMENT_RADIUS, '', vertices=vertices, label=knot_label(knot))
+        else:
+            self.writer.record(self.step_counter['iteration'], args.RANDOM_SEED, is_best, knot, args.NUMBER_OF_EDGES,
+                               args.CONFINEMENT_RADIUS, make_knotplot_polygon_string(vertices))
+
+    def classify_plcurve(self, plc):
+        if self.timer is None:
+            return plctopology.plc_classify_knot(self.classify_rng, plc)
+        start = time.time()
+        result = plctopology.plc_classify_knot(self.classify_rng, plc)
+        self.timer.add('plcurve', time.time() - start)
+        return result
+
+    def classify_pyknotid(self, plc):
+        if self.timer is None:
+            return pyknotid_classify(get_numpy_coordinate_array(plc))
+        start = time.time()
+        result = pyknotid_classify(get_numpy_coordinate_array(plc))
+        self.timer.add('pyknotid', time.time() - start)
+        return result
+
+    def is_prefiltered_unknot(self, plc):
+        if self.timer is None:
+            return self.check_prefilter(plc)
+        start = time.time()
+        result = self.check_prefilter(plc)
+        self.timer.add('prefilter', time.time() - start)
+        return result
+
+    def check_prefilter(self, plc):
+        #cheap check that some random projection has fewer than 3 crossings
+        directions = random_unit_vectors(self.prefilter_random_state, self.args.PREFILTER_PROJECTIONS)
+        if not is_certified_unknot(get_numpy_coordinate_array(plc), directions):
+            return False
+        self.prefilter_counter['unknots'] += 1
+        self.verify_prefilter(plc)
+        return True
+
+    def verify_prefilter(self, plc):
+        if self.args.PREFILTER_VERIFY and (self.prefilter_random_state.random_sample() < self.args.PREFILTER_VERIFY):
+            #check the prefilter against the full classification
+            self.prefilter_counter['verified'] += 1
+            num_factors, crossing_num, ind, num_poss = plctopology.plc_classify_knot(self.classify_rng, plc)
+            try:
+                knot_tuple = tuple(sorted(zip(crossing_num[:num_factors],ind[:num_factors])))
+            except TypeError:
+                knot_tuple = None
+            if knot_tuple != UNKNOT_TUPLE:
+                self.prefilter_counter['disagreements'] += 1
+
+    def integrand(self, plc):
+        self.step_counter['iteration'] += 1
+
+        if self.is_thinned(self.step_counter['iteration']) or self.all_targets_found():
+            return 0
+        if self.args.REUSE_CLASSIFICATION and self.reuse_classification(plc):
+            return 0
 
-    knot_tuple = None
-    used_pyknotid = False
-    try:
-        knot_tuple = tuple(sorted(zip(crossing_num[:num_factors],ind[:num_factors])))
-    except TypeError:
-        #Try pyknotid, maybe the knot has more than 10 crossings
-        candidates = pyknotid_classify(get_numpy_coordinate_array(plc))
+        prefiltered = self.args.PREFILTER_PROJECTIONS and self.is_prefiltered_unknot(plc)
+        self.classify_sample(plc, prefiltered)
+        return 0 #return value irrelevant
+
+    def is_thinned(self, iteration):
+        if (self.args.THIN > 1) and (iteration % self.args.THIN):
+            self.path_counter['thinned'] += 1
+            return True
+        return False
+
+    def reuse_classification(self, plc):
+        if self.reference_vertices is None:
+            return False
+        start = time.time()
+        vertices = get_numpy_coordinate_array(plc)
+        isotopic = is_straight_line_isotopic(self.reference_vertices, vertices)
+        if self.timer is not None:
+            self.timer.add('reuse_check', time.time() - start)
+        if not isotopic:
+            return False
+        self.path_counter['reused'] += 1
+        self.count_knot(self.reference_knot, plc)
+        return True
+
+    def set_reference(self, knot_tuple, plc):
+        if self.args.REUSE_CLASSIFICATION:
+            #a copy, since the walk goes on to move this polygon's vertices in place
+            self.reference_vertices = None if knot_tuple is None else \
+                np.array(get_numpy_coordinate_array(plc), dtype=np.float64)
+            self.reference_knot = knot_tuple
+
+    def classify_sample(self, plc, prefiltered=False):
+        #classifies the polygon, counts it and records it if it is of interest
+        knot_tuple, needs_pyknotid = self.identify_plcurve(plc, prefiltered)
+        if needs_pyknotid and self.spool is not None:
+            self.spool_sample(knot_tuple, plc)
+            return 0
+        candidates = None
+        if needs_pyknotid:
+            knot_tuple, candidates = self.identify_pyknotid(plc, knot_tuple)
+        self.count_classified(knot_tuple, candidates, plc)
+        return 0 #return value irrelevant
+
+    def identify_plcurve(self, plc, prefiltered=False):
+        #the knot tuple plCurve gives (None if it failed) and whether pyknotid has to be asked as well
+        if prefiltered:
+            return UNKNOT_TUPLE, False
+        num_factors, crossing_num, ind, num_poss = self.classify_plcurve(plc)
+        try:
+            knot_tuple = tuple(sorted(zip(crossing_num[:num_factors],ind[:num_factors])))
+        except TypeError:
+            #Try pyknotid, maybe the knot has more than 10 crossings
+            return None, True
+        #Double-check questionable HOMFLYs of prime knots through pyknotid
+        return knot_tuple, (len(knot_tuple) == 1) and has_non_unique_homfly(knot_tuple[0][0], knot_tuple[0][1])
+
+    def identify_pyknotid(self, plc, plcurve_knot_tuple):
+        #pyknotid's identification as (knot tuple, None), or (None, candidates) if it can't settle on one knot.
+        #Called when plCurve failed (plcurve_knot_tuple is None) or to recheck a non-unique HOMFLY
+        self.path_counter['pyknotid_fallback' if plcurve_knot_tuple is None else 'pyknotid_recheck'] += 1
+        candidates = self.classify_pyknotid(plc)
         #if we found a single knot candidate
         if isinstance(candidates, str):
-            knot_tuple = knot_string_to_tuple(candidates)
-            used_pyknotid = True
-        #otherwise
+            return knot_string_to_tuple(candidates), None
+        #Unable to classify this knot, maybe too singular, maybe multiple candidates
+        return None, candidates
+
+    def spool_sample(self, plcurve_knot_tuple, plc):
+        #appends the polygon to the spool, labelled with plCurve's identification if it had one
+        args = self.args
+        record = self.spool.empty(1)
+        record['iteration'] = self.step_counter['iteration']
+        record['random_seed'] = args.RANDOM_SEED
+        record['confinement_radius'] = args.CONFINEMENT_RADIUS
+        record['num_edges'] = args.NUMBER_OF_EDGES
+        record['status'] = b'PENDING'
+        if plcurve_knot_tuple is not None:
+            record['knot'] = self.spool.encode_label(knot_label(plcurve_knot_tuple))
+        record['vertices'] = get_numpy_coordinate_array(plc)
+        self.spool.append(record)
+        self.path_counter['spooled'] += 1
+        self.set_reference(None, plc)
+        self.add_count(PENDING_LABEL)
+
+    def count_classified(self, knot_tuple, candidates, plc):
+        if knot_tuple is None:
+            self.count_unclassifiable(candidates, plc)
         else:
-            #Unable to classify this knot, maybe too singular, maybe multiple candidates
-            df.loc[step_counter['iteration']] = [args.RANDOM_SEED, 'UNCL', candidates, args.NUMBER_OF_EDGES, args.CONFINEMENT_RADIUS,
-                                             make_knotplot_polygon_string(get_numpy_coordinate_array(plc))]
-            knot_counter["Unclassifiable"] += 1
+            self.set_reference(knot_tuple, plc)
+            self.count_knot(knot_tuple, plc)
+
+    def count_unclassifiable(self, candidates, plc):
+        if self.target_knots is None:
+            self.record_knot('UNCL', candidates, plc)
+        self.add_count("Unclassifiable")
+        self.path_counter['unclassifiable'] += 1
+        self.set_reference(None, plc)
+
+    def count_knot(self, knot_tuple, plc):
+        #records the polygon if it is of interest and counts its knot type
+        args = self.args
+
+        if args.SUPERBRIDGE and len(knot_tuple) == 1:
+            self.check_superbridge(knot_tuple, plc)
+
+        if self.target_knots is not None:
+            if knot_tuple in self.target_knots:
+                self.record_target(knot_tuple, plc)
+            self.add_count(knot_tuple)
+            return
+
+        #if knot is prime
+        if len(knot_tuple) == 1:
+            #if it is a prime knot with <=10 crossings we want to compare stick numbers
+            is_best = is_best_known_equilateral_stick_number(knot_tuple[0][0], knot_tuple[0][1], args.NUMBER_OF_EDGES)
+            if is_best:
+                self.record_knot('BEST', knot_tuple, plc)
+
+            elif (is_best == None) and (args.VERBOSITY >= 2):
+                self.record_knot('EQUIV', knot_tuple, plc)
+
+            elif args.VERBOSITY >= 3:
+                self.record_knot('WORSE', knot_tuple, plc)
+
+        elif (len(knot_tuple) >= 2) and (args.VERBOSITY >= 3):
+            self.record_knot('NONPRIME', knot_tuple, plc)
+
+        #in any case, we want to record that this knot was seen
+        self.add_count(knot_tuple)
+
+    def check_superbridge(self, knot_tuple, plc):
+        #only knots whose superbridge index is not known exactly can have their table entry improved
+        bounds = superbridge_index_bounds(knot_tuple[0][0], knot_tuple[0][1])
+        if bounds is None or bounds[0] == bounds[1]:
+            return
+        start = time.time()
+        superbridge = superbridge_number(get_numpy_coordinate_array(plc))
+        if self.timer is not None:
+            self.timer.add('superbridge', time.time() - start)
+        self.superbridge_counter[knot_tuple] += 1
+        if superbridge < self.superbridge_minima.get(knot_tuple, bounds[1] + 1):
+            self.superbridge_minima[knot_tuple] = superbridge
+        if superbridge < bounds[1]:
+            self.record_knot('SBRIDGE', knot_tuple, plc)
+
+    def record_target(self, knot_tuple, plc):
+        #every polygon of a target knot is written, with its status against the best known stick number
+        if len(knot_tuple) == 1:
+            is_best = is_best_known_equilateral_stick_number(knot_tuple[0][0], knot_tuple[0][1],
+                                                            self.args.NUMBER_OF_EDGES)
+            status = 'BEST' if is_best else ('EQUIV' if is_best is None else 'WORSE')
+        else:
+            status = 'NONPRIME'
+        self.record_knot(status, knot_tuple, plc)
+        if knot_tuple not in self.found_targets:
+            self.found_targets.add(knot_tuple)
+            if self.shared_found_targets is not None:
+                self.shared_found_targets[knot_tuple_to_string(knot_tuple)] = True
+
+    def all_targets_found(self):
+        #cheap enough to call for every polygon; only looks at the shared record between segments
+        return (self.target_knots is not None) and (len(self.found_targets) == len(self.target_knots))
+
+    def update_found_targets(self):
+        #picks up targets found by other processes
+        if self.shared_found_targets is not None:
+            for knot in self.shared_found_targets.keys():
+                knot_tuple = knot_string_to_tuple(knot)
+                if knot_tuple in self.target_knots:
+                    self.found_targets.add(knot_tuple)
+
+    def add_count(self, knot):
+        self.knot_counter[knot] += 1
+        if self.ess is not None:
+            self.ess.add(knot)
+
+    def timed_integrand(self, plc):
+        start = time.time()
+        result = self.integrand(plc)
+        end = time.time()
+        self.timer.add('integrand', end - start)
+        if (self.progress is not None) and self.progress.due(end):
+            self.report_progress(end)
+        return result
+
+    def collect(self, plc):
+        #the callback of each chain when running several; classification waits until the batch is full
+        i = self.batch_counter['size']
+        self.batch_counter['collected'] += 1
+        if self.is_thinned(self.batch_counter['collected']):
             return 0
+        self.batch_vertices[i] = get_numpy_coordinate_array(plc)
+        self.batch_iterations[i] = self.batch_counter['collected']
+        self.batch_counter['size'] += 1
+        if self.batch_counter['size'] == len(self.batch_vertices):
+            self.flush_batch()
+        return 0 #return value irrelevant
+
+    def flush_batch(self):
+        args = self.args
+        size = self.batch_counter['size']
+        if size == 0:
+            return
+        vertices = self.batch_vertices[:size]
+
+        prefiltered = np.zeros(size, dtype=bool)
+        if args.PREFILTER_PROJECTIONS:
+            start = time.time()
+            directions = random_unit_vectors(self.prefilter_random_state, size * args.PREFILTER_PROJECTIONS)
+            prefiltered = batch_certified_unknots(vertices, directions.reshape(size, args.PREFILTER_PROJECTIONS, 3))
+            if self.timer is not None:
+                self.timer.add('prefilter', time.time() - start)
+
+        for i in range(size):
+            start = time.time()
+            self.step_counter['iteration'] = int(self.batch_iterations[i])
+            plc = make_plcurve(vertices[i])
+            if not (args.REUSE_CLASSIFICATION and self.reuse_classification(plc)):
+                if prefiltered[i]:
+                    self.prefilter_counter['unknots'] += 1
+                    self.verify_prefilter(plc)
+                self.classify_sample(plc, prefiltered[i])
+            if self.timer is not None:
+                end = time.time()
+                self.timer.add('integrand', end - start)
+                if (self.progress is not None) and self.progress.due(end):
+                    self.report_progress(end)
+        self.batch_counter['size'] = 0
+
+    def count_pipeline_sample(self, iteration, vertices, knot_tuple, candidates):
+        #counts and records a polygon classified by the pipeline's worker processes
+        self.step_counter['iteration'] = iteration
+        self.count_classified(knot_tuple, candidates, make_plcurve(vertices))
+
+    def spool_pipeline_sample(self, iteration, vertices, plcurve_knot_tuple):
+        self.step_counter['iteration'] = iteration
+        self.spool_sample(plcurve_knot_tuple, make_plcurve(vertices))
+
+    def merge_pipeline_worker(self, path_counter, prefilter_counter, cache_items, homfly_items, cache_lookups,
+                              disambiguation_items, resolved):
+        #adds a finished pipeline classifier's counts and cache entries to this process's
+        self.path_counter.update(path_counter)
+        self.prefilter_counter.update(prefilter_counter)
+        classification_cache.merge(cache_items)
+        homfly_index.merge(homfly_items)
+        disambiguator.merge(disambiguation_items)
+        disambiguator.resolved.update(resolved)
+        classification_cache.hits += cache_lookups[0]
+        classification_cache.misses += cache_lookups[1]
+
+    def path_counts(self):
+        paths = dict(self.path_counter)
+        paths['prefiltered_unknots'] = self.prefilter_counter['unknots']
+        if self.timer is not None and not self.args.PIPELINE_WORKERS:
+            paths['plcurve_classified'] = self.timer.counts.get('plcurve', 0) - self.path_counter['pyknotid_fallback']
+        return paths
+
+    def report_progress(self, now=None):
+        return self.progress.report(self.step_counter['iteration'], self.timer, self.path_counts(), now)
+
+    def callback(self):
+        #the function tsmcmc calls for each polygon
+        return self.integrand if self.timer is None else self.timed_integrand
+
+    def run(self):
+        args = self.args
+        if args.PROGRESS_INTERVAL or args.STATS_OUT:
+            self.progress = ProgressReporter(args.MAX_ITERATIONS, args.MAX_SECONDS, args.PROGRESS_INTERVAL,
+                                             args.STATS_OUT, start_iteration=self.step_counter['iteration'])
+        if args.CHECKPOINT or args.TARGET_KNOTS:
+            self.run_segments()
+        elif args.PIPELINE_WORKERS:
+            run_pipeline(self)
+        elif args.NUM_CHAINS > 1:
+            self.run_chains()
+        else:
+            tsmcmc.confined_equilateral_expectation(self.rng, self.callback(),
+                                                    args.CONFINEMENT_RADIUS,
+                                                    args.NUMBER_OF_EDGES,
+                                                    args.MAX_ITERATIONS + BURN_IN_ITERATIONS,
+                                                    args.MAX_SECONDS, self.rp)
+        #write out any remaining buffered rows
+        self.writer.close()
+        if self.progress is not None:
+            self.report_progress()
+        return self.knot_counter
+
+    def run_segments(self):
+        args = self.args
+        while (self.step_counter['iteration'] < args.MAX_ITERATIONS) and (self.elapsed_seconds < args.MAX_SECONDS):
+            if self.target_knots is not None:
+                self.update_found_targets()
+                if self.all_targets_found():
+                    break
+            segment_iterations = min(args.CHECKPOINT_ITERATIONS, args.MAX_ITERATIONS - self.step_counter['iteration'])
+
+            segment_seed = derive_seed(args.RANDOM_SEED, 'segment', self.segment)
+            self.rng.set(segment_seed)
+            self.set_reference(None, None)
+            self.prefilter_random_state.seed([segment_seed & 0xffffffff, segment_seed >> 32])
+
+            start = time.time()
+            tsmcmc.confined_equilateral_expectation(self.rng, self.callback(),
+                                                    args.CONFINEMENT_RADIUS,
+                                                    args.NUMBER_OF_EDGES,
+                                                    segment_iterations + BURN_IN_ITERATIONS,
+                                                    int(max(1, args.MAX_SECONDS - self.elapsed_seconds)), self.rp)
+            self.elapsed_seconds += time.time() - start
+            self.segment += 1
+            if args.CHECKPOINT:
+                self.save_checkpoint()
+
+        if args.CHECKPOINT:
+            self.save_checkpoint(complete=True)
+
+    def run_chains(self):
+        args = self.args
+        elapsed_seconds = 0.0
+        for chain in range(args.NUM_CHAINS):
+            #share out the iterations, the first chains taking any remainder
+            chain_iterations = args.MAX_ITERATIONS // args.NUM_CHAINS + (chain < args.MAX_ITERATIONS % args.NUM_CHAINS)
+            if chain_iterations == 0 or elapsed_seconds >= args.MAX_SECONDS:
+                break
+            self.rng.set(derive_seed(args.RANDOM_SEED, 'chain', chain))
+            #the polygons of one chain say nothing about the next
+            self.flush_batch()
+            self.set_reference(None, None)
+
+            start = time.time()
+            tsmcmc.confined_equilateral_expectation(self.rng, self.collect,
+                                                    args.CONFINEMENT_RADIUS,
+                                                    args.NUMBER_OF_EDGES,
+                                                    chain_iterations + BURN_IN_ITERATIONS,
+                                                    int(max(1, args.MAX_SECONDS - elapsed_seconds)), self.rp)
+            elapsed_seconds += time.time() - start
+        self.flush_batch()
+
+
+def generate(args):
+    #runs one batch of generation as described by args (see parse_args) and returns the knot counts
+    return run_generation(args).knot_counter
+
+
+def run_generation(args, found_targets=None):
+    #as generate, but returns the StickKnotGenerator, for its counts of recorded rows and other statistics.
+    #found_targets is an optional dictionary of target knots found, shared with other processes
+
+    #remember pyknotid identifications of invariant tuples we have already seen
+    configure_caches(**cache_settings(args))
+
+    #########################
+    ### GENERATE POLYGONS ###
+    #########################
+
+    print("PARAMETERS:")
+    print("\tConfinement radius: %f" % args.CONFINEMENT_RADIUS)
+    print("\tNumber of edges: %d" % args.NUMBER_OF_EDGES)
+    print("\tMaximum steps: %d" % args.MAX_ITERATIONS)
+    print("\tMaximum seconds: %d" % args.MAX_SECONDS)
+    print("\tRandom seed: %d" % args.RANDOM_SEED)
+    print("")
+
+    generator = StickKnotGenerator(args, found_targets)
+    knot_counter = generator.run()
+
+    ######################
+    ### REPORT RESULTS ###
+    ######################
+
+    #write out knot counts, if desired
+    if args.KNOT_COUNTS_OUT:
+        with open(args.KNOT_COUNTS_OUT, 'wb') as outfile:
+            pickle.dump(knot_counter, outfile)
+
+    #write out the classification cache, if desired
+    if args.CLASSIFICATION_CACHE:
+        classification_cache.save(args.CLASSIFICATION_CACHE)
+    if args.HOMFLY_INDEX:
+        homfly_index.save(args.HOMFLY_INDEX)
+    if args.DISAMBIGUATION_CACHE:
+        disambiguator.save(args.DISAMBIGUATION_CACHE)
+
+    if classification_cache.hits + classification_cache.misses:
+        print("\nClassification cache: %s" % classification_cache.summary())
+    if disambiguator.resolved:
+        print("\nDisambiguated polygons by stage: %s" % disambiguator.summary())
+
+    if args.PREFILTER_PROJECTIONS:
+        print("\nPrefilter: %d of %d polygons certified as unknots without plCurve" %
+              (generator.prefilter_counter['unknots'], generator.step_counter['iteration']))
+        if args.PREFILTER_VERIFY:
+            print("\t%d checked against plCurve, %d disagreements" %
+                  (generator.prefilter_counter['verified'], generator.prefilter_counter['disagreements']))
+
+    if generator.spool is not None:
+        print("\nSpooled %d polygons to %s; settle them with reclassify_spool.py" %
+              (generator.path_counter['spooled'], args.SPOOL_OUT))
+
+    if generator.target_knots is not None:
+        print("\nTarget knots found: %d of %d" % (len(generator.found_targets), len(generator.target_knots)))
+        for knot_tuple in sorted(generator.target_knots):
+            print("\t%s\t%s" % (knot_tuple_to_string(knot_tuple),
+                                 'found' if knot_tuple in generator.found_targets else 'not found'))
+
+    if args.SUPERBRIDGE:
+        print("\nSuperbridge numbers of knots whose superbridge index is not known exactly:")
+        print("%s\t%s\t%s\t%s" % ('knot', 'table', 'checked', 'smallest'))
+        for knot_tuple, checked in sorted(generator.superbridge_counter.items()):
+            lower, upper = superbridge_index_bounds(knot_tuple[0][0], knot_tuple[0][1])
+            smallest = generator.superbridge_minima[knot_tuple]
+            print("%s\t[%d,%d]\t%d\t%d%s" % (knot_tuple_to_string(knot_tuple), lower, upper, checked, smallest,
+                                              '\tIMPROVES' if smallest < upper else ''))
+
+    if generator.ess is not None:
+        paths = generator.path_counter
+        print("\nCounted %d polygons: %d classified, %d reusing the previous classification, %d skipped by thinning" %
+              (sum(knot_counter.values()), sum(knot_counter.values()) - paths['reused'], paths['reused'],
+               paths['thinned']))
+
+    print("\nKnot Frequency Counts:")
+    for knot_tuple, count in sorted(knot_counter.items(), key=lambda x: x[1], reverse=True):
+        if generator.ess is None:
+            print("%s\t%d" % (knot_label(knot_tuple), count))
+        else:
+            #the effective sample size for estimating the frequency of this knot type
+            ess = generator.ess.ess(knot_tuple)
+            print("%s\t%d\t%s" % (knot_label(knot_tuple), count, 'ESS n/a' if ess is None else 'ESS %.0f' % ess))
+
+    return generator
+
 
-    #if knot is prime
-    if len(knot_tuple) == 1:
-        #Double-check questionable HOMFLYs through pyknotid,
-        #unless we've already used pyknotid to identify this knot
-        if ('_'.join(map(str, knot_tuple[0])) in non_unique_homfly_knots) and not used_pyknotid:
-            candidates = pyknotid_classify(get_numpy_coordinate_array(plc))
-            #if we found a single knot candidate
-            if isinstance(candidates, str):
-                knot_tuple = knot_string_to_tuple(candidates)
-            #otherwise
-            else:
-                #Unable to classify this knot, maybe multiple candidates
-                df.loc[step_counter['iteration']] = [args.RANDOM_SEED, 'UNCL', candidates, args.NUMBER_OF_EDGES, args.CONFINEMENT_RADIUS,
-                                                 make_knotplot_polygon_string(get_numpy_coordinate_array(plc))]
-                knot_counter["Unclassifiable"] += 1
-                return 0
-
-        #if it is a prime knot with <=10 crossings we want to compare stick numbers
-        is_best = is_best_known_equilateral_stick_number(knot_tuple[0][0], knot_tuple[0][1], args.NUMBER_OF_EDGES)
-        if is_best:
-            df.loc[step_counter['iteration']] = [args.RANDOM_SEED, 'BEST', knot_tuple, args.NUMBER_OF_EDGES, args.CONFINEMENT_RADIUS,
-                                                 make_knotplot_polygon_string(get_numpy_coordinate_array(plc))]
-
-        elif (is_best == None) and (args.VERBOSITY >= 2):
-            df.loc[step_counter['iteration']] = [args.RANDOM_SEED, 'EQUIV', knot_tuple, args.NUMBER_OF_EDGES, args.CONFINEMENT_RADIUS,
-                                                 make_knotplot_polygon_string(get_numpy_coordinate_array(plc))]
-
-        elif args.VERBOSITY >= 3:
-            df.loc[step_counter['iteration']] = [args.RANDOM_SEED, 'WORSE', knot_tuple, args.NUMBER_OF_EDGES, args.CONFINEMENT_RADIUS,
-                                                 make_knotplot_polygon_string(get_numpy_coordinate_array(plc))]
-
-    elif (num_factors >= 2) and (args.VERBOSITY >= 3):
-        df.loc[step_counter['iteration']] = [args.RANDOM_SEED, 'NONPRIME', knot_tuple, args.NUMBER_OF_EDGES, args.CONFINEMENT_RADIUS,
-                                             make_knotplot_polygon_string(get_numpy_coordinate_array(plc))]
-
-    #in any case, we want to record that this knot was seen
-    knot_counter[knot_tuple] += 1
-
-    return 0 #return value irrelevant
-
-
-#########################
-### GENERATE POLYGONS ###
-#########################
-
-print("PARAMETERS:")
-print("\tConfinement radius: %f" % args.CONFINEMENT_RADIUS)
-print("\tNumber of edges: %d" % args.NUMBER_OF_EDGES)
-print("\tMaximum steps: %d" % args.MAX_ITERATIONS)
-print("\tMaximum seconds: %d" % args.MAX_SECONDS)
-print("\tRandom seed: %d" % args.RANDOM_SEED)
-print
-
-tsmcmc.confined_equilateral_expectation(rng, integrand,
-                                        args.CONFINEMENT_RADIUS,
-                                        args.NUMBER_OF_EDGES,
-                                        args.MAX_ITERATIONS + BURN_IN_ITERATIONS,
-                                        args.MAX_SECONDS, rp)
-
-
-######################
-### REPORT RESULTS ###
-######################
-
-#write out csv file, if desired
-if args.CSV_OUT:
-    df.to_csv(args.CSV_OUT, index_label='iteration')
-else:
-    print("\niteration, random_seed, is_best, knot, num_edges, confinement_radius, string_repr")
-    for iteration, data in df.iterrows():
-        print(', '.join([str(iteration)] + map(lambda x:str(x), data)))
-    print
-
-#write out knot counts, if desired
-if args.KNOT_COUNTS_OUT:
-    with open(args.KNOT_COUNTS_OUT, 'w') as outfile:
-        pickle.dump(knot_counter, outfile)
-
-print("\nKnot Frequency Counts:")
-for knot_tuple, count in sorted(knot_counter.items(), key=lambda x: x[1], reverse=True):
-    print("%s\t%d" % (knot_tuple_to_string(knot_tuple), count))
+if __name__ == "__main__":
+    generate(parse_args())
@@ -1,7 +1,14 @@
-import subprocess
 import os
+import json
+import multiprocessing
+import traceback
+import time
 import random
 import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from seeds import derive_seed
+from knot_counts import KnotCountAggregator, read_knot_counter
 
 
 parser = argparse.ArgumentParser()
@@ -22,44 +29,331 @@ parser.add_argument('-c', '--CSV_DIRECTORY', type=str, dest='CSV_DIRECTORY',
                     help="The directory to output csv results")
 parser.add_argument('-k', '--KNOT_COUNTS_DIRECTORY', type=str, dest='KNOT_COUNTS_DIRECTORY',
                     help="The directory to output knot frequency counts as pickled python objects")
+parser.add_argument('-sd', '--SPOOL_DIRECTORY', type=str, dest='SPOOL_DIRECTORY',
+                    help="The directory to spool polygons needing pyknotid to, for reclassify_spool.py, instead of "
+                         "classifying them during the run. Cannot be combined with -tk")
+parser.add_argument('-rs', '--MASTER_SEED', type=int, dest='MASTER_SEED',
+                    help="The seed from which the seed of every batch is derived. By default, a random seed "
+                         "(or the one in the manifest)")
+parser.add_argument('-mf', '--MANIFEST', type=str, dest='MANIFEST',
+                    help="Path of a json manifest recording the seed, parameters, status and output files of each "
+                         "batch. If it already exists, only its unfinished batches are run, plus new batches if "
+                         "the total has been increased")
 parser.add_argument('-p', '--MAX_PROCESSES', type=int, default=4, dest='MAX_PROCESSES',
                     help="Maximum number of concurrent processes")
+parser.add_argument('-tk', '--TARGET_KNOTS', type=str, nargs='+', dest='TARGET_KNOTS',
+                    help="Search for these knots: only their polygons are written, and the remaining batches are "
+                         "skipped once every target has been found by some batch")
+parser.add_argument('-ci', '--CHECKPOINT_ITERATIONS', type=int, default=100000, dest='CHECKPOINT_ITERATIONS',
+                    help="With target knots, the number of polygons each batch generates between checks whether "
+                         "the other batches have found the remaining targets")
+parser.add_argument('-sb', '--SUPERBRIDGE', action='store_true', dest='SUPERBRIDGE',
+                    help="Also write polygons which lower an upper bound of superbridge_index/superbridge_values.csv")
+parser.add_argument('-m', '--MERGED_COUNTS_DIRECTORY', type=str, dest='MERGED_COUNTS_DIRECTORY',
+                    help="The directory to write knot frequency counts merged over all batches, as csv tables")
+parser.add_argument('-mb', '--MERGE_CHECKPOINT_BATCHES', type=int, default=10, dest='MERGE_CHECKPOINT_BATCHES',
+                    help="Write out the merged knot frequency counts after this many batches complete")
 
-args = parser.parse_args()
 
-if args.TOTAL_TO_GENERATE < args.BATCH_SIZE:
-    args.BATCH_SIZE = args.TOTAL_TO_GENERATE
-
-###################################
-### RUN GENERATION SUBPROCESSES ###
-###################################
-
-processes = set()
-DEVNULL = open(os.devnull, 'wb')
-
-#generate a random seed for each batch
-for random_seed in [int(random.getrandbits(64)) for i in range(args.TOTAL_TO_GENERATE / args.BATCH_SIZE)]:
-    command = ['python', 'generate_random_stick_knots.py']
-    command += ['-cr', str(args.CONFINEMENT_RADIUS)]
+def batch_command(args, random_seed, max_iterations=None):
+    #the generate_random_stick_knots.py arguments for one batch
+    command = ['-cr', str(args.CONFINEMENT_RADIUS)]
     command += ['-ne', str(args.NUMBER_OF_EDGES)]
-    command += ['-mi', str(args.BATCH_SIZE)]
+    command += ['-mi', str(max_iterations or args.BATCH_SIZE)]
     command += ['-ms', str(args.BATCH_MAX_SECONDS)]
     command += ['-v', str(args.VERBOSITY)]
     command += ['-rs', str(random_seed)]
-    command += ['-csv', str(args.CSV_DIRECTORY + '/' + '%d_%d.csv' % (args.NUMBER_OF_EDGES, random_seed))]
-    command += ['-kc', str(args.KNOT_COUNTS_DIRECTORY + '/' + '%d_%d.pkl' % (args.NUMBER_OF_EDGES, random_seed))]
+    if args.CSV_DIRECTORY:
+        command += ['-csv', str(args.CSV_DIRECTORY + '/' + '%d_%d.csv' % (args.NUMBER_OF_EDGES, random_seed))]
+    if args.KNOT_COUNTS_DIRECTORY:
+        command += ['-kc', str(args.KNOT_COUNTS_DIRECTORY + '/' + '%d_%d.pkl' % (args.NUMBER_OF_EDGES, random_seed))]
+    if getattr(args, 'SPOOL_DIRECTORY', None):
+        command += ['-sp', str(args.SPOOL_DIRECTORY + '/' + '%d_%d.spool' % (args.NUMBER_OF_EDGES, random_seed))]
+    if getattr(args, 'TARGET_KNOTS', None):
+        command += ['-tk'] + args.TARGET_KNOTS
+        command += ['-ci', str(args.CHECKPOINT_ITERATIONS)]
+    if getattr(args, 'SUPERBRIDGE', False):
+        command += ['-sb']
+    return command
+
+
+#in each worker, the dictionary of target knots found, shared between all workers (see init_worker)
+found_targets = None
+
+
+def init_worker(shared_found_targets):
+    global found_targets
+    found_targets = shared_found_targets
+
+
+def all_targets_found(target_knots, found):
+    from knot_tables import knot_string_to_tuple
+    found = set(knot_string_to_tuple(knot) for knot in found.keys())
+    return all(knot_string_to_tuple(knot) in found for knot in target_knots)
+
+
+def run_batch(command):
+    #runs in a long-lived worker process, which only imports the generation code once
+    import generate_random_stick_knots
+    from identify_knot import silence_stdout, silence_stderr
+
+    result = {'command': command, 'knot_counter': None, 'status_counts': None, 'error': None, 'skipped': False}
+    start = time.time()
+    try:
+        batch_args = generate_random_stick_knots.parse_args(command)
+        result['num_edges'] = batch_args.NUMBER_OF_EDGES
+        result['confinement_radius'] = batch_args.CONFINEMENT_RADIUS
+        if batch_args.TARGET_KNOTS and (found_targets is not None) and \
+                all_targets_found(batch_args.TARGET_KNOTS, found_targets):
+            #nothing left to search for
+            result['skipped'] = True
+            result['seconds'] = time.time() - start
+            return result
+        with silence_stdout(), silence_stderr():
+            generator = generate_random_stick_knots.run_generation(batch_args, found_targets)
+        result['knot_counter'] = generator.knot_counter
+        #the number of rows recorded with each status (BEST, EQUIV, ...)
+        result['status_counts'] = generator.writer.status_counts
+    except Exception:
+        result['error'] = traceback.format_exc()
+    result['seconds'] = time.time() - start
+    return result
+
+
+def crashed_batch_result(command):
+    #the result of a batch whose worker process died outside Python, e.g. in libpl's C code
+    return {'command': command, 'knot_counter': None, 'status_counts': None, 'skipped': False, 'seconds': None,
+            'error': "The worker process running this batch died"}
+
+
+class BatchPool(object):
+    """Runs batches (see run_batch) in a pool of long-lived worker processes.
+
+    A worker which dies outside Python, say from a crash in libpl's C code,
+    breaks the whole pool. The batches running in it at the time then come
+    back as failed results, a new pool is started for the batches submitted
+    after, and no batch is waited on forever.
+    """
+
+    def __init__(self, max_processes, initializer=None, initargs=()):
+        self.max_processes = max_processes
+        self.initializer = initializer
+        self.initargs = initargs
+        #future -> (command, tag, the executor running it)
+        self.running = {}
+        self.executor = self.new_executor()
+
+    def new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.max_processes, initializer=self.initializer,
+                                   initargs=self.initargs)
+
+    def replace_executor(self):
+        self.executor.shutdown(wait=False)
+        self.executor = self.new_executor()
+
+    def __len__(self):
+        return len(self.running)
+
+    def submit(self, command, tag=None):
+        try:
+            future = self.executor.submit(run_batch, command)
+        except BrokenProcessPool:
+            self.replace_executor()
+            future = self.executor.submit(run_batch, command)
+        self.running[future] = (command, tag, self.executor)
+
+    def finished(self):
+        #waits for at least one batch to finish and returns (tag, result) of each batch which has
+        done, not_done = wait(list(self.running), return_when=FIRST_COMPLETED)
+        results = []
+        for future in done:
+            command, tag, executor = self.running.pop(future)
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                if executor is self.executor:
+                    self.replace_executor()
+                result = crashed_batch_result(command)
+            elif error is not None:
+                result = dict(crashed_batch_result(command), error=repr(error))
+            else:
+                result = future.result()
+            results.append((tag, result))
+        return results
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def run_batches(commands, max_processes, aggregator=None, merged_counts_directory=None, checkpoint_batches=10,
+                shared_found_targets=None, on_result=None):
+    #hands batches out to a pool of workers one at a time, so all workers stay busy until the last batch.
+    #the knot counts of each batch come back to this process and are merged into aggregator, and every
+    #result, failed or not, is passed to on_result if given
+    pending = list(commands)
+    pool = BatchPool(max_processes, init_worker, (shared_found_targets,))
+    completed = 0
+    try:
+        while pending or len(pool):
+            while pending and len(pool) < max_processes:
+                pool.submit(pending.pop(0))
+            for tag, result in pool.finished():
+                if on_result is not None:
+                    on_result(result)
+                if result['error']:
+                    print("Batch failed: \"%s\"\n%s" % (' '.join(result['command']), result['error']))
+                    continue
+                if result['skipped']:
+                    print("Batch skipped, all target knots found: \"%s\"" % ' '.join(result['command']))
+                    continue
+
+                print("Batch complete: \"%s\"" % ' '.join(result['command']))
+                completed += 1
+                if aggregator is not None:
+                    aggregator.add(result['num_edges'], result['confinement_radius'], result['knot_counter'])
+                    if merged_counts_directory and (completed % checkpoint_batches == 0):
+                        aggregator.write_frequency_tables(merged_counts_directory)
+    finally:
+        pool.close()
+        if aggregator is not None and merged_counts_directory:
+            aggregator.write_frequency_tables(merged_counts_directory)
+
+
+#batch parameters which must agree between a manifest and a run extending it. BATCH_SIZE may change,
+#affecting only new batches
+MANIFEST_PARAMETERS = ['CONFINEMENT_RADIUS', 'NUMBER_OF_EDGES', 'BATCH_MAX_SECONDS', 'VERBOSITY',
+                       'CSV_DIRECTORY', 'KNOT_COUNTS_DIRECTORY', 'TARGET_KNOTS', 'CHECKPOINT_ITERATIONS',
+                       'SPOOL_DIRECTORY', 'SUPERBRIDGE']
+
+
+class ShardManifest(object):
+    """Records every batch (shard) of a campaign so that it can be reproduced, resumed or extended.
+
+    The seed of shard i is derived from the master seed and i alone, so the
+    same master seed and batch sizes always give the same polygons. The
+    manifest lists each shard's seed, number of polygons, command, output
+    files and status (pending, complete, failed or skipped), and is rewritten
+    as each shard finishes.
+    """
+
+    def __init__(self, master_seed, parameters, shards=None, path=None):
+        self.master_seed = master_seed
+        self.parameters = parameters
+        self.shards = shards or []
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as fin:
+            manifest = json.load(fin)
+        return cls(manifest['master_seed'], manifest['parameters'], manifest['shards'], path)
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path + '.tmp', 'w') as fout:
+            json.dump({'master_seed': self.master_seed, 'parameters': self.parameters, 'shards': self.shards},
+                      fout, indent=2, sort_keys=True)
+        os.rename(self.path + '.tmp', self.path)
+
+    def changed_parameters(self, parameters):
+        #(name, manifest value, given value) of each of MANIFEST_PARAMETERS which differs from the manifest's.
+        #Parameters added since the manifest was made take their defaults, which is what its shards ran with
+        changed = []
+        for name in MANIFEST_PARAMETERS:
+            value = self.parameters.get(name, parser.get_default(name))
+            if value != parameters[name]:
+                changed.append((name, value, parameters[name]))
+        return changed
+
+    def total_iterations(self):
+        return sum(shard['iterations'] for shard in self.shards)
+
+    def extend(self, args, total_to_generate):
+        #adds shards of BATCH_SIZE polygons, the last taking any remainder, up to total_to_generate in all
+        remaining = total_to_generate - self.total_iterations()
+        while remaining > 0:
+            index = len(self.shards)
+            iterations = min(args.BATCH_SIZE, remaining)
+            seed = derive_seed(self.master_seed, 'shard', index)
+            command = batch_command(args, seed, iterations)
+            self.shards.append({'shard': index, 'seed': seed, 'iterations': iterations, 'command': command,
+                                'csv': option_value(command, '-csv'), 'knot_counts': option_value(command, '-kc'),
+                                'status': 'pending', 'seconds': None, 'error': None})
+            remaining -= iterations
+
+    def unfinished(self):
+        return [shard for shard in self.shards if shard['status'] in ('pending', 'failed')]
+
+    def record_result(self, result):
+        shard = self.shard_of_command(result['command'])
+        if result['error']:
+            shard['status'] = 'failed'
+            shard['error'] = result['error']
+        else:
+            shard['status'] = 'skipped' if result['skipped'] else 'complete'
+            shard['error'] = None
+        shard['seconds'] = result.get('seconds')
+        self.save()
+
+    def shard_of_command(self, command):
+        if not hasattr(self, '_by_command'):
+            self._by_command = dict((tuple(shard['command']), shard) for shard in self.shards)
+        return self._by_command[tuple(command)]
+
+
+def option_value(command, option):
+    return command[command.index(option) + 1] if option in command else None
+
+
+if __name__ == "__main__":
+
+    args = parser.parse_args()
+    if args.SPOOL_DIRECTORY and args.TARGET_KNOTS:
+        parser.error("-sd cannot be combined with -tk: target knots must be classified during the run")
+
+    parameters = dict((name, getattr(args, name)) for name in MANIFEST_PARAMETERS)
+    if args.MANIFEST and os.path.exists(args.MANIFEST):
+        manifest = ShardManifest.load(args.MANIFEST)
+        if args.MASTER_SEED and args.MASTER_SEED != manifest.master_seed:
+            parser.error("Manifest %s has master seed %d, not %d" % (args.MANIFEST, manifest.master_seed,
+                                                                     args.MASTER_SEED))
+        for name, value, given in manifest.changed_parameters(parameters):
+            parser.error("Manifest %s was made with %s=%s, not %s" % (args.MANIFEST, name, value, given))
+    else:
+        manifest = ShardManifest(args.MASTER_SEED or int(random.getrandbits(64)), parameters, path=args.MANIFEST)
+    manifest.extend(args, args.TOTAL_TO_GENERATE)
+    manifest.save()
+    print("Master seed: %d" % manifest.master_seed)
+
+    ##############################
+    ### RUN GENERATION WORKERS ###
+    ##############################
 
-    print("Running command: \"%s\"" % ' '.join(command))
+    aggregator = KnotCountAggregator()
+    #counts of batches finished by earlier runs of this manifest
+    for shard in manifest.shards:
+        if shard['status'] == 'complete' and shard['knot_counts'] and os.path.exists(shard['knot_counts']):
+            aggregator.add(args.NUMBER_OF_EDGES, args.CONFINEMENT_RADIUS, read_knot_counter(shard['knot_counts']))
 
-    processes.add(subprocess.Popen(command, stdout=DEVNULL, stderr=subprocess.STDOUT))
-    if len(processes) >= args.MAX_PROCESSES:
-        os.wait() #wait for a child process to complete, then remove non running processes
-        processes.difference_update([
-            p for p in processes if p.poll() is not None])
+    commands = [shard['command'] for shard in manifest.unfinished()]
+    print("Running %d of %d batches" % (len(commands), len(manifest.shards)))
 
-#Check if all the child processes were closed
-for p in processes:
-    if p.poll() is None:
-        p.wait()
+    manager = None
+    shared_found_targets = None
+    if args.TARGET_KNOTS:
+        manager = multiprocessing.Manager()
+        shared_found_targets = manager.dict()
+    run_batches(commands, args.MAX_PROCESSES, aggregator,
+                args.MERGED_COUNTS_DIRECTORY, args.MERGE_CHECKPOINT_BATCHES, shared_found_targets,
+                manifest.record_result)
 
-print("\nAll subprocesses complete! Polygons generated.")
+    failed = [shard['shard'] for shard in manifest.shards if shard['status'] == 'failed']
+    if failed:
+        print("\n%d batches failed and can be re-run by repeating the command with the same manifest: %s" %
+              (len(failed), ', '.join(map(str, failed))))
+    else:
+        print("\nAll batches complete! Polygons generated.")
+    if args.TARGET_KNOTS:
+        found = sorted(shared_found_targets.keys())
+        print("Target knots found: %s" % (', '.join(found) if found else 'none'))
+        manager.shutdown()
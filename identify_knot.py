@@ -1,71 +1,142 @@
-from pyknotid.catalogue.getdb import find_database, download_database
-from pyknotid.representations.dtnotation import DTNotation
-from pyknotid.catalogue.identify import from_invariants
-from pyknotid.spacecurves import Knot
 import subprocess
 import os
+import csv
 import sys
+import pickle
+import re
+import time
+import multiprocessing
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
 import numpy as np
+from collections import OrderedDict, Counter
 from contextlib import contextmanager
-from libpl import plcurve
-from libpl.pdcode import plctopology
 import random
-import sympy as sym
 import argparse
-
-#get the pyknotid knot database if not already available
-try:
-    find_database()
-except IOError:
-    download_database()
-
-
-def knot_tuple_to_string(knot_tuple):
-    out_string = []
-    if knot_tuple == None:
-        return None
-    for component in sorted(knot_tuple):
-        if len(component) == 2:
-            #component of the form "5_2"
-            out_string.append('_'.join(map(str,component)))
-        elif len(component) == 3:
-            #component of the form "K11n169"
-            out_string.append('K' + ''.join(map(str,component)))
-        else:
-            #badly formatted knot tuple
-            return None
-    #
-    return ' # '.join(out_string)
-
-
-def knot_string_to_tuple(knot_string):
-    out_tuple = []
-    if knot_string == None:
-        return None
-    if isinstance(knot_string, list):
-        return None
-    for component in knot_string.split(" # "):
-        if component.startswith("K"):
-            #>=11 crossings
-            if "a" in component:
-                #alternating
-                crossings, index = map(int, component.lstrip("K").split("a"))
-                out_tuple.append((crossings, "a", index))
-            elif "n" in component:
-                #non-alternating
-                crossings, index = map(int, component.lstrip("K").split("n"))
-                out_tuple.append((crossings, "n", index))
-            else:
-                #badly formatted knot string
-                return None
-        else:
-            #component of the form "5_2"
-            try:
-                out_tuple.append(tuple(map(int, component.split("_"))))
-            except ValueError:
-                return None
-    #
-    return tuple(sorted(out_tuple))
+from stick_geometry import raw_crossings
+#knot labels are handled in knot_tables, which needs neither plCurve nor pyknotid
+from knot_tables import knot_tuple_to_string, knot_string_to_tuple
+
+#pyknotid and sympy are slow to import and only needed when plCurve can't classify
+#a polygon on its own, so they are imported on first use. plCurve is imported by the
+#functions that call it, so the HOMFLY parsing and the caches work without it
+_database_checked = False
+
+
+def ensure_pyknotid_database():
+    #get the pyknotid knot database if not already available; only checked once per process
+    global _database_checked
+    if _database_checked:
+        return
+    from pyknotid.catalogue.getdb import find_database, download_database
+    try:
+        find_database()
+    except IOError:
+        download_database()
+    _database_checked = True
+
+
+def from_invariants(**kwargs):
+    #pyknotid's catalogue lookup, making sure the database is there first
+    from pyknotid.catalogue.identify import from_invariants as pyknotid_from_invariants
+    ensure_pyknotid_database()
+    return pyknotid_from_invariants(**kwargs)
+
+
+class ClassificationCache(object):
+    """LRU cache from a tuple of knot invariants to the identification pyknotid made from them.
+
+    If a path is given, the cache is loaded from and saved to that file so that
+    it can be reused between runs.
+    """
+
+    def __init__(self, maxsize=100000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        #keys put since take_new_items was last called, for handing worker processes' entries back
+        self._new_keys = set()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    @staticmethod
+    def make_key(identify_kwargs):
+        #sympy expressions and floats are keyed by their string forms
+        return tuple(sorted((key, str(value)) for key, value in identify_kwargs.items()))
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        #returns (found, identification)
+        if key not in self._entries:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        value = self._entries.pop(key)
+        self._entries[key] = value
+        return True, (list(value) if isinstance(value, list) else value)
+
+    def put(self, key, value):
+        if key in self._entries:
+            self._entries.pop(key)
+        elif len(self._entries) >= self.maxsize:
+            self._new_keys.discard(self._entries.popitem(last=False)[0])
+        self._entries[key] = value
+        self._new_keys.add(key)
+
+    def items(self):
+        #(key, identification) pairs, least recently used first
+        return list(self._entries.items())
+
+    def take_new_items(self):
+        #the (key, identification) pairs put since the last call
+        items = [(key, self._entries[key]) for key in self._new_keys if key in self._entries]
+        self._new_keys.clear()
+        return items
+
+    def merge(self, items):
+        #adds (key, identification) pairs learned by another process
+        for key, value in items:
+            self.put(key, value)
+
+    def clear(self):
+        self._entries.clear()
+        self._new_keys.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path):
+        with open(path, 'rb') as fin:
+            entries = pickle.load(fin)
+        for key, value in entries:
+            self.put(key, value)
+        #only entries learned after loading are new
+        self._new_keys.clear()
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        with open(path + '.tmp', 'wb') as fout:
+            pickle.dump(list(self._entries.items()), fout, protocol=2)
+        os.rename(path + '.tmp', path)
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        return "%d hits, %d misses (%.1f%% hit rate), %d entries" % (
+            self.hits, self.misses, 100.0 * self.hits / lookups if lookups else 0.0, len(self._entries))
+
+
+#shared by every call to pyknotid_classify in this process
+classification_cache = ClassificationCache()
 
 
 @contextmanager
@@ -100,11 +171,72 @@ def get_vertices_from_file(file_path, sep=' '):
     lines = []
     with open(file_path, 'r') as fin:
         lines = fin.readlines()
-    return map(lambda x: tuple(map(float, x.rstrip().split(sep))), lines)
+    return [tuple(map(float, line.rstrip().split(sep))) for line in lines]
 
 
-def get_homfly_plcurve(vertices, random_seed=None):
+HOMFLY_TERM_RE = re.compile(r'([+-]?)(\d*)((?:[az](?:\^\{-?\d+\}|\^-?\d+)?)*)')
+HOMFLY_FACTOR_RE = re.compile(r'([az])(?:\^\{?(-?\d+)\}?)?')
+
+
+def parse_plcurve_homfly(homfly_string):
+    #parses plCurve's HOMFLY output, e.g. "2a^{2} - a^{4} + a^{2}z^{2}", into a dictionary
+    #mapping (a exponent, z exponent) to integer coefficient. Returns None if it can't
+    homfly_string = homfly_string.replace(' ', '')
+    terms = {}
+    pos = 0
+    while pos < len(homfly_string):
+        match = HOMFLY_TERM_RE.match(homfly_string, pos)
+        sign, coefficient, factors = match.groups()
+        if (match.end() == pos) or (pos > 0 and not sign) or not (coefficient or factors):
+            return None
+        coefficient = int(coefficient) if coefficient else 1
+        if sign == '-':
+            coefficient = -coefficient
+
+        exponents = {'a': 0, 'z': 0}
+        for var_char, exponent in HOMFLY_FACTOR_RE.findall(factors):
+            exponents[var_char] += int(exponent) if exponent else 1
+        monomial = (exponents['a'], exponents['z'])
+        terms[monomial] = terms.get(monomial, 0) + coefficient
+        pos = match.end()
+
+    terms = dict((monomial, c) for monomial, c in terms.items() if c != 0)
+    return terms if terms else None
+
+
+def substitute_homfly_imaginary(terms):
+    #plCurve and pyknotid use different conventions, related by a -> ia, z -> iz.
+    #For knots every monomial has even total degree, so coefficients stay integers
+    substituted = {}
+    for (a_exp, z_exp), coefficient in terms.items():
+        degree = a_exp + z_exp
+        if degree % 2:
+            return None
+        substituted[(a_exp, z_exp)] = coefficient if (degree // 2) % 2 == 0 else -coefficient
+    return substituted
+
+
+def homfly_terms_key(terms):
+    #canonical hashable form of a HOMFLY terms dictionary
+    return tuple(sorted(terms.items()))
+
+
+def homfly_terms_to_sympy(terms):
+    #only build a sympy expression when pyknotid needs one
+    terms = dict(terms)
+    if list(terms) == [(0, 0)]:
+        #this should only happen when homfly = 1 (i.e. the knot is trivial)
+        return terms[(0, 0)]
+    import sympy as sym
+    z = sym.var('z')
+    a = sym.var('a')
+    return sym.Add(*[coefficient * a**a_exp * z**z_exp for (a_exp, z_exp), coefficient in terms.items()])
+
+
+def get_homfly_string_plcurve(vertices, random_seed=None):
     #takes list of 3-tuples which represent vertices
+    from libpl import plcurve
+    from libpl.pdcode import plctopology
     plc = plcurve.PlCurve()
     plc.add_component(vertices)
 
@@ -113,11 +245,25 @@ def get_homfly_plcurve(vertices, random_seed=None):
         random_seed = int(random.getrandbits(64))
     rng.set(random_seed)
 
-    homfly_string = plctopology.plc_knot_homfly(rng, plc)
+    return plctopology.plc_knot_homfly(rng, plc)
+
 
+def plcurve_homfly_to_terms(homfly_string):
+    #HOMFLY in pyknotid's convention as a terms dictionary (see parse_plcurve_homfly), or None
     if homfly_string == None:
         return None
+    terms = parse_plcurve_homfly(homfly_string)
+    if terms is None:
+        return None
+    return substitute_homfly_imaginary(terms)
+
+
+def get_homfly_terms_plcurve(vertices, random_seed=None):
+    return plcurve_homfly_to_terms(get_homfly_string_plcurve(vertices, random_seed))
 
+
+def eval_plcurve_homfly(homfly_string):
+    #general sympy conversion of plCurve's HOMFLY output, for anything the parser doesn't handle
     homfly_string = homfly_string.replace('^','**').replace('{','(').replace('}',')')
     homfly_string = homfly_string.replace(')a',')*a').replace(')z',')*z')
     for var_char in ['a','z']:
@@ -125,6 +271,7 @@ def get_homfly_plcurve(vertices, random_seed=None):
             homfly_string = homfly_string.replace('%s%s' % (num_char, var_char),
                                                   '%s*%s' % (num_char, var_char))
 
+    import sympy as sym
     z = sym.var('z')
     a = sym.var('a')
     homfly = eval(homfly_string)
@@ -135,25 +282,322 @@ def get_homfly_plcurve(vertices, random_seed=None):
         return homfly.subs(a,a*sym.I).subs(z,z*sym.I)
 
 
+def get_homfly_plcurve(vertices, random_seed=None):
+    #takes list of 3-tuples which represent vertices, returns HOMFLY as a sympy expression
+    homfly_string = get_homfly_string_plcurve(vertices, random_seed)
+
+    if homfly_string == None:
+        return None
+
+    terms = plcurve_homfly_to_terms(homfly_string)
+    if terms is None:
+        return eval_plcurve_homfly(homfly_string)
+    return homfly_terms_to_sympy(terms)
+
+
+class HomflyIndex(ClassificationCache):
+    """Index from HOMFLY polynomials to the prime catalogue knots which have them.
+
+    Each polynomial is looked up in the catalogue the first time it is seen. When
+    enabled, pyknotid_classify identifies a polygon from its HOMFLY alone if the
+    polynomial matches exactly one catalogue knot, without computing any other
+    invariants.
+    """
+
+    def __init__(self, maxsize=100000, path=None, enabled=False):
+        super(HomflyIndex, self).__init__(maxsize, path)
+        self.enabled = enabled
+
+    def candidates(self, terms):
+        key = homfly_terms_key(terms)
+        found, identifiers = self.get(key)
+        if not found:
+            identifiers = [str(x.identifier) for x in from_invariants(homfly=homfly_terms_to_sympy(terms))]
+            self.put(key, identifiers)
+        return identifiers
+
+
+homfly_index = HomflyIndex()
+
+
+class StickDiagram(object):
+    """The invariants pyknotid_classify needs from the z-projection of a stick polygon.
+
+    Crossings are found with stick_geometry.raw_crossings, in the same format
+    and with the same conventions as pyknotid's Knot.raw_crossings, so the
+    invariants are those Knot would give, without Knot's general space curve
+    machinery. As in Knot, the Gauss code is simplified once and the simplified
+    code is used for everything but the hyperbolic volume.
+    """
+
+    def __init__(self, vertices=None, crossings=None):
+        from pyknotid.representations.gausscode import GaussCode
+        self.crossings = raw_crossings(vertices) if crossings is None else crossings
+        self.gauss_code = GaussCode(self.crossings, verbose=False)
+        self.gauss_code.simplify()
+        self._exterior = None
+
+    def num_crossings(self):
+        return len(self.gauss_code)
+
+    def alexander_at_root(self, root):
+        from pyknotid.invariants import alexander
+        value = np.abs(alexander(self.gauss_code, variable=np.exp(2 * np.pi * 1.j / root), simplify=False))
+        if root in (1, 2, 3, 4):
+            return int(np.round(value))
+        return value
+
+    def vassiliev_degree_2(self):
+        from pyknotid.invariants import vassiliev_degree_2
+        return vassiliev_degree_2(self.gauss_code)
+
+    def vassiliev_degree_3(self):
+        from pyknotid.invariants import vassiliev_degree_3
+        return vassiliev_degree_3(self.gauss_code)
+
+    def exterior(self):
+        #the SnapPy manifold of the knot complement, built once
+        if self._exterior is None:
+            from pyknotid.representations.planardiagram import PlanarDiagram
+            link = PlanarDiagram(self.crossings).as_spherogram()
+            link.simplify()
+            self._exterior = link.exterior()
+        return self._exterior
+
+    def hyperbolic_volume(self):
+        #(volume, accuracy, solution type) as from Knot.hyperbolic_volume
+        manifold = self.exterior()
+        volume = manifold.volume()
+        return (float(volume), volume.accuracy, manifold.solution_type())
+
+
+def catalogue_knot(name):
+    #the pyknotid database entry of a prime knot, or None
+    found = from_invariants(id=name)
+    return found[0] if found else None
+
+
+def catalogue_exterior(name):
+    #SnapPy's exterior of a catalogue knot, e.g. 5_2 or K11n34, or None if SnapPy doesn't know it
+    import snappy
+    try:
+        return snappy.Manifold(name)
+    except (IOError, ValueError, RuntimeError):
+        return None
+
+
+def alexander_at_roots(polynomial, roots):
+    #|alexander(exp(2 pi i / r))| for each root r of a sympy polynomial in one variable
+    variables = list(polynomial.free_symbols)
+    if not variables:
+        return tuple(abs(complex(polynomial)) for root in roots)
+    return tuple(abs(complex(polynomial.subs(variables[0], np.exp(2 * np.pi * 1.j / root)))) for root in roots)
+
+
+def cover_homologies(manifold, degrees=(2, 3, 4)):
+    #the first homology groups of the covers of each degree, which often tell mutants apart
+    return tuple(tuple(sorted(str(cover.homology()) for cover in manifold.covers(degree))) for degree in degrees)
+
+
+def close_values(value, other, tolerance=1e-4):
+    return all(abs(x - y) < tolerance for x, y in zip(value, other))
+
+
+def polygon_alexander(knot):
+    return tuple(knot.alexander_at_root(root) for root in (2, 3, 4))
+
+
+def candidate_alexander(name):
+    knot = catalogue_knot(name)
+    if knot is None:
+        return None
+    return (knot.determinant, knot.alexander_imag_3, knot.alexander_imag_4)
+
+
+def matching_alexander(value, candidate_value):
+    #the catalogue is missing some values, which rule nothing out
+    return all(y is None or x == y for x, y in zip(value, candidate_value))
+
+
+def polygon_higher_alexander(knot):
+    return tuple(round(knot.alexander_at_root(root), 4) for root in (5, 6, 8))
+
+
+def candidate_higher_alexander(name):
+    knot = catalogue_knot(name)
+    if knot is None or not knot.alexander:
+        return None
+    from pyknotid.catalogue.converters import db2py_alexander
+    return tuple(round(x, 4) for x in alexander_at_roots(db2py_alexander(knot.alexander), (5, 6, 8)))
+
+
+def polygon_volume(knot):
+    volume, accuracy, note = knot.hyperbolic_volume()
+    if note == 'contains degenerate tetrahedra':
+        return None
+    return (round(volume, 4) if volume >= 0.1 else 0.0,)
+
+
+def candidate_volume(name):
+    exterior = catalogue_exterior(name)
+    if exterior is None:
+        return None
+    volume = float(exterior.volume())
+    return (round(volume, 4) if volume >= 0.1 else 0.0,)
+
+
+def polygon_covers(knot):
+    return cover_homologies(knot.exterior())
+
+
+def candidate_covers(name):
+    exterior = catalogue_exterior(name)
+    return None if exterior is None else cover_homologies(exterior)
+
+
+def candidate_isometry_signature(name):
+    exterior = catalogue_exterior(name)
+    return None if exterior is None else exterior.triangulation_isosig()
+
+
+def isometric_exterior(exterior, isosig):
+    #SnapPy sometimes can't decide, which rules nothing out
+    import snappy
+    try:
+        return bool(exterior.is_isometric_to(snappy.Manifold(isosig)))
+    except RuntimeError:
+        return True
+
+
+#(name, polygon value, candidate value, whether they match) of each disambiguation stage, cheapest first.
+#Mutants share the HOMFLY and Alexander polynomials and the hyperbolic volume, so only the last two
+#stages tell them apart; the others settle candidates pyknotid was missing the HOMFLY or volume for
+DISAMBIGUATION_STAGES = [
+    ('alexander', polygon_alexander, candidate_alexander, matching_alexander),
+    ('higher_alexander', polygon_higher_alexander, candidate_higher_alexander, close_values),
+    ('volume', polygon_volume, candidate_volume, close_values),
+    ('covers', polygon_covers, candidate_covers, lambda value, candidate_value: value == candidate_value),
+    ('isometry', lambda knot: knot.exterior(), candidate_isometry_signature, isometric_exterior),
+]
+DISAMBIGUATION_STAGE_NAMES = [stage[0] for stage in DISAMBIGUATION_STAGES]
+
+
+class Disambiguator(ClassificationCache):
+    """Staged disambiguation of polygons pyknotid can only narrow down to a list of candidates.
+
+    Each stage of DISAMBIGUATION_STAGES computes one more invariant of the
+    polygon, cheapest first, and drops the candidates whose catalogue value
+    disagrees, until only one is left. The candidates' values are cached per
+    set of candidates, computed the first time a stage is reached for that set,
+    and a stage is skipped for a polygon when they don't tell its remaining
+    candidates apart, so the expensive invariants are only computed when they
+    can settle something.
+    """
+
+    def __init__(self, maxsize=10000, path=None, enabled=False, stages=None):
+        super(Disambiguator, self).__init__(maxsize, path)
+        self.enabled = enabled
+        self.stages = stages or DISAMBIGUATION_STAGE_NAMES
+        #the number of polygons each stage settled, and those none did
+        self.resolved = Counter()
+
+    def candidate_values(self, candidates, stage, candidate_value):
+        #{candidate: value} for a stage, looked up in the catalogue once per set of candidates
+        key = tuple(sorted(candidates))
+        found, values = self.get(key)
+        if not found:
+            values = {}
+        if stage not in values:
+            values[stage] = dict((candidate, candidate_value(candidate)) for candidate in key)
+            self.put(key, values)
+        return values[stage]
+
+    def merge(self, items):
+        #another process may have reached other stages for the same candidates
+        for key, values in items:
+            if key in self._entries:
+                values = dict(self._entries[key], **values)
+            self.put(key, values)
+
+    def disambiguate(self, knot, candidates):
+        #the one candidate consistent with the StickDiagram knot, or the list of those which remain
+        remaining = list(candidates)
+        for stage, polygon_value, candidate_value, matches in DISAMBIGUATION_STAGES:
+            if stage not in self.stages:
+                continue
+            values = self.candidate_values(candidates, stage, candidate_value)
+            if len(set(values[candidate] for candidate in remaining)) < 2:
+                #this stage can't tell the remaining candidates apart
+                continue
+            value = polygon_value(knot)
+            if value is None:
+                continue
+            agreeing = [x for x in remaining if values[x] is None or matches(value, values[x])]
+            #if no candidate agrees the polygon's value is suspect, so it is ignored
+            if agreeing:
+                remaining = agreeing
+            if len(remaining) == 1:
+                self.resolved[stage] += 1
+                return remaining[0]
+        self.resolved['unresolved'] += 1
+        return remaining
+
+    def summary(self):
+        return ", ".join("%s %d" % (stage, self.resolved[stage])
+                         for stage in DISAMBIGUATION_STAGE_NAMES + ['unresolved'] if self.resolved[stage])
+
+
+disambiguator = Disambiguator()
+
+
+def configure_caches(classification_cache_path=None, classification_cache_size=None, homfly_index_path=None,
+                     disambiguation_cache_path=None, disambiguation_stages=None):
+    #sets up this process's caches and loads them from the given paths. Worker processes are handed the
+    #settings and call this themselves, as a process started with spawn rather than fork begins with empty,
+    #disabled caches
+    if classification_cache_size:
+        classification_cache.maxsize = classification_cache_size
+    if classification_cache_path and os.path.exists(classification_cache_path):
+        classification_cache.load(classification_cache_path)
+    homfly_index.enabled = bool(homfly_index_path)
+    if homfly_index_path and os.path.exists(homfly_index_path):
+        homfly_index.load(homfly_index_path)
+    disambiguator.enabled = bool(disambiguation_cache_path)
+    disambiguator.stages = disambiguation_stages or DISAMBIGUATION_STAGE_NAMES
+    if disambiguation_cache_path and os.path.exists(disambiguation_cache_path):
+        disambiguator.load(disambiguation_cache_path)
+
+
 def pyknotid_classify(vertices):
     id_list = []
     identify_kwargs = {}
     knot = None
+    #plCurve and the crossing computation both read the vertices, so any iterable is read once here
+    vertices = np.asarray(list(vertices), dtype=np.float64)
 
     #annoyingly, pyknotid stuff prints to command line excessively
     with silence_stdout():
-        knot = Knot(np.array(vertices))
-        sym_homfly = get_homfly_plcurve(vertices)
-        if sym_homfly is not None:
-            identify_kwargs['homfly'] = sym_homfly
+        homfly_string = get_homfly_string_plcurve(vertices)
+        homfly_terms = plcurve_homfly_to_terms(homfly_string)
+        if (homfly_terms is not None) and homfly_index.enabled:
+            candidates = homfly_index.candidates(homfly_terms)
+            if len(candidates) == 1:
+                return candidates[0]
+
+        knot = StickDiagram(vertices)
+        if homfly_terms is not None:
+            #kept in compact form, only converted to sympy if we need the database
+            identify_kwargs['homfly'] = homfly_terms_key(homfly_terms)
+        elif homfly_string is not None:
+            identify_kwargs['homfly'] = eval_plcurve_homfly(homfly_string)
         else:
             #if HOMFLY fails, we can try some roots of the alexander poly
             for root in (2,3,4):
                 identify_kwargs['alex_imag_{}'.format(root)] = knot.alexander_at_root(root)
         identify_kwargs['v2'] = knot.vassiliev_degree_2()
         identify_kwargs['v3'] = knot.vassiliev_degree_3()
-        if len(knot.gauss_code()) < 16:
-            identify_kwargs['max_crossings'] = len(knot.gauss_code())
+        if knot.num_crossings() < 16:
+            identify_kwargs['max_crossings'] = knot.num_crossings()
         hyp_vol, sig_figs, note = knot.hyperbolic_volume()
         #sometimes very small values come back, which should be assumed to be zero
         #the smallest conjectured knot hyperbolic volume is around 2
@@ -174,29 +618,45 @@ def pyknotid_classify(vertices):
                 volume_string += "."
             identify_kwargs['hyperbolic_volume'] = volume_string
 
-        #pyknotid defaults to only searching prime knots
-        id_list = from_invariants(**identify_kwargs)
-
-        if len(id_list) == 1:
-            #Great! We've got an identification
-            return str(id_list[0].identifier)
-
-        elif ( (len(id_list) == 0) and
-               (identify_kwargs['hyperbolic_volume'] == 'Not hyperbolic') ):
-            #If it's not hyperbolic, maybe the knot is composite, let's check.
-            #pyknotid support for composite knots isn't great however
-            identify_kwargs['composite'] = True
-            composite_check = from_invariants(**identify_kwargs)
-            if len(composite_check) == 1:
-                #Great! We've got a composite identification
-                return str(composite_check[0].identifier).replace("#"," # ")
-        else:
-            #Otherwise, return list of candidates
-            return map(lambda x:str(x.identifier), id_list)
+        #the same invariants come up over and over, so skip the database when we can
+        cache_key = classification_cache.make_key(identify_kwargs)
+        found, identification = classification_cache.get(cache_key)
+        if not found:
+            identification = identify_from_invariants(identify_kwargs)
+            classification_cache.put(cache_key, identification)
+        if disambiguator.enabled and isinstance(identification, list) and len(identification) > 1:
+            identification = disambiguator.disambiguate(knot, identification)
+        return identification
+
+
+def identify_from_invariants(identify_kwargs):
+    if isinstance(identify_kwargs.get('homfly'), tuple):
+        identify_kwargs = dict(identify_kwargs, homfly=homfly_terms_to_sympy(identify_kwargs['homfly']))
+
+    #pyknotid defaults to only searching prime knots
+    id_list = from_invariants(**identify_kwargs)
+
+    if len(id_list) == 1:
+        #Great! We've got an identification
+        return str(id_list[0].identifier)
+
+    elif ( (len(id_list) == 0) and
+           (identify_kwargs['hyperbolic_volume'] == 'Not hyperbolic') ):
+        #If it's not hyperbolic, maybe the knot is composite, let's check.
+        #pyknotid support for composite knots isn't great however
+        composite_check = from_invariants(composite=True, **identify_kwargs)
+        if len(composite_check) == 1:
+            #Great! We've got a composite identification
+            return str(composite_check[0].identifier).replace("#"," # ")
+    else:
+        #Otherwise, return list of candidates
+        return [str(x.identifier) for x in id_list]
 
 
 def plcurve_classify(vertices, random_seed=None):
     #takes list of 3-tuples which represent vertices
+    from libpl import plcurve
+    from libpl.pdcode import plctopology
     plc = plcurve.PlCurve()
     plc.add_component(vertices)
 
@@ -218,13 +678,164 @@ def plcurve_classify(vertices, random_seed=None):
 
 
 
+def iter_generation_csv_polygons(csv_path, statuses=None, binary_path=None):
+    #(label, vertices) for the rows of a generate_random_stick_knots.py csv, optionally only some is_best values.
+    #Runs with -bin leave string_repr empty and write the polygons to a binary file, which is read for those
+    #rows if binary_path is given; rows whose polygon is in neither are counted and reported on stderr
+    binary_vertices = {}
+    if binary_path:
+        from polygon_store import read_polygon_records
+        records = read_polygon_records(binary_path)
+        for i, (seed, iteration) in enumerate(zip(records['random_seed'], records['iteration'])):
+            binary_vertices[int(seed), int(iteration)] = i
+    skipped = 0
+    with open(csv_path, 'r') as fin:
+        for row in csv.DictReader(fin):
+            if statuses and row['is_best'] not in statuses:
+                continue
+            label = '%s_%s' % (row['random_seed'], row['iteration'])
+            if row['string_repr']:
+                vertices = np.array(row['string_repr'].split(), dtype=np.float64).reshape(-1, 3)
+            elif (int(row['random_seed']), int(row['iteration'])) in binary_vertices:
+                i = binary_vertices[int(row['random_seed']), int(row['iteration'])]
+                vertices = np.array(records['vertices'][i], dtype=np.float64)
+            else:
+                skipped += 1
+                continue
+            yield label, vertices
+    if skipped:
+        sys.stderr.write("Skipped %d rows of %s with no polygon in string_repr%s\n" % (
+            skipped, csv_path, " or %s" % binary_path if binary_path else ", pass the run's -bin file with -bin"))
+
+
+def timed_classify(item):
+    #runs in the worker processes of classify_polygons
+    label, vertices = item
+    start = time.time()
+    try:
+        identification = pyknotid_classify([tuple(v) for v in np.asarray(vertices).tolist()])
+    except Exception as e:
+        identification = 'ERROR: %s' % e
+    return label, identification, time.time() - start
+
+
+CLASSIFY_POLL_SECONDS = 1.0
+
+
+def classify_worker(connection, results):
+    #runs in the worker processes of classify_polygons, classifying the polygons sent down connection until None
+    name = multiprocessing.current_process().name
+    for item in iter(connection.recv, None):
+        results.put((name, timed_classify(item)))
+
+
+def classify_polygons(items, processes=1):
+    #yields (label, identification, seconds) as each polygon of items is classified, in any order.
+    #Each worker is handed one polygon at a time, so a worker which dies outside Python (say in pyknotid's
+    #or plCurve's C code) gives an error for the polygon it had and is replaced, instead of hanging the run
+    if processes <= 1:
+        for item in items:
+            yield timed_classify(item)
+        return
+
+    results = multiprocessing.Queue()
+    #name -> [process, connection, (label, start time) of the polygon it is classifying or None]
+    workers = {}
+
+    def start_worker():
+        connection, child_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=classify_worker, args=(child_connection, results))
+        process.daemon = True
+        process.start()
+        workers[process.name] = [process, connection, None]
+
+    for _ in range(processes):
+        start_worker()
+    items = iter(items)
+    exhausted = False
+    try:
+        while True:
+            for worker in workers.values():
+                if worker[2] is None and not exhausted:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    worker[1].send(item)
+                    worker[2] = (item[0], time.time())
+            if exhausted and all(worker[2] is None for worker in workers.values()):
+                break
+            try:
+                name, result = results.get(timeout=CLASSIFY_POLL_SECONDS)
+            except Empty:
+                for name, (process, connection, current) in list(workers.items()):
+                    if process.exitcode is None:
+                        continue
+                    del workers[name]
+                    connection.close()
+                    start_worker()
+                    if current is not None:
+                        yield (current[0], 'ERROR: the worker process died (exit code %d)' % process.exitcode,
+                               time.time() - current[1])
+                continue
+            if name in workers:
+                workers[name][2] = None
+            yield result
+    finally:
+        for process, connection, current in workers.values():
+            if current is None and process.is_alive():
+                connection.send(None)
+            else:
+                process.terminate()
+        for process, connection, current in workers.values():
+            process.join()
+            connection.close()
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
 
-    parser.add_argument('-kf', '--KNOT_FILE', type=str, required=True, dest='KNOT_FILE',
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('-kf', '--KNOT_FILE', type=str, dest='KNOT_FILE',
                         help="Path to KnotPlot formatted knot file")
+    source.add_argument('-kd', '--KNOT_DIRECTORY', type=str, dest='KNOT_DIRECTORY',
+                        help="Identify every KnotPlot formatted file (*.txt) in this directory")
+    source.add_argument('-db', '--DATABASE', type=str, dest='DATABASE',
+                        help="Identify every polygon in a sqlite database such as stick_number/mseq_knots.db")
+    source.add_argument('-csv', '--GENERATION_CSV', type=str, dest='GENERATION_CSV',
+                        help="Identify the polygons recorded in a csv written by generate_random_stick_knots.py")
+    parser.add_argument('-bin', '--BINARY_FILE', type=str, dest='BINARY_FILE',
+                        help="Binary polygon file written alongside the csv with -bin, for the rows whose string_repr "
+                             "is empty")
+    parser.add_argument('-s', '--STATUS', type=str, nargs='+', dest='STATUS',
+                        help="Only identify csv rows with these is_best values, e.g. UNCL")
+    parser.add_argument('-p', '--MAX_PROCESSES', type=int, default=1, dest='MAX_PROCESSES',
+                        help="Number of processes to classify with in batch mode")
+    parser.add_argument('-o', '--OUT', type=str, dest='OUT',
+                        help="Path to write batch results as csv. If not provided will print to command line")
 
     args = parser.parse_args()
 
-    print(pyknotid_classify(get_vertices_from_file(args.KNOT_FILE, sep='\t')))
+    if args.KNOT_FILE:
+        print(pyknotid_classify(get_vertices_from_file(args.KNOT_FILE, sep='\t')))
+        sys.exit(0)
+
+    if args.GENERATION_CSV:
+        items = iter_generation_csv_polygons(args.GENERATION_CSV, args.STATUS, args.BINARY_FILE)
+    else:
+        from polygon_store import load_polygons
+        items = iter(load_polygons(args.KNOT_DIRECTORY or args.DATABASE))
+
+    fout = open(args.OUT, 'w') if args.OUT else sys.stdout
+    #labels and error messages may contain commas or quotes
+    writer = csv.writer(fout, lineterminator='\n')
+    writer.writerow(['source', 'identification', 'seconds'])
+    for label, identification, seconds in classify_polygons(items, args.MAX_PROCESSES):
+        if isinstance(identification, list):
+            identification = ' | '.join(identification)
+        writer.writerow([label, identification, '%.6f' % seconds])
+        fout.flush()
+    if args.OUT:
+        fout.close()
@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import time
+import random
+import numpy as np
+
+
+class StageTimer(object):
+    """Accumulates the time spent in named stages of the generation and classification code.
+
+    Totals and counts are exact. Latency percentiles are computed from a
+    uniform reservoir sample of at most `max_samples` timings per stage, so
+    memory stays bounded on long runs.
+    """
+
+    def __init__(self, max_samples=10000, seed=0):
+        self.max_samples = max_samples
+        self.counts = {}
+        self.totals = {}
+        self.maxima = {}
+        self.samples = {}
+        self._random = random.Random(seed)
+
+    def add(self, stage, seconds):
+        count = self.counts.get(stage, 0) + 1
+        self.counts[stage] = count
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+        if seconds > self.maxima.get(stage, 0.0):
+            self.maxima[stage] = seconds
+
+        samples = self.samples.setdefault(stage, [])
+        if len(samples) < self.max_samples:
+            samples.append(seconds)
+        else:
+            #reservoir sampling keeps a uniform sample of all timings
+            i = self._random.randrange(count)
+            if i < self.max_samples:
+                samples[i] = seconds
+
+    def summary(self):
+        out = {}
+        for stage in sorted(self.counts):
+            samples = np.asarray(self.samples[stage])
+            p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+            out[stage] = {
+                'count': self.counts[stage],
+                'total_seconds': self.totals[stage],
+                'mean_seconds': self.totals[stage] / self.counts[stage],
+                'p50_seconds': float(p50),
+                'p90_seconds': float(p90),
+                'p99_seconds': float(p99),
+                'max_seconds': self.maxima[stage],
+            }
+        return out
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return "%d:%02d:%02d" % (seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+
+class ProgressReporter(object):
+    """Periodically reports throughput, estimated time remaining and per-stage statistics of a run.
+
+    A progress line is printed every `interval` seconds (if positive), and the
+    same information is written as json to `stats_out` (if given).
+    """
+
+    def __init__(self, max_iterations, max_seconds, interval=0, stats_out=None, start_iteration=0):
+        self.max_iterations = max_iterations
+        self.max_seconds = max_seconds
+        self.interval = interval
+        self.stats_out = stats_out
+        self.start_iteration = start_iteration
+        self.start_time = time.time()
+        #when no progress lines are wanted, still refresh the stats file once a minute
+        self.period = interval if interval > 0 else 60
+        self.next_report = self.start_time + self.period
+
+    def stats(self, iteration, timer, path_counter, now=None):
+        now = now or time.time()
+        elapsed = now - self.start_time
+        rate = (iteration - self.start_iteration) / elapsed if elapsed > 0 else 0.0
+        remaining = self.max_iterations - iteration
+        eta = min(remaining / rate if rate > 0 else float('inf'), max(0.0, self.max_seconds - elapsed))
+
+        stages = timer.summary()
+        integrand_seconds = stages.get('integrand', {}).get('total_seconds', 0.0)
+        return {
+            'iteration': iteration,
+            'max_iterations': self.max_iterations,
+            'elapsed_seconds': elapsed,
+            'polygons_per_second': rate,
+            'eta_seconds': eta,
+            #everything outside the integrand is the Markov chain itself
+            'mcmc_seconds': elapsed - integrand_seconds,
+            'paths': dict(path_counter),
+            'stages': stages,
+        }
+
+    def write_stats(self, stats):
+        with open(self.stats_out + '.tmp', 'w') as fout:
+            json.dump(stats, fout, indent=2, sort_keys=True)
+        os.rename(self.stats_out + '.tmp', self.stats_out)
+
+    def report(self, iteration, timer, path_counter, now=None):
+        stats = self.stats(iteration, timer, path_counter, now)
+        if self.interval > 0:
+            paths = stats['paths']
+            print("[progress] %d/%d polygons (%.1f%%), %.1f polygons/s, ETA %s, "
+                  "pyknotid fallback %d, pyknotid recheck %d, unclassifiable %d" % (
+                      iteration, self.max_iterations, 100.0 * iteration / self.max_iterations,
+                      stats['polygons_per_second'], format_duration(stats['eta_seconds']),
+                      paths.get('pyknotid_fallback', 0), paths.get('pyknotid_recheck', 0),
+                      paths.get('unclassifiable', 0)))
+            sys.stdout.flush()
+        if self.stats_out:
+            self.write_stats(stats)
+        return stats
+
+    def due(self, now):
+        #called after every sample; cheap unless a report is due
+        if now >= self.next_report:
+            self.next_report = now + self.period
+            return True
+        return False
+
+
+class EffectiveSampleSize(object):
+    """Batch means estimates of the effective sample size of the frequency of each knot type.
+
+    Samples from a Markov chain are correlated, so n of them carry less
+    information than n independent draws. The chain's sequence of knot types is
+    cut into batches of `batch_size` samples, and for each knot type the
+    variance of its per-batch frequency is compared with what independent
+    samples would give. Only the per-batch counts are kept.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = max(1, batch_size)
+        self.batches = []
+        self.current = {}
+        self.current_size = 0
+
+    def add(self, key):
+        self.current[key] = self.current.get(key, 0) + 1
+        self.current_size += 1
+        if self.current_size == self.batch_size:
+            self.batches.append(self.current)
+            self.current = {}
+            self.current_size = 0
+
+    def ess(self, key):
+        #None until there are at least two complete batches
+        if len(self.batches) < 2:
+            return None
+        n = len(self.batches) * self.batch_size
+        means = np.array([batch.get(key, 0) for batch in self.batches], dtype=np.float64) / self.batch_size
+        p = means.mean()
+        batch_variance = means.var(ddof=1)
+        if batch_variance == 0:
+            return float(n)
+        return min(float(n), n * p * (1 - p) / (self.batch_size * batch_variance))
@@ -0,0 +1,144 @@
+import os
+import glob
+import pickle
+import argparse
+from collections import Counter
+from knot_tables import knot_tuple_to_string, knot_string_to_tuple
+
+
+FREQUENCY_TABLE_HEADER = 'knot type / confinement radius'
+FREQUENCY_TABLE_NAME = '%dstick_knot_frequency.csv'
+
+
+def knot_label(knot):
+    #knot counters are keyed by knot tuples, except for special entries like "Unclassifiable"
+    if isinstance(knot, str):
+        return knot
+    label = knot_tuple_to_string(knot)
+    return label if label is not None else str(knot)
+
+
+def knot_label_sort_key(label):
+    #prime knots by crossing number and index, then composite knots, then anything else
+    knot_tuple = knot_string_to_tuple(label.rstrip('*'))
+    if knot_tuple is None:
+        return (1, 0, (), label)
+    components = tuple((c[0], '', c[1]) if len(c) == 2 else c for c in knot_tuple)
+    return (0, len(components), components, label)
+
+
+class KnotCountAggregator(object):
+    """Merged knot frequency counts, kept separately for each number of edges and confinement radius."""
+
+    def __init__(self):
+        #num_edges -> confinement radius -> Counter keyed by knot label
+        self.counts = {}
+
+    def add(self, num_edges, confinement_radius, knot_counter):
+        by_radius = self.counts.setdefault(num_edges, {})
+        merged = by_radius.setdefault(float(confinement_radius), Counter())
+        for knot, count in knot_counter.items():
+            merged[knot_label(knot)] += count
+
+    def total(self, num_edges, confinement_radius):
+        return sum(self.counts.get(num_edges, {}).get(float(confinement_radius), Counter()).values())
+
+    def frequency_table_rows(self, num_edges):
+        by_radius = self.counts.get(num_edges, {})
+        radii = sorted(by_radius)
+        labels = set()
+        for counter in by_radius.values():
+            labels.update(counter)
+
+        rows = [[FREQUENCY_TABLE_HEADER] + [str(radius) for radius in radii]]
+        for label in sorted(labels, key=knot_label_sort_key):
+            rows.append([label] + [str(by_radius[radius][label]) for radius in radii])
+        return rows
+
+    def write_frequency_tables(self, directory):
+        #one table per number of edges, in the layout of stick_number/frequency_counts
+        paths = []
+        for num_edges in sorted(self.counts):
+            path = os.path.join(directory, FREQUENCY_TABLE_NAME % num_edges)
+            with open(path + '.tmp', 'w') as fout:
+                for row in self.frequency_table_rows(num_edges):
+                    fout.write(','.join(row) + '\n')
+            os.rename(path + '.tmp', path)
+            paths.append(path)
+        return paths
+
+    def read_frequency_table(self, path, num_edges):
+        #merge in a table previously written by write_frequency_tables
+        with open(path, 'r') as fin:
+            radii = [float(radius) for radius in fin.readline().rstrip('\r\n').split(',')[1:]]
+            for line in fin:
+                fields = line.rstrip('\r\n').split(',')
+                for radius, count in zip(radii, fields[1:]):
+                    #blank entries are zero counts
+                    self.add(num_edges, radius, {fields[0]: int(count or 0)})
+
+
+def read_knot_counter(path):
+    with open(path, 'rb') as fin:
+        return pickle.load(fin)
+
+
+def merged_record_path(table_path):
+    #the list of knot count files already added to a frequency table, kept beside it
+    return table_path + '.merged'
+
+
+def read_merged_record(table_path):
+    with open(merged_record_path(table_path), 'r') as fin:
+        return set(line.rstrip('\r\n') for line in fin if line.strip())
+
+
+def write_merged_record(table_path, names):
+    path = merged_record_path(table_path)
+    with open(path + '.tmp', 'w') as fout:
+        for name in sorted(names):
+            fout.write(name + '\n')
+    os.rename(path + '.tmp', path)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-k', '--KNOT_COUNTS_DIRECTORY', type=str, required=True, dest='KNOT_COUNTS_DIRECTORY',
+                        help="Directory of pickled knot frequency counts written by generate_stick_knots_batch.py")
+    parser.add_argument('-ne', '--NUMBER_OF_EDGES', type=int, required=True, dest='NUMBER_OF_EDGES',
+                        help="The number of edges of the polygons counted")
+    parser.add_argument('-cr', '--CONFINEMENT_RADIUS', type=float, default=1.01, dest='CONFINEMENT_RADIUS',
+                        help="The confinement radius the polygons were generated at")
+    parser.add_argument('-o', '--OUT_DIRECTORY', type=str, required=True, dest='OUT_DIRECTORY',
+                        help="The directory to write the merged frequency table to. An existing table there is added "
+                             "to, skipping the knot count files already merged into it")
+    parser.add_argument('-f', '--FORCE_ADD', action='store_true', dest='FORCE_ADD',
+                        help="Add to an existing table with no record of the knot count files merged into it, "
+                             "such as one written by generate_stick_knots_batch.py -m")
+
+    args = parser.parse_args()
+
+    aggregator = KnotCountAggregator()
+    table_path = os.path.join(args.OUT_DIRECTORY, FREQUENCY_TABLE_NAME % args.NUMBER_OF_EDGES)
+    #knot count files are recorded by name, so running the command again only adds new ones
+    merged = set()
+    if os.path.exists(table_path):
+        if os.path.exists(merged_record_path(table_path)):
+            merged = read_merged_record(table_path)
+        elif not args.FORCE_ADD:
+            parser.error("%s has no record of the knot count files merged into it, so they could be counted "
+                         "twice. Remove it to rebuild it from the knot count files, or give -f to add to it" %
+                         table_path)
+        aggregator.read_frequency_table(table_path, args.NUMBER_OF_EDGES)
+
+    pickle_paths = sorted(glob.glob(os.path.join(args.KNOT_COUNTS_DIRECTORY, '%d_*.pkl' % args.NUMBER_OF_EDGES)))
+    new_paths = [path for path in pickle_paths if os.path.basename(path) not in merged]
+    for path in new_paths:
+        aggregator.add(args.NUMBER_OF_EDGES, args.CONFINEMENT_RADIUS, read_knot_counter(path))
+
+    aggregator.write_frequency_tables(args.OUT_DIRECTORY)
+    write_merged_record(table_path, merged | set(os.path.basename(path) for path in new_paths))
+    print("Merged %d knot count files into %s, skipping %d already there" %
+          (len(new_paths), table_path, len(pickle_paths) - len(new_paths)))
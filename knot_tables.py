@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import numpy as np
+
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stick_number')
+STICK_NUMBER_UPPER_BOUNDS_CSV = os.path.join(DATA_DIRECTORY, 'stick_number_upper_bounds.csv')
+NON_UNIQUE_HOMFLY_CSV = os.path.join(DATA_DIRECTORY, 'non_unique_homfly_knots.csv')
+MSEQ_KNOTS_DB = os.path.join(DATA_DIRECTORY, 'mseq_knots.db')
+SUPERBRIDGE_VALUES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'superbridge_index',
+                                      'superbridge_values.csv')
+
+
+def knot_tuple_to_string(knot_tuple):
+    out_string = []
+    if knot_tuple == None:
+        return None
+    for component in sorted(knot_tuple):
+        if len(component) == 2:
+            #component of the form "5_2"
+            out_string.append('_'.join(map(str,component)))
+        elif len(component) == 3:
+            #component of the form "K11n169"
+            out_string.append('K' + ''.join(map(str,component)))
+        else:
+            #badly formatted knot tuple
+            return None
+    #
+    return ' # '.join(out_string)
+
+
+def knot_string_to_tuple(knot_string):
+    out_tuple = []
+    if knot_string == None:
+        return None
+    if isinstance(knot_string, list):
+        return None
+    for component in knot_string.split(" # "):
+        if component.startswith("K"):
+            #>=11 crossings
+            if "a" in component:
+                #alternating
+                crossings, index = map(int, component.lstrip("K").split("a"))
+                out_tuple.append((crossings, "a", index))
+            elif "n" in component:
+                #non-alternating
+                crossings, index = map(int, component.lstrip("K").split("n"))
+                out_tuple.append((crossings, "n", index))
+            else:
+                #badly formatted knot string
+                return None
+        else:
+            #component of the form "5_2"
+            try:
+                out_tuple.append(tuple(map(int, component.split("_"))))
+            except ValueError:
+                return None
+    #
+    return tuple(sorted(out_tuple))
+
+
+def read_knot_column_csv(path):
+    #rows of a "knot, value, ..." csv as ((crossing_number, index), [values]), skipping the header
+    rows = []
+    with open(path, 'r') as fin:
+        next(fin)
+        for line in fin:
+            fields = [field.strip() for field in line.rstrip('\r\n').split(',')]
+            if not fields[0]:
+                continue
+            crossing_number, index = fields[0].split('_')
+            rows.append(((int(crossing_number), int(index)), fields[1:]))
+    return rows
+
+
+def knot_table(entries, dtype):
+    #an array indexed by [crossing_number, index] holding the given values, zero elsewhere
+    shape = (max(k[0] for k in entries) + 1, max(k[1] for k in entries) + 1) if entries else (0, 0)
+    table = np.zeros(shape, dtype=dtype)
+    for (crossing_number, index), value in entries.items():
+        table[crossing_number, index] = value
+    return table
+
+
+def load_stick_number_upper_bounds(path=STICK_NUMBER_UPPER_BOUNDS_CSV):
+    #best stick number upper bounds, by [crossing_number, index], 0 for knots not in the table
+    return knot_table(dict((knot, int(values[0])) for knot, values in read_knot_column_csv(path)), np.int16)
+
+
+def load_equilateral_stick_numbers(upper_bounds_csv=STICK_NUMBER_UPPER_BOUNDS_CSV, mseq_db=MSEQ_KNOTS_DB):
+    #Best known equilateral stick numbers by [crossing_number, index], 0 for knots in neither table. The csv
+    #value is used unless the minimal equilateral knot database realizes a larger one (9_29, whose upper
+    #bound of 9 is not realized by an equilateral polygon) or the csv has no entry. Database knots above
+    #10 crossings are left out: their index is a Dowker-Thistlethwaite one, which only names a knot together
+    #with the alternating flag
+    equilateral = dict((knot, int(values[0])) for knot, values in read_knot_column_csv(upper_bounds_csv))
+    if mseq_db and os.path.exists(mseq_db):
+        conn = sqlite3.connect(mseq_db)
+        try:
+            for crossing_number, index, sticks in conn.execute(
+                    "SELECT crossing_number, knot_index, sticks FROM mseq_knots WHERE crossing_number <= 10;"):
+                if sticks > equilateral.get((crossing_number, index), 0):
+                    equilateral[(crossing_number, index)] = sticks
+        finally:
+            conn.close()
+    return knot_table(equilateral, np.int16)
+
+
+def load_non_unique_homfly(path=NON_UNIQUE_HOMFLY_CSV):
+    #True at [crossing_number, index] for the knots whose HOMFLY polynomial some other knot shares
+    return knot_table(dict((knot, True) for knot, values in read_knot_column_csv(path)), bool)
+
+
+def parse_index_interval(value):
+    #"4" -> (4, 4) and "[3,4]" -> (3, 4)
+    bounds = [int(x) for x in value.strip().strip('"').strip('[]').split(',')]
+    return bounds[0], bounds[-1]
+
+
+def load_superbridge_index_bounds(path=SUPERBRIDGE_VALUES_CSV):
+    #lower and upper bounds on the superbridge index, each by [crossing_number, index], 0 for knots not in
+    #the table. Intervals like "[3,4]" are split over two fields by the comma
+    bounds = dict((knot, parse_index_interval(','.join(values))) for knot, values in read_knot_column_csv(path))
+    return (knot_table(dict((knot, b[0]) for knot, b in bounds.items()), np.int16),
+            knot_table(dict((knot, b[1]) for knot, b in bounds.items()), np.int16))
+
+
+#loaded once at import, so worker processes share them with the parent
+equilateral_stick_numbers = load_equilateral_stick_numbers()
+stick_number_upper_bounds = load_stick_number_upper_bounds()
+non_unique_homfly = load_non_unique_homfly()
+superbridge_lower_bounds, superbridge_upper_bounds = load_superbridge_index_bounds()
+
+
+def equilateral_stick_number(crossing_number, index):
+    #None for knots not in the table
+    if crossing_number < equilateral_stick_numbers.shape[0] and index < equilateral_stick_numbers.shape[1]:
+        sticks = equilateral_stick_numbers[crossing_number, index]
+        if sticks:
+            return int(sticks)
+    return None
+
+
+def stick_number_upper_bound(crossing_number, index):
+    #the best stick number upper bound, which need not be realized by an equilateral polygon; None for knots
+    #not in the table
+    if crossing_number < stick_number_upper_bounds.shape[0] and index < stick_number_upper_bounds.shape[1]:
+        sticks = stick_number_upper_bounds[crossing_number, index]
+        if sticks:
+            return int(sticks)
+    return None
+
+
+def has_non_unique_homfly(crossing_number, index):
+    return bool(crossing_number < non_unique_homfly.shape[0] and index < non_unique_homfly.shape[1] and
+                non_unique_homfly[crossing_number, index])
+
+
+def superbridge_index_bounds(crossing_number, index):
+    #(lower, upper) bounds on the superbridge index, equal if it is known exactly; None for knots not in the table
+    if crossing_number < superbridge_upper_bounds.shape[0] and index < superbridge_upper_bounds.shape[1]:
+        upper = superbridge_upper_bounds[crossing_number, index]
+        if upper:
+            return int(superbridge_lower_bounds[crossing_number, index]), int(upper)
+    return None
@@ -0,0 +1,277 @@
+import time
+import ctypes
+import argparse
+import traceback
+import multiprocessing
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+from collections import Counter
+import numpy as np
+from seeds import derive_seed
+from identify_knot import classification_cache, homfly_index, disambiguator, configure_caches
+
+
+class SampleRing(object):
+    """A fixed number of polygon slots in shared memory, handed between processes by slot number.
+
+    A producer takes a free slot (waiting if there is none, which is what bounds
+    the pipeline), writes a polygon's vertices into it and queues the slot
+    number as filled. Whoever finishes with the polygon puts the slot back on
+    the free queue. Only slot numbers and classifications pass through the
+    queues; the vertices are never pickled.
+    """
+
+    def __init__(self, slots, num_edges):
+        self.shape = (slots, num_edges, 3)
+        self.vertices = multiprocessing.RawArray(ctypes.c_double, slots * num_edges * 3)
+        self.free = multiprocessing.Queue()
+        self.filled = multiprocessing.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self._array = None
+
+    def __getstate__(self):
+        #the numpy view is recreated in each process
+        state = self.__dict__.copy()
+        state['_array'] = None
+        return state
+
+    def array(self):
+        if self._array is None:
+            self._array = np.frombuffer(self.vertices, dtype=np.float64).reshape(self.shape)
+        return self._array
+
+    def put(self, vertices, iteration):
+        slot = self.free.get()
+        self.array()[slot] = vertices
+        self.filled.put((slot, iteration))
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def close(self):
+        #nobody reads the free slots after the run, so don't wait at exit for them to be flushed
+        for queue in (self.free, self.filled):
+            queue.close()
+            queue.cancel_join_thread()
+
+
+def chain_iterations(args):
+    #(chain, iterations, first iteration number) of each chain, sharing out MAX_ITERATIONS as run_chains does
+    chains = []
+    offset = 0
+    for chain in range(args.NUM_CHAINS):
+        iterations = args.MAX_ITERATIONS // args.NUM_CHAINS + (chain < args.MAX_ITERATIONS % args.NUM_CHAINS)
+        if iterations:
+            chains.append((chain, iterations, offset))
+        offset += iterations
+    return chains
+
+
+def worker_args(args, worker):
+    #the arguments of the StickKnotGenerator a classifier process uses; it writes and saves nothing itself
+    worker_args = argparse.Namespace(**vars(args))
+    for name in ['CSV_OUT', 'PARQUET_OUT', 'BINARY_OUT', 'SPOOL_OUT', 'KNOT_COUNTS_OUT', 'CHECKPOINT', 'STATS_OUT',
+                 'TARGET_KNOTS']:
+        setattr(worker_args, name, None)
+    worker_args.PROGRESS_INTERVAL = 0
+    worker_args.NUM_CHAINS = 1
+    worker_args.PIPELINE_WORKERS = 0
+    #its own plCurve and prefilter random streams
+    worker_args.RANDOM_SEED = derive_seed(args.RANDOM_SEED, 'classify', worker)
+    return worker_args
+
+
+def cache_settings(args):
+    #the keyword arguments of identify_knot.configure_caches given by a generator's arguments
+    return {'classification_cache_path': args.CLASSIFICATION_CACHE,
+            'classification_cache_size': args.CLASSIFICATION_CACHE_SIZE,
+            'homfly_index_path': args.HOMFLY_INDEX,
+            'disambiguation_cache_path': args.DISAMBIGUATION_CACHE,
+            'disambiguation_stages': args.DISAMBIGUATION_STAGES}
+
+
+def run_process(results, function, *args):
+    #runs a pipeline process, reporting any failure to the main process rather than dying silently
+    try:
+        function(*args)
+    except Exception:
+        results.put(('error', traceback.format_exc()))
+
+
+def sample_chain(args, chain, iterations, offset, ring, results):
+    #runs one Markov chain, seeded as in run_chains, queueing every polygon which isn't thinned out
+    from libpl import plcurve, tsmcmc
+    from generate_random_stick_knots import BURN_IN_ITERATIONS, get_numpy_coordinate_array
+
+    rng = plcurve.RandomGenerator()
+    rng.set(derive_seed(args.RANDOM_SEED, 'chain', chain))
+    counter = Counter()
+
+    def integrand(plc):
+        counter['generated'] += 1
+        iteration = offset + counter['generated']
+        if (args.THIN > 1) and (iteration % args.THIN):
+            counter['thinned'] += 1
+        else:
+            ring.put(get_numpy_coordinate_array(plc), iteration)
+            counter['queued'] += 1
+        return 0 #return value irrelevant
+
+    tsmcmc.confined_equilateral_expectation(rng, integrand, args.CONFINEMENT_RADIUS, args.NUMBER_OF_EDGES,
+                                            iterations + BURN_IN_ITERATIONS, args.MAX_SECONDS,
+                                            tsmcmc.RunParameters.default_confined())
+    results.put(('sampler_done', dict(counter)))
+
+
+def classify_fast(args, caches, worker, ring, slow, results):
+    #the prefilter and plCurve; polygons which need pyknotid go on to the slow lane, keeping their slot.
+    #caches are the cache_settings, which the process loads itself rather than relying on fork to copy them
+    from generate_random_stick_knots import StickKnotGenerator, make_plcurve
+    configure_caches(**caches)
+    generator = StickKnotGenerator(worker_args(args, worker))
+    while True:
+        item = ring.filled.get()
+        if item is None:
+            break
+        slot, iteration = item
+        plc = make_plcurve(ring.array()[slot])
+        prefiltered = args.PREFILTER_PROJECTIONS and generator.is_prefiltered_unknot(plc)
+        knot_tuple, needs_pyknotid = generator.identify_plcurve(plc, prefiltered)
+        if not prefiltered and knot_tuple is not None:
+            generator.path_counter['plcurve_classified'] += 1
+        if needs_pyknotid and args.SPOOL_OUT:
+            #the main process writes the spool
+            results.put(('pending', slot, iteration, knot_tuple))
+        elif needs_pyknotid:
+            slow.put((slot, iteration, knot_tuple))
+        else:
+            results.put(('sample', slot, iteration, knot_tuple, None))
+    results.put(worker_summary(generator))
+
+
+def classify_slow(args, caches, worker, ring, slow, results):
+    #pyknotid, for the polygons plCurve could not settle
+    from generate_random_stick_knots import StickKnotGenerator, make_plcurve
+    configure_caches(**caches)
+    generator = StickKnotGenerator(worker_args(args, worker))
+    while True:
+        item = slow.get()
+        if item is None:
+            break
+        slot, iteration, plcurve_knot_tuple = item
+        knot_tuple, candidates = generator.identify_pyknotid(make_plcurve(ring.array()[slot]), plcurve_knot_tuple)
+        results.put(('sample', slot, iteration, knot_tuple, candidates))
+    results.put(worker_summary(generator))
+
+
+def worker_summary(generator):
+    #a classifier's counts, and what it learned about invariants since loading the caches, for the main process,
+    #which saves them
+    return ('worker_done', dict(generator.path_counter), dict(generator.prefilter_counter),
+            classification_cache.take_new_items(), homfly_index.take_new_items(),
+            (classification_cache.hits, classification_cache.misses), disambiguator.take_new_items(),
+            dict(disambiguator.resolved))
+
+
+#seconds to wait for a message before checking that the pipeline's processes are still alive
+POLL_SECONDS = 1.0
+
+
+def dead_processes(processes):
+    #processes which ended without reporting, having been killed or crashed outside Python
+    return [process for process in processes if process.exitcode not in (None, 0)]
+
+
+def start_process(results, function, *args):
+    process = multiprocessing.Process(target=run_process, args=(results, function) + args, name=function.__name__)
+    process.daemon = True
+    process.start()
+    return process
+
+
+def run_pipeline(generator):
+    """Runs generator's chains, classification and recording as a pipeline of processes.
+
+    Each chain runs in its own sampler process, which writes its polygons into a
+    SampleRing. PIPELINE_WORKERS fast classifier processes apply the prefilter
+    and plCurve, and hand the rare polygons needing pyknotid to
+    PIPELINE_SLOW_WORKERS slow lane processes, so a polygon with a slow
+    hyperbolic volume computation holds up neither the chains nor the
+    classification of the polygons behind it. With a spool (SPOOL_OUT) these
+    polygons are spooled by the main process instead. The main process counts
+    and records the classified polygons, in the order they finish, and then
+    frees their slots.
+    """
+    args = generator.args
+    ring = SampleRing(args.PIPELINE_SLOTS, args.NUMBER_OF_EDGES)
+    slow = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+
+    chains = chain_iterations(args)
+    processes = [start_process(results, sample_chain, args, chain, iterations, offset, ring, results)
+                 for chain, iterations, offset in chains]
+    caches = cache_settings(args)
+    workers = [start_process(results, classify_fast, args, caches, worker, ring, slow, results)
+               for worker in range(args.PIPELINE_WORKERS)]
+    workers += [start_process(results, classify_slow, args, caches, args.PIPELINE_WORKERS + worker, ring, slow,
+                              results)
+                for worker in range(args.PIPELINE_SLOW_WORKERS)]
+    processes += workers
+
+    samplers_running = len(chains)
+    workers_running = len(workers)
+    stopping = False
+    counter = Counter()
+    try:
+        while samplers_running or workers_running:
+            try:
+                message = results.get(timeout=POLL_SECONDS)
+            except Empty:
+                dead = dead_processes(processes)
+                if dead:
+                    raise RuntimeError("Pipeline processes died: %s" % ', '.join(
+                        "%s (exit code %d)" % (process.name, process.exitcode) for process in dead))
+                message = (None,)
+            if message[0] == 'sample':
+                slot, iteration, knot_tuple, candidates = message[1:]
+                generator.count_pipeline_sample(iteration, ring.array()[slot], knot_tuple, candidates)
+                ring.release(slot)
+                counter['classified'] += 1
+            elif message[0] == 'pending':
+                slot, iteration, knot_tuple = message[1:]
+                generator.spool_pipeline_sample(iteration, ring.array()[slot], knot_tuple)
+                ring.release(slot)
+                counter['classified'] += 1
+            elif message[0] == 'sampler_done':
+                samplers_running -= 1
+                counter.update(message[1])
+            elif message[0] == 'worker_done':
+                workers_running -= 1
+                generator.merge_pipeline_worker(*message[1:])
+            elif message[0] == 'error':
+                raise RuntimeError("A pipeline process failed:\n%s" % message[1])
+
+            if not samplers_running and counter['classified'] == counter['queued'] and not stopping:
+                #every polygon has been counted, so the classifiers can stop
+                stopping = True
+                for worker in range(args.PIPELINE_WORKERS):
+                    ring.filled.put(None)
+                for worker in range(args.PIPELINE_SLOW_WORKERS):
+                    slow.put(None)
+
+            if (generator.progress is not None) and generator.progress.due(time.time()):
+                generator.report_progress()
+    except BaseException:
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+        ring.close()
+
+    generator.step_counter['iteration'] = counter['generated']
+    generator.path_counter['thinned'] += counter['thinned']
@@ -0,0 +1,350 @@
+import os
+import glob
+import json
+import sqlite3
+import argparse
+import numpy as np
+
+
+#binary files of recorded polygons start with these bytes, followed by a json description of the
+#record layout, padded with spaces to POLYGON_RECORD_HEADER_SIZE bytes in all
+POLYGON_RECORD_MAGIC = b'STKPOLY1'
+POLYGON_RECORD_HEADER_SIZE = 256
+
+
+class PolygonCollection(object):
+    """Many stick polygons stored in one contiguous array.
+
+    The vertices of polygon i are coordinates[offsets[i]:offsets[i+1]], so the
+    number of edges of each polygon is np.diff(offsets). Per-polygon metadata
+    (identifier, crossing number and whatever else the source provides) is kept
+    in the `columns` dictionary of numpy arrays, and polygons can be looked up
+    by identifier or selected by crossing number and stick count without any
+    Python-level parsing.
+    """
+
+    def __init__(self, coordinates, offsets, columns):
+        self.coordinates = coordinates
+        self.offsets = offsets
+        self.columns = columns
+        self._index = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def identifiers(self):
+        return self.columns['identifier']
+
+    @property
+    def crossing_numbers(self):
+        return self.columns['crossing_number']
+
+    @property
+    def sticks(self):
+        return np.diff(self.offsets)
+
+    def polygon(self, i):
+        return self.coordinates[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, identifier):
+        return self.polygon(self.index_of(identifier))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.identifiers[i], self.polygon(i)
+
+    def index_of(self, identifier):
+        if self._index is None:
+            self._index = dict((str(x), i) for i, x in enumerate(self.identifiers))
+        return self._index[identifier]
+
+    def select(self, crossing_number=None, sticks=None, identifiers=None):
+        #a new collection with just the polygons matching all the given conditions
+        mask = np.ones(len(self), dtype=bool)
+        if crossing_number is not None:
+            mask &= np.isin(self.crossing_numbers, np.atleast_1d(crossing_number))
+        if sticks is not None:
+            mask &= np.isin(self.sticks, np.atleast_1d(sticks))
+        if identifiers is not None:
+            mask &= np.isin(self.identifiers.astype(str), np.atleast_1d(identifiers))
+        return self.take(np.flatnonzero(mask))
+
+    def take(self, rows):
+        lengths = np.diff(self.offsets)[rows]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        vertex_rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in rows]) \
+            if len(rows) else np.zeros(0, dtype=np.int64)
+        columns = dict((name, values[rows]) for name, values in self.columns.items())
+        return PolygonCollection(self.coordinates[vertex_rows], offsets, columns)
+
+    def equal_length_array(self):
+        #polygons as a (polygons, edges, 3) array, if they all have the same number of edges
+        lengths = np.unique(self.sticks)
+        if len(lengths) != 1:
+            raise ValueError("Polygons have differing numbers of edges: %s" % lengths)
+        return self.coordinates.reshape(len(self), lengths[0], 3)
+
+    def save(self, directory):
+        #writes a sidecar directory which load_sidecar can memory-map
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        np.save(os.path.join(directory, 'coordinates.npy'), self.coordinates)
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+        metadata = {}
+        for name, values in self.columns.items():
+            metadata[name] = values.tolist()
+        with open(os.path.join(directory, 'columns.json'), 'w') as fout:
+            json.dump(metadata, fout)
+
+
+def parse_vertex_strings(vertex_strings):
+    #parses the "[(x, y, z), ...]" strings of the sqlite databases all at once, without eval
+    lengths = np.array([s.count('(') for s in vertex_strings], dtype=np.int64)
+    text = ','.join(vertex_strings)
+    for char in '[]() \n':
+        text = text.replace(char, '')
+    coordinates = np.array(text.split(','), dtype=np.float64).reshape(-1, 3)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    return coordinates, offsets
+
+
+def database_table(db_path):
+    #stick_number/mseq_knots.db has table mseq_knots, superbridge_index/knots.db has table knots
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+    finally:
+        conn.close()
+    if len(tables) != 1:
+        raise ValueError("Expected one table in %s, found %s" % (db_path, tables))
+    return tables[0]
+
+
+def load_database(db_path, table=None):
+    table = table or database_table(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute("SELECT * FROM %s ORDER BY pkey;" % table)
+        names = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    vertex_column = names.index('vertices')
+    coordinates, offsets = parse_vertex_strings([row[vertex_column] for row in rows])
+    columns = {}
+    for i, name in enumerate(names):
+        if name in ('pkey', 'vertices'):
+            continue
+        values = [row[i] for row in rows]
+        columns[name] = np.array(values, dtype=object if name == 'identifier' else None)
+    return PolygonCollection(coordinates, offsets, columns)
+
+
+def load_directory(directory, sep='\t'):
+    #KnotPlot files, as in stick_number/mseq_knots and superbridge_index/knots
+    paths = sorted(glob.glob(os.path.join(directory, '*.txt')))
+    polygons = [np.loadtxt(path, delimiter=sep, ndmin=2) for path in paths]
+    lengths = [len(p) for p in polygons]
+    identifiers = np.array([os.path.splitext(os.path.basename(path))[0] for path in paths], dtype=object)
+    crossing_numbers = np.array([identifier_crossing_number(x) for x in identifiers], dtype=np.int64)
+    coordinates = np.concatenate(polygons) if polygons else np.zeros((0, 3))
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    return PolygonCollection(coordinates, offsets, {'identifier': identifiers, 'crossing_number': crossing_numbers})
+
+
+def identifier_crossing_number(identifier):
+    #"5_2" -> 5, "K11n34" -> 11, "3_1 # 3_1" -> 6
+    if ' # ' in identifier:
+        crossing_numbers = [identifier_crossing_number(x) for x in identifier.split(' # ')]
+        return -1 if -1 in crossing_numbers else sum(crossing_numbers)
+    try:
+        if identifier.startswith('K'):
+            return int(identifier.lstrip('K').replace('a', 'n').split('n')[0])
+        return int(identifier.split('_')[0])
+    except ValueError:
+        return -1
+
+
+def polygon_record_dtype(num_edges, precision='f8', label_width=64):
+    #one fixed width record per polygon, so files can be appended to and memory-mapped
+    return np.dtype([('iteration', '<i8'), ('random_seed', '<u8'), ('confinement_radius', '<f8'),
+                     ('num_edges', '<i4'), ('status', 'S8'), ('knot', 'S%d' % label_width),
+                     ('vertices', '<' + precision, (num_edges, 3))])
+
+
+def is_polygon_record_file(path):
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as fin:
+        return fin.read(len(POLYGON_RECORD_MAGIC)) == POLYGON_RECORD_MAGIC
+
+
+def read_polygon_record_header(path):
+    with open(path, 'rb') as fin:
+        header = fin.read(POLYGON_RECORD_HEADER_SIZE)
+    if header[:len(POLYGON_RECORD_MAGIC)] != POLYGON_RECORD_MAGIC:
+        raise ValueError("%s is not a polygon record file" % path)
+    return json.loads(header[len(POLYGON_RECORD_MAGIC):].decode('ascii'))
+
+
+class PolygonRecordWriter(object):
+    """Appends fixed width binary polygon records to a file.
+
+    Each record holds the iteration, random seed, confinement radius, edge
+    count, status and knot label of a recorded polygon along with its vertices
+    as float64 (or float32) coordinates. Knot labels are stored with
+    encode_label, which refuses labels longer than `label_width` characters
+    rather than truncating them. When resuming an interrupted run,
+    `resume_offset` is the size the file had at the last checkpoint, and the
+    record layout is taken from the file's header.
+    """
+
+    def __init__(self, path, num_edges, precision='f8', label_width=64, resume_offset=None):
+        self.path = path
+        if resume_offset:
+            header = read_polygon_record_header(path)
+            num_edges, precision, label_width = header['num_edges'], header['precision'], header['label_width']
+        self.dtype = polygon_record_dtype(num_edges, precision, label_width)
+        self.label_width = label_width
+        if resume_offset:
+            with open(path, 'r+b') as fout:
+                fout.truncate(resume_offset)
+            return
+
+        description = json.dumps({'version': 1, 'num_edges': num_edges, 'precision': precision,
+                                  'label_width': label_width}).encode('ascii')
+        with open(path, 'wb') as fout:
+            fout.write(POLYGON_RECORD_MAGIC + description.ljust(POLYGON_RECORD_HEADER_SIZE - len(POLYGON_RECORD_MAGIC)))
+
+    def encode_label(self, label):
+        encoded = label.encode('ascii')
+        if len(encoded) > self.label_width:
+            raise ValueError("Knot label %r is longer than the %d characters %s has room for, write it with a "
+                             "larger label width" % (label, self.label_width, self.path))
+        return encoded
+
+    def empty(self, size):
+        #a buffer of records to fill in and pass to append
+        return np.zeros(size, dtype=self.dtype)
+
+    def append(self, records):
+        with open(self.path, 'ab') as fout:
+            fout.write(np.ascontiguousarray(records, dtype=self.dtype).tobytes())
+
+    def offset(self):
+        return os.path.getsize(self.path)
+
+
+def read_polygon_records(path, mmap=True):
+    #the records of a polygon record file as a numpy structured array, memory-mapped by default
+    header = read_polygon_record_header(path)
+    dtype = polygon_record_dtype(header['num_edges'], header['precision'], header['label_width'])
+    count = (os.path.getsize(path) - POLYGON_RECORD_HEADER_SIZE) // dtype.itemsize
+    if mmap:
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', offset=POLYGON_RECORD_HEADER_SIZE, shape=(count,))
+    with open(path, 'rb') as fin:
+        fin.seek(POLYGON_RECORD_HEADER_SIZE)
+        return np.frombuffer(fin.read(count * dtype.itemsize), dtype=dtype)
+
+
+def load_polygon_records(path):
+    #a polygon record file as a PolygonCollection; identifiers are "seed:iteration"
+    records = read_polygon_records(path)
+    num_edges = records.dtype['vertices'].shape[0]
+    coordinates = np.asarray(records['vertices'], dtype=np.float64).reshape(-1, 3)
+    offsets = np.arange(len(records) + 1, dtype=np.int64) * num_edges
+    knots = np.array([x.decode('ascii') for x in records['knot']], dtype=object)
+    columns = {
+        'identifier': np.array(['%d:%d' % (seed, iteration) for seed, iteration in
+                                zip(records['random_seed'], records['iteration'])], dtype=object),
+        'crossing_number': np.array([identifier_crossing_number(x) for x in knots], dtype=np.int64),
+        'knot': knots,
+        'status': np.array([x.decode('ascii') for x in records['status']], dtype=object),
+        'iteration': np.array(records['iteration']),
+        'random_seed': np.array(records['random_seed']),
+        'confinement_radius': np.array(records['confinement_radius']),
+    }
+    return PolygonCollection(coordinates, offsets, columns)
+
+
+def write_knotplot_files(collection, directory, sep='\t'):
+    #one KnotPlot text file per polygon, named by identifier, as in stick_number/mseq_knots
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for identifier, polygon in collection:
+        name = str(identifier).replace(':', '_').replace(' ', '')
+        np.savetxt(os.path.join(directory, name + '.txt'), polygon, delimiter=sep, fmt='%.17g')
+
+
+def sidecar_path(path):
+    return path.rstrip('/') + '.arrays'
+
+
+SIDECAR_FILES = ('coordinates.npy', 'offsets.npy', 'columns.json')
+
+
+def newest_mtime(path):
+    #a directory's own mtime only changes when files are added or removed, not when one is edited
+    if not os.path.isdir(path):
+        return os.path.getmtime(path)
+    return max([os.path.getmtime(path)] + [os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path)])
+
+
+def is_fresh_sidecar(sidecar, path):
+    #true if all the sidecar's files were written after the last change to path, or to any file in it
+    files = [os.path.join(sidecar, name) for name in SIDECAR_FILES]
+    if not all(os.path.isfile(name) for name in files):
+        return False
+    return min(os.path.getmtime(name) for name in files) >= newest_mtime(path)
+
+
+def load_sidecar(directory, mmap=True):
+    coordinates = np.load(os.path.join(directory, 'coordinates.npy'), mmap_mode='r' if mmap else None)
+    offsets = np.load(os.path.join(directory, 'offsets.npy'))
+    with open(os.path.join(directory, 'columns.json'), 'r') as fin:
+        metadata = json.load(fin)
+    columns = {}
+    for name, values in metadata.items():
+        columns[name] = np.array(values, dtype=object if name == 'identifier' else None)
+    return PolygonCollection(coordinates, offsets, columns)
+
+
+def load_polygons(path, mmap=True):
+    #loads a sqlite database, a directory of KnotPlot files or a polygon record file,
+    #preferring an up to date sidecar
+    if is_polygon_record_file(path):
+        return load_polygon_records(path)
+    sidecar = sidecar_path(path)
+    if is_fresh_sidecar(sidecar, path):
+        return load_sidecar(sidecar, mmap)
+    if os.path.isdir(path):
+        return load_directory(path)
+    return load_database(path)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-i', '--IN', type=str, required=True, dest='IN',
+                        help="A sqlite database (mseq_knots.db or knots.db), a directory of KnotPlot files "
+                             "or a binary polygon record file written by generate_random_stick_knots.py")
+    parser.add_argument('-o', '--SIDECAR_OUT', type=str, dest='SIDECAR_OUT',
+                        help="Directory to write the memory-mappable arrays to. By default, next to the input")
+    parser.add_argument('-kp', '--KNOTPLOT_OUT', type=str, dest='KNOTPLOT_OUT',
+                        help="Instead of writing arrays, write each polygon to this directory as a KnotPlot file")
+
+    args = parser.parse_args()
+
+    collection = load_polygons(args.IN)
+    if args.KNOTPLOT_OUT:
+        write_knotplot_files(collection, args.KNOTPLOT_OUT)
+        print("Wrote %d polygons as KnotPlot files to %s" % (len(collection), args.KNOTPLOT_OUT))
+    else:
+        out = args.SIDECAR_OUT or sidecar_path(args.IN)
+        collection.save(out)
+        print("Wrote %d polygons (%d vertices) to %s" % (len(collection), len(collection.coordinates), out))
@@ -0,0 +1,179 @@
+import os
+import time
+import pickle
+import argparse
+import multiprocessing
+import numpy as np
+from result_writer import ResultWriter
+from polygon_store import read_polygon_records
+from knot_counts import read_knot_counter
+from knot_tables import knot_string_to_tuple
+from identify_knot import pyknotid_classify, classification_cache, disambiguator
+from generate_random_stick_knots import is_best_known_equilateral_stick_number, make_knotplot_polygon_string, \
+    PENDING_LABEL
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument('-i', '--SPOOLS', type=str, nargs='+', required=True, dest='SPOOLS',
+                    help="Spool files written by generate_random_stick_knots.py -sp")
+parser.add_argument('-kc', '--KNOT_COUNTS', type=str, nargs='+', dest='KNOT_COUNTS',
+                    help="The knot count pickles written alongside the spools, in the same order. Their Pending "
+                         "counts are replaced by the knot types found")
+parser.add_argument('-csv', '--CSV_OUT', type=str, dest='CSV_OUT',
+                    help="The path to write a row for every spooled polygon to, in the format of the generation "
+                         "csv. If not provided will print to command line")
+parser.add_argument('-rt', '--RETRIES', type=int, default=2, dest='RETRIES',
+                    help="When pyknotid can't settle on one knot, classify a randomly rotated copy of the polygon "
+                         "up to this many times, keeping only the candidates every attempt allows")
+parser.add_argument('-p', '--MAX_PROCESSES', type=int, default=1, dest='MAX_PROCESSES',
+                    help="Number of processes to classify with")
+parser.add_argument('-cc', '--CLASSIFICATION_CACHE', type=str, dest='CLASSIFICATION_CACHE',
+                    help="Path of a file holding a pyknotid classification cache, as for the generator")
+parser.add_argument('-dc', '--DISAMBIGUATION_CACHE', type=str, dest='DISAMBIGUATION_CACHE',
+                    help="Path of a disambiguation cache, as for the generator. If given, polygons with several "
+                         "candidates go through the disambiguation stages before any rotated copies are tried")
+
+
+def random_rotation(random_state):
+    #a uniformly random rotation matrix
+    q, r = np.linalg.qr(random_state.normal(size=(3, 3)))
+    q *= np.sign(np.diag(r))
+    if np.linalg.det(q) < 0:
+        q[:, 0] *= -1
+    return q
+
+
+def candidate_list(identification):
+    if isinstance(identification, str):
+        return [identification]
+    return list(identification or [])
+
+
+def narrow(identification, other):
+    #each identification lists every knot type the polygon might have, so only those in both remain.
+    #An identification with no candidates says nothing, and an empty intersection means one of them
+    #was wrong, so the first is kept
+    if not candidate_list(identification):
+        return other
+    common = [x for x in candidate_list(identification) if x in candidate_list(other)]
+    if not common:
+        return identification
+    return common[0] if len(common) == 1 else common
+
+
+def reclassify(item):
+    #runs in the worker processes: (spool, index, vertices, retries) ->
+    #(spool, index, identification, seconds, learned), learned holding the cache entries the parent lacks
+    spool, index, vertices, retries = item
+    start = time.time()
+    random_state = np.random.RandomState(index)
+    identification = pyknotid_classify(vertices)
+    for attempt in range(retries):
+        if isinstance(identification, str):
+            break
+        #a new projection gives new diagram invariants, the hyperbolic volume in particular
+        rotated = np.asarray(vertices).dot(random_rotation(random_state))
+        identification = narrow(identification, pyknotid_classify(rotated))
+    seconds = time.time() - start
+    #the worker's caches die with it, so what it learned goes back with the result, as in pipeline.worker_summary
+    resolved = dict(disambiguator.resolved)
+    disambiguator.resolved.clear()
+    learned = (classification_cache.take_new_items(), disambiguator.take_new_items(), resolved)
+    return spool, index, identification, seconds, learned
+
+
+def spooled_polygons(spools, retries):
+    for spool, path in enumerate(spools):
+        records = read_polygon_records(path)
+        for index in range(len(records)):
+            yield spool, index, np.array(records['vertices'][index], dtype=np.float64), retries
+
+
+def record_status(knot_tuple, num_edges):
+    #the status the generator gives a polygon of this knot type, whatever the verbosity
+    if knot_tuple is None:
+        return 'UNCL'
+    if len(knot_tuple) > 1:
+        return 'NONPRIME'
+    is_best = is_best_known_equilateral_stick_number(knot_tuple[0][0], knot_tuple[0][1], num_edges)
+    return 'BEST' if is_best else ('EQUIV' if is_best is None else 'WORSE')
+
+
+def merge_counts(path, found):
+    #replaces the Pending count of a knot count pickle by the knot types found, writing it in place
+    counter = read_knot_counter(path)
+    pending = sum(found.values())
+    if counter.get(PENDING_LABEL, 0) < pending:
+        raise ValueError("%s has %d pending polygons, not %d; has its spool already been merged?" %
+                         (path, counter.get(PENDING_LABEL, 0), pending))
+    counter[PENDING_LABEL] -= pending
+    if counter[PENDING_LABEL] == 0:
+        del counter[PENDING_LABEL]
+    counter.update(found)
+    with open(path + '.tmp', 'wb') as fout:
+        pickle.dump(counter, fout)
+    os.rename(path + '.tmp', path)
+
+
+if __name__ == "__main__":
+
+    args = parser.parse_args()
+    if args.KNOT_COUNTS and len(args.KNOT_COUNTS) != len(args.SPOOLS):
+        parser.error("Give one knot count pickle for each spool")
+    if args.CLASSIFICATION_CACHE and os.path.exists(args.CLASSIFICATION_CACHE):
+        classification_cache.load(args.CLASSIFICATION_CACHE)
+    disambiguator.enabled = bool(args.DISAMBIGUATION_CACHE)
+    if args.DISAMBIGUATION_CACHE and os.path.exists(args.DISAMBIGUATION_CACHE):
+        disambiguator.load(args.DISAMBIGUATION_CACHE)
+
+    records = [read_polygon_records(path) for path in args.SPOOLS]
+    writer = ResultWriter(args.CSV_OUT, chunk_size=1000)
+    #knot type counts found in each spool, keyed as in the generator's knot counter
+    found = [dict() for path in args.SPOOLS]
+
+    items = spooled_polygons(args.SPOOLS, args.RETRIES)
+    if args.MAX_PROCESSES > 1:
+        pool = multiprocessing.Pool(processes=args.MAX_PROCESSES)
+        results = pool.imap_unordered(reclassify, items, chunksize=4)
+    else:
+        pool = None
+        results = (reclassify(item) for item in items)
+
+    try:
+        for spool, index, identification, seconds, learned in results:
+            cache_items, disambiguation_items, resolved = learned
+            classification_cache.merge(cache_items)
+            disambiguator.merge(disambiguation_items)
+            disambiguator.resolved.update(resolved)
+            record = records[spool][index]
+            knot_tuple = knot_string_to_tuple(identification) if isinstance(identification, str) else None
+            knot = knot_tuple if knot_tuple is not None else "Unclassifiable"
+            found[spool][knot] = found[spool].get(knot, 0) + 1
+            status = record_status(knot_tuple, int(record['num_edges']))
+            writer.record(int(record['iteration']), int(record['random_seed']), status,
+                          knot_tuple if knot_tuple is not None else identification, int(record['num_edges']),
+                          float(record['confinement_radius']), make_knotplot_polygon_string(record['vertices']))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    writer.close()
+
+    if args.KNOT_COUNTS:
+        for path, spool_found in zip(args.KNOT_COUNTS, found):
+            merge_counts(path, spool_found)
+    if args.CLASSIFICATION_CACHE:
+        classification_cache.save(args.CLASSIFICATION_CACHE)
+    if args.DISAMBIGUATION_CACHE:
+        disambiguator.save(args.DISAMBIGUATION_CACHE)
+
+    print("\nReclassified %d spooled polygons: %d identified, %d unclassifiable" % (
+        sum(sum(f.values()) for f in found),
+        sum(count for f in found for knot, count in f.items() if knot != "Unclassifiable"),
+        sum(f.get("Unclassifiable", 0) for f in found)))
+    print("\nStatuses:")
+    for status, count in sorted(writer.status_counts.items()):
+        print("%s\t%d" % (status, count))
+    if disambiguator.resolved:
+        print("\nDisambiguated polygons by stage: %s" % disambiguator.summary())
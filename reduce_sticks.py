@@ -0,0 +1,283 @@
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from collections import Counter
+import numpy as np
+from seeds import derive_seed
+from knot_tables import stick_number_upper_bound, equilateral_stick_number, has_non_unique_homfly, knot_string_to_tuple, \
+    knot_tuple_to_string
+from polygon_store import PolygonCollection, load_polygons, write_knotplot_files
+from stick_geometry import batch_removal_blockers, removal_blockers, vertex_moves_isotopic
+from identify_knot import plcurve_classify, pyknotid_classify, iter_generation_csv_polygons, classification_cache, homfly_index, disambiguator, DISAMBIGUATION_STAGE_NAMES
+
+
+parser = argparse.ArgumentParser()
+
+source = parser.add_mutually_exclusive_group(required=True)
+source.add_argument('-i', '--IN', type=str, dest='IN',
+                    help="A sqlite database (mseq_knots.db or knots.db), a directory of KnotPlot files "
+                         "or a binary polygon record file written by generate_random_stick_knots.py")
+source.add_argument('-csv', '--GENERATION_CSV', type=str, dest='GENERATION_CSV',
+                    help="Reduce the polygons recorded in the string_repr column of a csv written by "
+                         "generate_random_stick_knots.py")
+parser.add_argument('-bin', '--BINARY_FILE', type=str, dest='BINARY_FILE',
+                    help="Binary polygon file written alongside the csv with -bin, for the rows whose string_repr "
+                         "is empty")
+parser.add_argument('-s', '--STATUS', type=str, nargs='+', default=['BEST', 'EQUIV'], dest='STATUS',
+                    help="Only reduce csv rows with these is_best values")
+parser.add_argument('-mm', '--MAX_MOVES', type=int, default=2000, dest='MAX_MOVES',
+                    help="The number of vertex moves to try for each polygon")
+parser.add_argument('-np', '--PROPOSALS', type=int, default=64, dest='PROPOSALS',
+                    help="The number of random vertex moves proposed, and checked together, at each move")
+parser.add_argument('-st', '--STEP', type=float, default=0.1, dest='STEP',
+                    help="The typical distance a vertex is moved, as a fraction of the mean edge length")
+parser.add_argument('-rs', '--RANDOM_SEED', type=int, default=0, dest='RANDOM_SEED',
+                    help="Integer seed from which each polygon's random moves are seeded")
+parser.add_argument('-p', '--MAX_PROCESSES', type=int, default=1, dest='MAX_PROCESSES',
+                    help="Number of processes to reduce polygons with")
+parser.add_argument('-o', '--OUT', type=str, dest='OUT',
+                    help="Path to write a csv row for each polygon to. If not provided will print to command line")
+parser.add_argument('-kp', '--KNOTPLOT_OUT', type=str, dest='KNOTPLOT_OUT',
+                    help="Directory to write each polygon which lost a stick to, as a KnotPlot file")
+parser.add_argument('-cc', '--CLASSIFICATION_CACHE', type=str, dest='CLASSIFICATION_CACHE',
+                    help="Path of a pyknotid classification cache, as for the generator")
+parser.add_argument('-hi', '--HOMFLY_INDEX', type=str, dest='HOMFLY_INDEX',
+                    help="Path of a HOMFLY index, as for the generator")
+parser.add_argument('-dc', '--DISAMBIGUATION_CACHE', type=str, dest='DISAMBIGUATION_CACHE',
+                    help="Path of a disambiguation cache, as for the generator. If given, polygons pyknotid can't "
+                         "decide between several knots for go through the disambiguation stages")
+parser.add_argument('-ds', '--DISAMBIGUATION_STAGES', type=str, nargs='+', choices=DISAMBIGUATION_STAGE_NAMES,
+                    dest='DISAMBIGUATION_STAGES',
+                    help="With -dc, only use these disambiguation stages. By default all are used")
+
+
+#moves may not shorten an edge below this fraction of the mean edge length, which keeps the polygon
+#clear of the degenerate configurations where the intersection tests lose precision
+MIN_EDGE_FRACTION = 0.02
+
+
+def classify_polygon(vertices):
+    #the knot string of the polygon as the generator would find it, or pyknotid's list of candidates (or None)
+    #if it can't settle on one knot: plCurve first, with pyknotid (and the HOMFLY index and disambiguator when
+    #enabled) when plCurve fails or its HOMFLY polynomial is shared with other knots
+    vertices = [tuple(v) for v in np.asarray(vertices).tolist()]
+    knot = plcurve_classify(vertices)
+    knot_tuple = knot_string_to_tuple(knot) if knot is not None else None
+    if knot_tuple is not None and not (len(knot_tuple) == 1 and
+                                       has_non_unique_homfly(knot_tuple[0][0], knot_tuple[0][1])):
+        return knot
+    identification = pyknotid_classify(vertices)
+    if isinstance(identification, str):
+        #pyknotid writes composites differently from plCurve
+        return knot_tuple_to_string(knot_string_to_tuple(identification)) or identification
+    return identification
+
+
+def blocker_scores(blockers):
+    #lower is closer to a removable vertex: the fewest edges in the way of any one removal, then the
+    #number in the way of all of them
+    num_edges = blockers.shape[-1]
+    return blockers.min(axis=-1) * num_edges * num_edges + blockers.sum(axis=-1)
+
+
+def remove_free_vertex(vertices, knot, random_state, counter):
+    #removes a vertex no edge blocks the removal of, if classify_polygon agrees the knot type is unchanged.
+    #Returns the smaller polygon, or None
+    for k in random_state.permutation(np.flatnonzero(removal_blockers(vertices) == 0)):
+        candidate = np.delete(vertices, k, axis=0)
+        #the intersection tests already guarantee the knot type; this guards against rounding
+        if classify_polygon(candidate) == knot:
+            counter['removed'] += 1
+            return candidate
+        counter['classify_rejected'] += 1
+    return None
+
+
+def propose_moves(vertices, random_state, proposals, step):
+    #(moved vertices, targets): half pull the vertex closest to removable towards the chord of its
+    #neighbours, which shrinks the triangle it would be removed across, and half move random vertices
+    num_edges = len(vertices)
+    scale = np.mean(np.linalg.norm(np.roll(vertices, -1, axis=0) - vertices, axis=1))
+    blockers = removal_blockers(vertices)
+    closest = random_state.choice(np.flatnonzero(blockers == blockers.min()))
+
+    pulls = proposals // 2
+    chord = random_state.uniform(0.25, 0.75, size=(pulls, 1))
+    previous, following = vertices[(closest - 1) % num_edges], vertices[(closest + 1) % num_edges]
+    towards = previous + chord * (following - previous) - vertices[closest]
+    pulled = vertices[closest] + random_state.uniform(0, 1, size=(pulls, 1)) * towards + \
+        random_state.normal(scale=step * scale / 4, size=(pulls, 3))
+
+    moved = np.concatenate([np.repeat(closest, pulls), random_state.randint(num_edges, size=proposals - pulls)])
+    targets = np.concatenate([pulled, vertices[moved[pulls:]] +
+                              random_state.normal(scale=step * scale, size=(proposals - pulls, 3))])
+    return moved, targets
+
+
+def reduce_polygon(vertices, knot, random_state, max_moves=2000, proposals=64, step=0.1):
+    """Removes vertices from a stick polygon without changing its knot type, for as long as it can.
+
+    A vertex can be removed when no edge meets the triangle it forms with its
+    neighbours. While no vertex can be, the polygon is changed by moving one
+    vertex at a time: a batch of random moves is proposed, those which would
+    pass an edge through another are discarded, and the survivor leaving the
+    fewest edges in the way of a removal is made, if it is no worse than the
+    polygon before. Returns the reduced polygon and counts of what happened.
+    """
+    vertices = np.array(vertices, dtype=np.float64)
+    min_edge = MIN_EDGE_FRACTION * np.mean(np.linalg.norm(np.roll(vertices, -1, axis=0) - vertices, axis=1))
+    counter = Counter()
+
+    while counter['moves'] < max_moves and len(vertices) > 3:
+        reduced = remove_free_vertex(vertices, knot, random_state, counter)
+        if reduced is not None:
+            vertices = reduced
+            continue
+
+        counter['moves'] += 1
+        moved, targets = propose_moves(vertices, random_state, proposals, step)
+        num_edges = len(vertices)
+        #the two edges at the moved vertex must stay long enough
+        long_enough = (np.linalg.norm(targets - vertices[(moved - 1) % num_edges], axis=1) > min_edge) & \
+                      (np.linalg.norm(targets - vertices[(moved + 1) % num_edges], axis=1) > min_edge)
+        valid = np.flatnonzero(long_enough & vertex_moves_isotopic(vertices, moved, targets))
+        if not len(valid):
+            counter['blocked'] += 1
+            continue
+
+        polygons = np.repeat(vertices[np.newaxis], len(valid), axis=0)
+        polygons[np.arange(len(valid)), moved[valid]] = targets[valid]
+        scores = blocker_scores(batch_removal_blockers(polygons))
+        best = np.flatnonzero(scores == scores.min())
+        if scores.min() > blocker_scores(removal_blockers(vertices)):
+            counter['worse'] += 1
+            continue
+        vertices = polygons[random_state.choice(best)]
+        counter['accepted'] += 1
+
+    return vertices, counter
+
+
+def learned_cache_items():
+    #the cache entries this process has learned since the last call, for the parent to merge
+    resolved = dict(disambiguator.resolved)
+    disambiguator.resolved.clear()
+    return (classification_cache.take_new_items(), homfly_index.take_new_items(), disambiguator.take_new_items(),
+            resolved)
+
+
+def reduce_item(item):
+    #runs in the worker processes: (label, vertices, seed, parameters) -> (label, knot, sticks, reduced vertices,
+    #counts, seconds, learned cache entries). Polygons which can't be identified as a single knot are returned
+    #unreduced, with knot None or the list of candidates
+    label, vertices, seed, parameters = item
+    start = time.time()
+    vertices = np.asarray(vertices, dtype=np.float64)
+    knot = classify_polygon(vertices)
+    if not isinstance(knot, str):
+        return label, knot, len(vertices), vertices, Counter(), time.time() - start, learned_cache_items()
+    random_state = np.random.RandomState([seed & 0xffffffff, seed >> 32])
+    reduced, counter = reduce_polygon(vertices, knot, random_state, **parameters)
+    return label, knot, len(vertices), reduced, counter, time.time() - start, learned_cache_items()
+
+
+def reduce_polygons(items, processes=1):
+    #yields reduce_item's result for each of items as it finishes, in any order
+    if processes <= 1:
+        for item in items:
+            yield reduce_item(item)
+        return
+    pool = multiprocessing.Pool(processes=processes)
+    try:
+        for result in pool.imap_unordered(reduce_item, items):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def known_stick_numbers(knot):
+    #(best stick number upper bound, best known equilateral stick number) of a prime knot from the tables in
+    #stick_number, either None if the knot isn't there. A reduced polygon is no longer equilateral, so only
+    #the first can be improved on
+    knot_tuple = knot_string_to_tuple(knot) if isinstance(knot, str) else None
+    if knot_tuple is None or len(knot_tuple) != 1 or len(knot_tuple[0]) != 2:
+        return None, None
+    return stick_number_upper_bound(*knot_tuple[0]), equilateral_stick_number(*knot_tuple[0])
+
+
+if __name__ == "__main__":
+
+    args = parser.parse_args()
+    if args.CLASSIFICATION_CACHE and os.path.exists(args.CLASSIFICATION_CACHE):
+        classification_cache.load(args.CLASSIFICATION_CACHE)
+    homfly_index.enabled = bool(args.HOMFLY_INDEX)
+    if args.HOMFLY_INDEX and os.path.exists(args.HOMFLY_INDEX):
+        homfly_index.load(args.HOMFLY_INDEX)
+    disambiguator.enabled = bool(args.DISAMBIGUATION_CACHE)
+    disambiguator.stages = args.DISAMBIGUATION_STAGES or DISAMBIGUATION_STAGE_NAMES
+    if args.DISAMBIGUATION_CACHE and os.path.exists(args.DISAMBIGUATION_CACHE):
+        disambiguator.load(args.DISAMBIGUATION_CACHE)
+
+    if args.GENERATION_CSV:
+        polygons = iter_generation_csv_polygons(args.GENERATION_CSV, args.STATUS, args.BINARY_FILE)
+    else:
+        polygons = iter(load_polygons(args.IN))
+    parameters = {'max_moves': args.MAX_MOVES, 'proposals': args.PROPOSALS, 'step': args.STEP}
+    items = ((str(label), np.asarray(vertices), derive_seed(args.RANDOM_SEED, 'reduce', label), parameters)
+             for label, vertices in polygons)
+
+    fout = open(args.OUT, 'w') if args.OUT else sys.stdout
+    fout.write('source,knot,sticks,reduced_sticks,stick_number_ub,equilateral_sticks,improves,moves,accepted,'
+               'seconds\n')
+    reduced_polygons = []
+    improvements = 0
+    ambiguous = 0
+    for label, knot, sticks, reduced, counter, seconds, learned in reduce_polygons(items, args.MAX_PROCESSES):
+        cache_items, homfly_items, disambiguation_items, resolved = learned
+        classification_cache.merge(cache_items)
+        homfly_index.merge(homfly_items)
+        disambiguator.merge(disambiguation_items)
+        disambiguator.resolved.update(resolved)
+
+        upper_bound, equilateral_sticks = known_stick_numbers(knot)
+        improves = upper_bound is not None and len(reduced) < upper_bound
+        improvements += improves
+        if isinstance(knot, list):
+            #pyknotid couldn't tell the candidates apart, so the polygon was left alone
+            ambiguous += 1
+            knot_label, improves_label = ' | '.join(knot), 'AMBIGUOUS'
+        else:
+            knot_label, improves_label = knot if knot is not None else 'UNCL', 'IMPROVES' if improves else ''
+        fout.write('%s,%s,%d,%d,%s,%s,%s,%d,%d,%.3f\n' % (label, knot_label, sticks, len(reduced),
+                                                          upper_bound if upper_bound else '',
+                                                          equilateral_sticks if equilateral_sticks else '',
+                                                          improves_label, counter['moves'], counter['accepted'],
+                                                          seconds))
+        fout.flush()
+        if len(reduced) < sticks:
+            reduced_polygons.append(('%s_%dsticks' % (label, len(reduced)), knot, reduced))
+    if args.OUT:
+        fout.close()
+
+    if args.KNOTPLOT_OUT and reduced_polygons:
+        lengths = [len(reduced) for name, knot, reduced in reduced_polygons]
+        collection = PolygonCollection(np.concatenate([reduced for name, knot, reduced in reduced_polygons]),
+                                       np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                                       {'identifier': np.array([name for name, knot, reduced in reduced_polygons],
+                                                               dtype=object)})
+        write_knotplot_files(collection, args.KNOTPLOT_OUT)
+
+    if args.CLASSIFICATION_CACHE:
+        classification_cache.save(args.CLASSIFICATION_CACHE)
+    if args.HOMFLY_INDEX:
+        homfly_index.save(args.HOMFLY_INDEX)
+    if args.DISAMBIGUATION_CACHE:
+        disambiguator.save(args.DISAMBIGUATION_CACHE)
+
+    print("\n%d polygons lost sticks, %d below the best known stick number upper bound" %
+          (len(reduced_polygons), improvements))
+    if ambiguous:
+        print("%d polygons were left alone as pyknotid could not decide between their candidate knots" % ambiguous)
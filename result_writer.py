@@ -0,0 +1,177 @@
+import os
+import sys
+import numpy as np
+from polygon_store import PolygonRecordWriter
+
+
+COLUMNS = ['random_seed', 'is_best', 'knot', 'num_edges', 'confinement_radius', 'string_repr']
+
+
+class ResultWriter(object):
+    """Buffers recorded knots in preallocated column arrays and streams them out in chunks.
+
+    Rows are appended to the csv file (and optionally a parquet file) every
+    `chunk_size` records, so memory use does not grow with the number of
+    recorded knots. If no csv path is given, rows are printed to stdout in the
+    same format used previously.
+
+    If `binary_out` is given, the polygons themselves are written there as
+    fixed width binary records (see polygon_store.PolygonRecordWriter) and the
+    string_repr column is left empty.
+
+    When resuming an interrupted run, `resume_offset` is the size the csv file
+    had at the last checkpoint (see csv_offset), and `binary_resume_offset` that
+    of the binary file; anything written after that point is discarded.
+    """
+
+    def __init__(self, csv_out=None, parquet_out=None, chunk_size=10000, resume_offset=None,
+                 binary_out=None, num_edges=None, binary_precision='f8', binary_resume_offset=None,
+                 binary_label_width=64):
+        self.csv_out = csv_out
+        self.parquet_out = parquet_out
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self.status_counts = {}
+
+        self._iteration = np.zeros(chunk_size, dtype=np.int64)
+        self._random_seed = np.zeros(chunk_size, dtype=np.uint64)
+        self._is_best = np.empty(chunk_size, dtype=object)
+        self._knot = np.empty(chunk_size, dtype=object)
+        self._num_edges = np.zeros(chunk_size, dtype=np.int64)
+        self._confinement_radius = np.zeros(chunk_size, dtype=np.float64)
+        self._string_repr = np.empty(chunk_size, dtype=object)
+        self._size = 0
+
+        self._header_written = False
+        self._parquet_writer = None
+
+        self._binary_writer = None
+        if binary_out:
+            self._binary_writer = PolygonRecordWriter(binary_out, num_edges, binary_precision, binary_label_width,
+                                                      resume_offset=binary_resume_offset)
+            self._records = self._binary_writer.empty(chunk_size)
+
+        if self.csv_out and resume_offset:
+            with open(self.csv_out, 'r+') as fout:
+                fout.truncate(resume_offset)
+            self._header_written = True
+        elif self.csv_out:
+            #start from an empty file, chunks are appended from here on
+            open(self.csv_out, 'w').close()
+
+    def record(self, iteration, random_seed, is_best, knot, num_edges, confinement_radius, string_repr,
+               vertices=None, label=None):
+        #vertices and the knot's label (str(knot) by default) are only needed for binary output
+        i = self._size
+        self._iteration[i] = iteration
+        self._random_seed[i] = random_seed
+        self._is_best[i] = is_best
+        self._knot[i] = knot
+        self._num_edges[i] = num_edges
+        self._confinement_radius[i] = confinement_radius
+        self._string_repr[i] = string_repr
+        if self._binary_writer is not None:
+            record = self._records[i]
+            record['iteration'] = iteration
+            record['random_seed'] = random_seed
+            record['confinement_radius'] = confinement_radius
+            record['num_edges'] = num_edges
+            record['status'] = str(is_best).encode('ascii')
+            record['knot'] = self._binary_writer.encode_label(label if label is not None else str(knot))
+            record['vertices'] = vertices
+        self._size += 1
+        self.status_counts[is_best] = self.status_counts.get(is_best, 0) + 1
+
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def _chunk_columns(self):
+        n = self._size
+        return [self._random_seed[:n], self._is_best[:n], self._knot[:n],
+                self._num_edges[:n], self._confinement_radius[:n], self._string_repr[:n]]
+
+    def _write_csv_chunk(self):
+        import pandas as pd
+        chunk = pd.DataFrame(dict(zip(COLUMNS, self._chunk_columns())),
+                             columns=COLUMNS, index=self._iteration[:self._size].copy())
+        chunk.to_csv(self.csv_out, mode='a', header=not self._header_written, index_label='iteration')
+        self._header_written = True
+
+    def _print_chunk(self):
+        if not self._header_written:
+            print("\niteration, random_seed, is_best, knot, num_edges, confinement_radius, string_repr")
+            self._header_written = True
+        columns = self._chunk_columns()
+        for i in range(self._size):
+            print(', '.join([str(self._iteration[i])] + [str(column[i]) for column in columns]))
+
+    def _write_parquet_chunk(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing parquet output requires the pyarrow module")
+
+        n = self._size
+        table = pa.Table.from_arrays([
+            pa.array(self._iteration[:n]),
+            pa.array(self._random_seed[:n]),
+            pa.array([str(x) for x in self._is_best[:n]]),
+            pa.array([str(x) for x in self._knot[:n]]),
+            pa.array(self._num_edges[:n]),
+            pa.array(self._confinement_radius[:n]),
+            pa.array([str(x) for x in self._string_repr[:n]])],
+            ['iteration'] + COLUMNS)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.parquet_out, table.schema)
+        self._parquet_writer.write_table(table)
+
+    def flush(self):
+        if self._size == 0:
+            return
+        if self.csv_out:
+            self._write_csv_chunk()
+        else:
+            self._print_chunk()
+        if self.parquet_out:
+            self._write_parquet_chunk()
+        if self._binary_writer is not None:
+            self._binary_writer.append(self._records[:self._size])
+
+        self.rows_written += self._size
+        #drop references to the strings of the flushed chunk
+        self._is_best[:self._size] = None
+        self._knot[:self._size] = None
+        self._string_repr[:self._size] = None
+        self._size = 0
+        sys.stdout.flush()
+
+    def csv_offset(self):
+        #size of the csv file once everything recorded so far is written
+        self.flush()
+        if self.csv_out and os.path.exists(self.csv_out):
+            return os.path.getsize(self.csv_out)
+        return 0
+
+    def binary_offset(self):
+        #size of the binary file once everything recorded so far is written
+        self.flush()
+        if self._binary_writer is not None:
+            return self._binary_writer.offset()
+        return 0
+
+    def close(self):
+        self.flush()
+        if self.csv_out and not self._header_written:
+            #no knots were recorded, still write out the header
+            with open(self.csv_out, 'w') as fout:
+                fout.write(','.join(['iteration'] + COLUMNS) + '\n')
+            self._header_written = True
+        elif not self.csv_out:
+            if not self._header_written:
+                print("\niteration, random_seed, is_best, knot, num_edges, confinement_radius, string_repr")
+                self._header_written = True
+            print("")
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
@@ -0,0 +1,7 @@
+import hashlib
+
+
+def derive_seed(seed, *keys):
+    #a 64-bit seed determined by seed and keys, for seeding independent random streams
+    digest = hashlib.sha256(':'.join(map(str, (seed,) + keys)).encode('ascii')).hexdigest()
+    return int(digest[:16], 16) or 1
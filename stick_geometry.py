@@ -0,0 +1,265 @@
+import numpy as np
+
+
+_segment_pair_cache = {}
+
+
+def nonadjacent_segment_pairs(num_edges):
+    #indices (i, j), i < j, of the pairs of edges of a closed polygon which do
+    #not share a vertex; edge i runs from vertex i to vertex i+1
+    if num_edges not in _segment_pair_cache:
+        i, j = np.triu_indices(num_edges, 2)
+        keep = ~((i == 0) & (j == num_edges - 1))
+        _segment_pair_cache[num_edges] = (i[keep], j[keep])
+    return _segment_pair_cache[num_edges]
+
+
+def random_unit_vectors(random_state, count):
+    vectors = random_state.normal(size=(count, 3))
+    return vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+
+
+def projection_bases(directions):
+    #orthonormal bases (u, w) of the planes perpendicular to each direction (last axis)
+    directions = np.asarray(directions, dtype=np.float64)
+    helper = np.zeros_like(directions)
+    np.put_along_axis(helper, np.argmin(np.abs(directions), axis=-1)[..., np.newaxis], 1.0, axis=-1)
+    u = np.cross(directions, helper)
+    u /= np.linalg.norm(u, axis=-1)[..., np.newaxis]
+    w = np.cross(directions, u)
+    return u, w
+
+
+def batch_projection_crossing_counts(polygons, directions):
+    #polygons has shape (batch, edges, 3) and directions (batch, projections, 3). Returns the
+    #number of crossings in each projection, shape (batch, projections)
+    polygons = np.asarray(polygons, dtype=np.float64)
+    u, w = projection_bases(directions)
+    #projected coordinates, shape (batch, projections, vertices, 2)
+    projected = np.stack([np.einsum('bkd,bnd->bkn', u, polygons),
+                          np.einsum('bkd,bnd->bkn', w, polygons)], axis=-1)
+    starts = projected
+    ends = np.roll(projected, -1, axis=2)
+
+    i, j = nonadjacent_segment_pairs(polygons.shape[1])
+    a, r = starts[:, :, i], ends[:, :, i] - starts[:, :, i]
+    b, s = starts[:, :, j], ends[:, :, j] - starts[:, :, j]
+    ab = b - a
+
+    denom = r[..., 0] * s[..., 1] - r[..., 1] * s[..., 0]
+    t_num = ab[..., 0] * s[..., 1] - ab[..., 1] * s[..., 0]
+    u_num = ab[..., 0] * r[..., 1] - ab[..., 1] * r[..., 0]
+    #compare with the sign of the denominator rather than dividing
+    sign = np.sign(denom)
+    t_num, u_num, denom = t_num * sign, u_num * sign, denom * sign
+    crossing = (denom > 0) & (t_num > 0) & (t_num < denom) & (u_num > 0) & (u_num < denom)
+    return crossing.sum(axis=-1)
+
+
+def projection_crossing_counts(vertices, directions):
+    #number of crossings in the projection of the closed polygon onto the
+    #plane perpendicular to each of the given directions
+    directions = np.atleast_2d(directions)
+    return batch_projection_crossing_counts(np.asarray(vertices)[np.newaxis], directions[np.newaxis])[0]
+
+
+def is_certified_unknot(vertices, directions):
+    #any knot diagram with fewer than 3 crossings is a diagram of the unknot
+    return projection_crossing_counts(vertices, directions).min() < 3
+
+
+def batch_certified_unknots(polygons, directions):
+    #boolean mask of the polygons of a batch which some projection certifies as unknots
+    return batch_projection_crossing_counts(polygons, directions).min(axis=-1) < 3
+
+
+def segment_distances(p0, p1, q0, q1):
+    #distances between the segments p0-p1 and q0-q1, elementwise over the leading axes.
+    #Segments must have nonzero length
+    d1, d2, r = p1 - p0, q1 - q0, p0 - q0
+    a = np.einsum('...d,...d->...', d1, d1)
+    e = np.einsum('...d,...d->...', d2, d2)
+    b = np.einsum('...d,...d->...', d1, d2)
+    c = np.einsum('...d,...d->...', d1, r)
+    f = np.einsum('...d,...d->...', d2, r)
+
+    #closest points of the two lines, then clamped back onto the segments
+    denom = a * e - b * b
+    parallel = denom <= 1e-12 * a * e
+    s = np.where(parallel, 0.0, np.clip((b * f - c * e) / np.where(parallel, 1.0, denom), 0.0, 1.0))
+    t = (b * s + f) / e
+    s = np.where(t < 0, np.clip(-c / a, 0.0, 1.0), np.where(t > 1, np.clip((b - c) / a, 0.0, 1.0), s))
+    t = np.clip(t, 0.0, 1.0)
+    return np.linalg.norm(p0 + d1 * s[..., np.newaxis] - q0 - d2 * t[..., np.newaxis], axis=-1)
+
+
+def is_straight_line_isotopic(start, end):
+    #whether moving every vertex of the closed polygon `start` in a straight line to its position in
+    #`end` certainly keeps the polygon embedded, so the two have the same knot type. Conservative:
+    #False only means the check could not rule out an edge passing through another
+    start, end = np.asarray(start, dtype=np.float64), np.asarray(end, dtype=np.float64)
+    num_edges = len(start)
+
+    #no point of edge i moves further than its furthest moving endpoint
+    vertex_moves = np.linalg.norm(end - start, axis=1)
+    edge_moves = np.maximum(vertex_moves, np.roll(vertex_moves, -1))
+
+    #nonadjacent edges can't meet if they start further apart than they move in total
+    i, j = nonadjacent_segment_pairs(num_edges)
+    next_start = np.roll(start, -1, axis=0)
+    distances = segment_distances(start[i], next_start[i], start[j], next_start[j])
+    if not np.all(distances > edge_moves[i] + edge_moves[j]):
+        return False
+
+    #adjacent edges only meet away from their shared vertex if the angle between them closes up.
+    #Each edge vector turns by at most arcsin(|change| / |edge|) along the way
+    incoming = np.roll(start, 1, axis=0) - start
+    outgoing = next_start - start
+    incoming_change = np.linalg.norm(np.roll(end, 1, axis=0) - end - incoming, axis=1) / np.linalg.norm(incoming, axis=1)
+    outgoing_change = np.linalg.norm(np.roll(end, -1, axis=0) - end - outgoing, axis=1) / np.linalg.norm(outgoing, axis=1)
+    if np.any(incoming_change >= 1) or np.any(outgoing_change >= 1):
+        return False
+    cosines = np.einsum('nd,nd->n', incoming, outgoing) / (np.linalg.norm(incoming, axis=1) * np.linalg.norm(outgoing, axis=1))
+    angles = np.arccos(np.clip(cosines, -1.0, 1.0))
+    return bool(np.all(angles > np.arcsin(incoming_change) + np.arcsin(outgoing_change)))
+
+
+def batch_raw_crossings(polygons, directions=None, min_cross=1e-5):
+    #crossings of the projection of each polygon of a batch (batch, edges, 3) into the z = 0 plane, or the
+    #plane perpendicular to its row of directions (batch, 3). Returns a list with an array per polygon in
+    #pyknotid's raw crossings format: two rows [position, other position, over, clockwise] per crossing,
+    #sorted by position, where the position of a point t of the way along edge i is i + t, over is +1 on
+    #the upper strand and -1 on the lower, and clockwise is the sign of the crossing (the same in both
+    #rows). As in pyknotid, edges whose projections are nearly parallel (2d cross product of the edge
+    #vectors below min_cross) are taken not to cross
+    polygons = np.asarray(polygons, dtype=np.float64)
+    if directions is not None:
+        u, w = projection_bases(directions)
+        d = np.asarray(directions, dtype=np.float64)
+        d = d / np.linalg.norm(d, axis=-1)[..., np.newaxis]
+        polygons = np.stack([np.einsum('bd,bnd->bn', u, polygons), np.einsum('bd,bnd->bn', w, polygons),
+                             np.einsum('bd,bnd->bn', d, polygons)], axis=-1)
+    num_polygons, num_edges = polygons.shape[:2]
+    edges = np.roll(polygons, -1, axis=1) - polygons
+
+    i, j = nonadjacent_segment_pairs(num_edges)
+    a, da = polygons[:, i], edges[:, i]
+    b, db = polygons[:, j], edges[:, j]
+    ab = b - a
+    denom = da[..., 0] * db[..., 1] - da[..., 1] * db[..., 0]
+    safe_denom = np.where(np.abs(denom) < min_cross, 1.0, denom)
+    t = (ab[..., 0] * db[..., 1] - ab[..., 1] * db[..., 0]) / safe_denom
+    s = (ab[..., 0] * da[..., 1] - ab[..., 1] * da[..., 0]) / safe_denom
+    crossing = (np.abs(denom) >= min_cross) & (t > 0) & (t < 1) & (s > 0) & (s < 1)
+
+    polygon, pair = np.nonzero(crossing)
+    t, s = t[polygon, pair], s[polygon, pair]
+    over = np.sign((a[polygon, pair, 2] + t * da[polygon, pair, 2]) - (b[polygon, pair, 2] + s * db[polygon, pair, 2]))
+    clockwise = over * np.sign(denom[polygon, pair])
+    position, other_position = i[pair] + t, j[pair] + s
+
+    rows = np.concatenate([np.stack([position, other_position, over, clockwise], axis=1),
+                           np.stack([other_position, position, -over, clockwise], axis=1)])
+    row_polygons = np.concatenate([polygon, polygon])
+    order = np.lexsort((rows[:, 0], row_polygons))
+    counts = np.bincount(row_polygons, minlength=num_polygons)
+    return np.split(rows[order], np.cumsum(counts)[:-1])
+
+
+def raw_crossings(vertices, direction=None):
+    #batch_raw_crossings for a single polygon
+    directions = None if direction is None else np.asarray(direction, dtype=np.float64)[np.newaxis]
+    return batch_raw_crossings(np.asarray(vertices)[np.newaxis], directions)[0]
+
+
+def gauss_code_array(crossings):
+    #a raw crossings array as a Gauss code, rows [crossing number, over, clockwise], with crossings
+    #numbered from 1 in order of first appearance, as in pyknotid's GaussCode
+    numbers = {}
+    code = np.zeros((len(crossings), 3), dtype=np.int64)
+    for k, (position, other_position, over, clockwise) in enumerate(crossings):
+        if position not in numbers:
+            numbers[other_position] = len(numbers) + 1
+            code[k, 0] = numbers[other_position]
+        else:
+            code[k, 0] = numbers[position]
+        code[k, 1:] = over, clockwise
+    return code
+
+
+def batch_gauss_codes(polygons, directions=None):
+    return [gauss_code_array(crossings) for crossings in batch_raw_crossings(polygons, directions)]
+
+
+def segments_meet_triangles(a, b, c, p, q, tol=1e-9):
+    #whether each segment p-q meets the triangle a b c, elementwise over the leading axes. Segments which come
+    #within tol (in barycentric terms) of the triangle, or lie in its plane, count as meeting it, so the
+    #check errs on the side of caution
+    e1, e2, d = b - a, c - a, q - p
+    normal = np.cross(e1, e2)
+    h = np.cross(d, e2)
+    det = np.einsum('...d,...d->...', e1, h)
+    scale = np.linalg.norm(d, axis=-1) * np.linalg.norm(normal, axis=-1)
+    parallel = np.abs(det) <= 1e-12 * scale
+    inverse = 1.0 / np.where(parallel, 1.0, det)
+    s = p - a
+    u = np.einsum('...d,...d->...', s, h) * inverse
+    r = np.cross(s, e1)
+    v = np.einsum('...d,...d->...', d, r) * inverse
+    t = np.einsum('...d,...d->...', e2, r) * inverse
+    crossing = ~parallel & (u >= -tol) & (v >= -tol) & (u + v <= 1 + tol) & (t >= -tol) & (t <= 1 + tol)
+    #a segment parallel to the triangle only meets it if it lies in its plane
+    in_plane = parallel & (np.abs(np.einsum('...d,...d->...', s, normal)) <=
+                           tol * np.linalg.norm(normal, axis=-1) * np.linalg.norm(e1, axis=-1))
+    return crossing | in_plane
+
+
+_other_edge_cache = {}
+
+
+def other_edges(num_edges, excluded):
+    #(num_edges, num_edges - len(excluded)) array whose row k holds the edges k + j of a closed polygon for
+    #every offset j not in excluded
+    key = (num_edges, tuple(excluded))
+    if key not in _other_edge_cache:
+        offsets = np.array([j for j in range(num_edges) if j not in set(x % num_edges for x in excluded)],
+                           dtype=np.int64)
+        _other_edge_cache[key] = (np.arange(num_edges)[:, np.newaxis] + offsets) % num_edges
+    return _other_edge_cache[key]
+
+
+def batch_removal_blockers(polygons):
+    #polygons has shape (batch, edges, 3). Returns, for each vertex k, the number of edges meeting the
+    #triangle of vertices k-1, k and k+1, shape (batch, edges). Where this is 0, vertex k can be removed
+    #by a Delta-move, sliding the two edges at it across the triangle, without changing the knot type
+    polygons = np.asarray(polygons, dtype=np.float64)
+    num_edges = polygons.shape[1]
+    edges = other_edges(num_edges, (-2, -1, 0, 1))
+    previous, following = np.roll(polygons, 1, axis=1), np.roll(polygons, -1, axis=1)
+    meets = segments_meet_triangles(previous[:, :, np.newaxis], polygons[:, :, np.newaxis],
+                                    following[:, :, np.newaxis], polygons[:, edges], polygons[:, (edges + 1) % num_edges])
+    return meets.sum(axis=-1)
+
+
+def removal_blockers(vertices):
+    #batch_removal_blockers for a single polygon
+    return batch_removal_blockers(np.asarray(vertices)[np.newaxis])[0]
+
+
+def vertex_moves_isotopic(vertices, moved, targets):
+    #whether moving vertex moved[m] of the closed polygon in a straight line to targets[m] keeps it embedded,
+    #for each proposed move m. The two edges at the vertex sweep out triangles, which no other edge may meet
+    vertices = np.asarray(vertices, dtype=np.float64)
+    num_edges = len(vertices)
+    moved, targets = np.asarray(moved), np.asarray(targets, dtype=np.float64)
+    start = vertices[moved][:, np.newaxis]
+    end = targets[:, np.newaxis]
+    isotopic = np.ones(len(moved), dtype=bool)
+    #edge k-1 sweeps the triangle at vertex k-1 and edge k the one at vertex k+1; edges touching a
+    #triangle only at its fixed corner are left out
+    for corner, excluded in ((-1, (-2, -1, 0)), (1, (-1, 0, 1))):
+        edges = other_edges(num_edges, excluded)[moved]
+        fixed = vertices[(moved + corner) % num_edges][:, np.newaxis]
+        isotopic &= ~segments_meet_triangles(fixed, start, end, vertices[edges],
+                                             vertices[(edges + 1) % num_edges]).any(axis=-1)
+    return isotopic
@@ -0,0 +1,160 @@
+import argparse
+import numpy as np
+from polygon_store import load_polygons
+from knot_tables import superbridge_index_bounds, knot_string_to_tuple
+from stick_geometry import random_unit_vectors
+
+
+#the signs of two edges' heights taken in the four regions around a point where their great circles cross
+QUADRANT_SIGNS = np.array([[1, 1], [1, -1], [-1, 1], [-1, -1]], dtype=np.int8)
+
+
+def count_local_maxima(signs):
+    #signs (..., edges) of the height change along each edge; vertex k is a local maximum when edge k-1
+    #rises into it and edge k falls away from it
+    return np.sum((np.roll(signs, 1, axis=-1) > 0) & (signs < 0), axis=-1)
+
+
+def batch_bridge_counts(polygons, directions):
+    #polygons has shape (batch, edges, 3) and directions (batch, directions, 3). Returns the number of local
+    #maxima of the height function in each direction, shape (batch, directions)
+    polygons = np.asarray(polygons, dtype=np.float64)
+    edges = np.roll(polygons, -1, axis=1) - polygons
+    return count_local_maxima(np.sign(np.einsum('bkd,bnd->bkn', directions, edges)))
+
+
+def batch_superbridge_numbers(polygons, tol=1e-9):
+    #the superbridge number of each polygon of a batch (batch, edges, 3): the largest number of local
+    #maxima of the height function over all directions.
+    #
+    #The number of maxima in direction v only depends on the signs of v.e for the edge vectors e, so
+    #it is constant on the regions into which the great circles perpendicular to the edges cut the
+    #sphere. Every region has a corner where two circles cross, at +-(e_i x e_j) normalized, so the
+    #maximum is found by counting in the four quadrants around each such crossing. Since there are as
+    #many minima as maxima, -v gives the same count as v and only +(e_i x e_j) is needed. Crossings
+    #which lie on a third great circle are counted separately by degenerate_corner_count
+    polygons = np.asarray(polygons, dtype=np.float64)
+    num_polygons, num_edges = polygons.shape[:2]
+    edges = np.roll(polygons, -1, axis=1) - polygons
+    lengths = np.linalg.norm(edges, axis=-1)
+
+    i, j = np.triu_indices(num_edges, 1)
+    corners = np.cross(edges[:, i], edges[:, j])
+    norms = np.linalg.norm(corners, axis=-1)
+    #the great circles of parallel edges coincide and don't cross
+    crossing = norms > tol * lengths[:, i] * lengths[:, j]
+    corners /= np.where(crossing, norms, 1.0)[..., np.newaxis]
+
+    heights = np.einsum('bmd,bnd->bmn', corners, edges)
+    on_circle = np.abs(heights) <= tol * lengths[:, np.newaxis, :]
+    pairs = np.arange(len(i))
+    on_circle[:, pairs, i] = False
+    on_circle[:, pairs, j] = False
+    degenerate = crossing & on_circle.any(axis=-1)
+
+    #signs in the four quadrants, shape (batch, corners, 4, edges)
+    signs = np.repeat(np.sign(heights).astype(np.int8)[:, :, np.newaxis, :], 4, axis=2)
+    signs[:, pairs, :, i] = QUADRANT_SIGNS[:, 0]
+    signs[:, pairs, :, j] = QUADRANT_SIGNS[:, 1]
+    counts = count_local_maxima(signs).max(axis=-1)
+    counts[~crossing | degenerate] = 0
+    superbridge = counts.max(axis=-1)
+
+    for b, m in zip(*np.nonzero(degenerate)):
+        superbridge[b] = max(superbridge[b], degenerate_corner_count(corners[b, m], edges[b], on_circle[b, m],
+                                                                   (i[m], j[m])))
+    return superbridge
+
+
+def degenerate_corner_count(corner, edges, on_circle, pair):
+    #the largest number of local maxima in the regions around a corner where more than two great
+    #circles cross. The circles through the corner are lines through the origin of its tangent plane,
+    #and each region around the corner is sampled on the bisector of two consecutive lines
+    through = np.flatnonzero(on_circle)
+    through = np.concatenate([through, pair])
+    helper = np.eye(3)[np.argmin(np.abs(corner))]
+    a = np.cross(corner, helper)
+    a /= np.linalg.norm(a)
+    b = np.cross(corner, a)
+
+    #the tangent of circle k at the corner is perpendicular to both the corner and e_k
+    tangents = np.cross(corner, edges[through])
+    lines = np.sort(np.arctan2(tangents.dot(b), tangents.dot(a)) % np.pi)
+    #circles of parallel edges coincide
+    lines = lines[np.concatenate([[True], np.diff(lines) > 1e-12])]
+    angles = np.concatenate([lines, lines + np.pi])
+    bisectors = (angles + np.roll(angles, -1) + np.where(np.arange(len(angles)) == len(angles) - 1, 2 * np.pi, 0)) / 2
+    samples = np.cos(bisectors)[:, np.newaxis] * a + np.sin(bisectors)[:, np.newaxis] * b
+
+    signs = np.repeat(np.sign(edges.dot(corner))[np.newaxis], len(samples), axis=0)
+    signs[:, through] = np.sign(samples.dot(edges[through].T))
+    return int(count_local_maxima(signs).max())
+
+
+def superbridge_number(vertices):
+    #batch_superbridge_numbers for a single polygon
+    return int(batch_superbridge_numbers(np.asarray(vertices)[np.newaxis])[0])
+
+
+def collection_superbridge_numbers(collection):
+    #superbridge numbers of every polygon of a polygon_store.PolygonCollection, computed a batch of
+    #polygons with the same number of edges at a time
+    numbers = np.zeros(len(collection), dtype=np.int64)
+    sticks = collection.sticks
+    for num_edges in np.unique(sticks):
+        rows = np.flatnonzero(sticks == num_edges)
+        numbers[rows] = batch_superbridge_numbers(collection.take(rows).equal_length_array())
+    return numbers
+
+
+def improves_superbridge_bound(knot_tuple, superbridge):
+    #whether a polygon of this knot type with this superbridge number lowers the table's upper bound on the
+    #superbridge index. Only prime knots through 10 crossings are in the table
+    if knot_tuple is None or len(knot_tuple) != 1:
+        return False
+    bounds = superbridge_index_bounds(knot_tuple[0][0], knot_tuple[0][1])
+    return bounds is not None and superbridge < bounds[1]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-i', '--IN', type=str, required=True, dest='IN',
+                        help="A sqlite database (mseq_knots.db or knots.db), a directory of KnotPlot files "
+                             "or a binary polygon record file written by generate_random_stick_knots.py")
+    parser.add_argument('-cd', '--CHECK_DIRECTIONS', type=int, default=0, dest='CHECK_DIRECTIONS',
+                        help="Also count the maxima in this many random directions, as a check that none "
+                             "exceeds the computed superbridge number")
+    parser.add_argument('-io', '--IMPROVEMENTS_ONLY', action='store_true', dest='IMPROVEMENTS_ONLY',
+                        help="Only list polygons which lower the upper bound of superbridge_values.csv")
+
+    args = parser.parse_args()
+
+    collection = load_polygons(args.IN)
+    numbers = collection_superbridge_numbers(collection)
+    knots = collection.columns.get('knot', collection.identifiers)
+
+    if args.CHECK_DIRECTIONS:
+        random_state = np.random.RandomState(0)
+        for k in range(len(collection)):
+            polygon = np.asarray(collection.polygon(k))[np.newaxis]
+            directions = random_unit_vectors(random_state, args.CHECK_DIRECTIONS)[np.newaxis]
+            sampled = batch_bridge_counts(polygon, directions).max()
+            if sampled > numbers[k]:
+                print("Check failed: %s has %d maxima in a sampled direction, more than %d" %
+                      (collection.identifiers[k], sampled, numbers[k]))
+
+    print("%-16s %-10s %6s %12s %6s" % ('polygon', 'knot', 'sticks', 'superbridge', 'table'))
+    for k in range(len(collection)):
+        knot = str(knots[k])
+        bounds = None
+        knot_tuple = knot_string_to_tuple(knot)
+        if knot_tuple is not None and len(knot_tuple) == 1:
+            bounds = superbridge_index_bounds(knot_tuple[0][0], knot_tuple[0][1])
+        improves = improves_superbridge_bound(knot_tuple, numbers[k])
+        if args.IMPROVEMENTS_ONLY and not improves:
+            continue
+        table = '' if bounds is None else ('%d' % bounds[0] if bounds[0] == bounds[1] else '[%d,%d]' % bounds)
+        print("%-16s %-10s %6d %12d %6s%s" % (collection.identifiers[k], knot, collection.sticks[k], numbers[k],
+                                             table, '  IMPROVES' if improves else ''))
@@ -0,0 +1,195 @@
+import os
+import json
+import random
+import argparse
+import numpy as np
+from seeds import derive_seed
+from knot_counts import KnotCountAggregator
+from generate_stick_knots_batch import batch_command, BatchPool
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument('-ne', '--NUMBER_OF_EDGES', type=int, nargs='+', required=True, dest='NUMBER_OF_EDGES',
+                    help="The edge counts to sweep over")
+parser.add_argument('-cr', '--CONFINEMENT_RADIUS', type=float, nargs='+', dest='CONFINEMENT_RADIUS',
+                    help="The confinement radii to sweep over")
+parser.add_argument('-crr', '--CONFINEMENT_RADIUS_RANGE', type=float, nargs=3, dest='CONFINEMENT_RADIUS_RANGE',
+                    metavar=('START', 'STOP', 'NUMBER'),
+                    help="Sweep over NUMBER evenly spaced confinement radii from START to STOP, instead of -cr")
+parser.add_argument('-nb', '--NUMBER_OF_BATCHES', type=int, required=True, dest='NUMBER_OF_BATCHES',
+                    help="The total number of batches to run, shared out between the grid cells")
+parser.add_argument('-b', '--BATCH_SIZE', type=int, default=1000000, dest='BATCH_SIZE',
+                    help="The number of polygons to generate in each batch")
+parser.add_argument('-s', '--BATCH_MAX_SECONDS', type=int, default=86400, dest='BATCH_MAX_SECONDS',
+                    help="The maximum time in seconds to run each batch, by default one day")
+parser.add_argument('-v', '--VERBOSITY', type=int, default=2, dest='VERBOSITY',
+                    help="Verbosity level. At least 2 is needed to record EQUIV rows")
+parser.add_argument('-ts', '--TARGET_STATUSES', type=str, nargs='+', default=['BEST', 'EQUIV'],
+                    dest='TARGET_STATUSES',
+                    help="The recorded row statuses which count towards the yield of a grid cell")
+parser.add_argument('-sb', '--SUPERBRIDGE', action='store_true', dest='SUPERBRIDGE',
+                    help="Also write polygons which lower an upper bound of superbridge_index/superbridge_values.csv. "
+                         "With -ts SBRIDGE, cells are then scheduled by how many such polygons they produce")
+parser.add_argument('-mf', '--MIN_FRACTION', type=float, default=0.05, dest='MIN_FRACTION',
+                    help="The smallest fraction of batches any grid cell is given, so that no cell is abandoned")
+parser.add_argument('-c', '--CSV_DIRECTORY', type=str, dest='CSV_DIRECTORY',
+                    help="The directory to output csv results")
+parser.add_argument('-k', '--KNOT_COUNTS_DIRECTORY', type=str, dest='KNOT_COUNTS_DIRECTORY',
+                    help="The directory to output knot frequency counts as pickled python objects")
+parser.add_argument('-p', '--MAX_PROCESSES', type=int, default=4, dest='MAX_PROCESSES',
+                    help="Maximum number of concurrent processes")
+parser.add_argument('-rs', '--MASTER_SEED', type=int, dest='MASTER_SEED',
+                    help="The seed from which the seed of every batch is derived, from its grid cell and its "
+                         "number within the cell. By default, a random seed, which is printed")
+parser.add_argument('-m', '--MERGED_COUNTS_DIRECTORY', type=str, dest='MERGED_COUNTS_DIRECTORY',
+                    help="The directory to write knot frequency counts merged over all batches, as csv tables")
+parser.add_argument('-mb', '--MERGE_CHECKPOINT_BATCHES', type=int, default=10, dest='MERGE_CHECKPOINT_BATCHES',
+                    help="Write out the merged knot frequency counts after this many batches complete")
+parser.add_argument('-so', '--STATE_OUT', type=str, dest='STATE_OUT',
+                    help="The path to write the per-cell yields and allocation to as json after every batch")
+
+
+class SweepScheduler(object):
+    """Shares batches out between the cells of a grid of edge counts and confinement radii.
+
+    The yield of a cell is the number of target rows (BEST or EQUIV, say) its
+    batches have recorded per CPU-hour. Each cell is given a share of the
+    batches proportional to its yield, but never less than `min_fraction`, and
+    the next batch goes to the cell furthest behind its share. Yields are
+    smoothed as if every cell had already run one batch of typical length
+    recording one target row, so unexplored cells look promising and a cell is
+    not written off after a single unlucky batch.
+    """
+
+    def __init__(self, cells, target_statuses, min_fraction=0.05):
+        self.cells = list(cells)
+        self.target_statuses = set(target_statuses)
+        self.min_fraction = min(min_fraction, 1.0 / len(self.cells))
+        self.submitted = dict((cell, 0) for cell in self.cells)
+        self.completed = dict((cell, 0) for cell in self.cells)
+        self.failed = dict((cell, 0) for cell in self.cells)
+        self.targets = dict((cell, 0) for cell in self.cells)
+        self.seconds = dict((cell, 0.0) for cell in self.cells)
+        self.batch_seconds = []
+
+    def add(self, cell, status_counts, seconds):
+        #seconds is None for a batch whose worker died
+        if seconds is not None:
+            self.batch_seconds.append(seconds)
+            self.seconds[cell] += seconds
+        if status_counts is None:
+            self.failed[cell] += 1
+            return
+        self.completed[cell] += 1
+        self.targets[cell] += sum(count for status, count in status_counts.items()
+                                  if status in self.target_statuses)
+
+    def yields(self):
+        #smoothed target rows per CPU-hour of each cell
+        prior_seconds = np.median(self.batch_seconds) if self.batch_seconds else 1.0
+        return dict((cell, 3600.0 * (self.targets[cell] + 1) / (self.seconds[cell] + prior_seconds))
+                    for cell in self.cells)
+
+    def shares(self):
+        yields = self.yields()
+        total = sum(yields.values())
+        spare = 1.0 - self.min_fraction * len(self.cells)
+        return dict((cell, self.min_fraction + spare * yields[cell] / total) for cell in self.cells)
+
+    def next_cell(self):
+        shares = self.shares()
+        submitted = sum(self.submitted.values()) + 1
+        cell = max(self.cells, key=lambda c: shares[c] * submitted - self.submitted[c])
+        self.submitted[cell] += 1
+        return cell
+
+    def state(self):
+        yields, shares = self.yields(), self.shares()
+        return [{'num_edges': cell[0], 'confinement_radius': cell[1],
+                 'submitted': self.submitted[cell], 'completed': self.completed[cell], 'failed': self.failed[cell],
+                 'targets': self.targets[cell], 'cpu_hours': self.seconds[cell] / 3600.0,
+                 'targets_per_cpu_hour': yields[cell], 'share': shares[cell]} for cell in self.cells]
+
+    def write_state(self, path):
+        with open(path + '.tmp', 'w') as fout:
+            json.dump(self.state(), fout, indent=2, sort_keys=True)
+        os.rename(path + '.tmp', path)
+
+
+def cell_args(args, cell):
+    #the batch script's arguments for a batch of this grid cell
+    cell_args = argparse.Namespace(**vars(args))
+    cell_args.NUMBER_OF_EDGES, cell_args.CONFINEMENT_RADIUS = cell
+    return cell_args
+
+
+def cell_seed(master_seed, cell, number):
+    #the seed of the number-th batch of a grid cell, whichever order the batches run in
+    return derive_seed(master_seed, 'sweep', cell[0], '%.6g' % cell[1], number)
+
+
+def run_sweep(args, scheduler, aggregator=None):
+    #keeps MAX_PROCESSES batches running, choosing the cell of each new batch from the yields so far
+    pool = BatchPool(args.MAX_PROCESSES)
+    completed = 0
+
+    def submit():
+        cell = scheduler.next_cell()
+        pool.submit(batch_command(cell_args(args, cell), cell_seed(args.MASTER_SEED, cell, scheduler.submitted[cell])),
+                    cell)
+
+    try:
+        for i in range(min(args.MAX_PROCESSES, args.NUMBER_OF_BATCHES)):
+            submit()
+        while len(pool):
+            for cell, result in pool.finished():
+                scheduler.add(cell, result['status_counts'], result['seconds'])
+                if sum(scheduler.submitted.values()) < args.NUMBER_OF_BATCHES:
+                    submit()
+
+                if result['error']:
+                    print("Batch failed: \"%s\"\n%s" % (' '.join(result['command']), result['error']))
+                else:
+                    completed += 1
+                    print("Batch complete: \"%s\" (%d target rows in %.0f s)" % (
+                        ' '.join(result['command']),
+                        sum(result['status_counts'].get(status, 0) for status in scheduler.target_statuses),
+                        result['seconds']))
+                    if aggregator is not None:
+                        aggregator.add(result['num_edges'], result['confinement_radius'], result['knot_counter'])
+                        if args.MERGED_COUNTS_DIRECTORY and (completed % args.MERGE_CHECKPOINT_BATCHES == 0):
+                            aggregator.write_frequency_tables(args.MERGED_COUNTS_DIRECTORY)
+                if args.STATE_OUT:
+                    scheduler.write_state(args.STATE_OUT)
+    finally:
+        pool.close()
+        if aggregator is not None and args.MERGED_COUNTS_DIRECTORY:
+            aggregator.write_frequency_tables(args.MERGED_COUNTS_DIRECTORY)
+
+
+if __name__ == "__main__":
+
+    args = parser.parse_args()
+
+    if args.CONFINEMENT_RADIUS_RANGE:
+        start, stop, number = args.CONFINEMENT_RADIUS_RANGE
+        radii = [float('%.6g' % r) for r in np.linspace(start, stop, int(number))]
+    elif args.CONFINEMENT_RADIUS:
+        radii = args.CONFINEMENT_RADIUS
+    else:
+        parser.error("One of -cr or -crr is required")
+
+    if not args.MASTER_SEED:
+        args.MASTER_SEED = int(random.getrandbits(64))
+    print("Master seed: %d" % args.MASTER_SEED)
+
+    cells = [(num_edges, radius) for num_edges in args.NUMBER_OF_EDGES for radius in radii]
+    scheduler = SweepScheduler(cells, args.TARGET_STATUSES, args.MIN_FRACTION)
+    run_sweep(args, scheduler, KnotCountAggregator())
+
+    print("\nSweep complete!")
+    print("%8s %8s %10s %10s %10s %14s" % ('edges', 'radius', 'batches', 'targets', 'CPU hours', 'targets/hour'))
+    for row in scheduler.state():
+        print("%8d %8g %10d %10d %10.2f %14.2f" % (row['num_edges'], row['confinement_radius'], row['completed'],
+                                                  row['targets'], row['cpu_hours'], row['targets_per_cpu_hour']))
@@ -0,0 +1,61 @@
+import pickle
+
+import pytest
+
+pytest.importorskip('libpl')
+
+from generate_random_stick_knots import parse_args, run_generation, StickKnotGenerator
+
+
+class Interrupted(Exception):
+    pass
+
+
+def generation_args(directory):
+    #polygons needing pyknotid are spooled, so the run only depends on plCurve
+    return parse_args(['-ne', '8', '-cr', '1.5', '-mi', '500', '-ci', '100', '-v', '3', '-rs', '7',
+                       '-cp', str(directory / 'run.ckpt'), '-csv', str(directory / 'run.csv'),
+                       '-sp', str(directory / 'run.spool')])
+
+
+def outputs(directory):
+    files = []
+    for name in ('run.csv', 'run.spool'):
+        with open(str(directory / name), 'rb') as fin:
+            files.append(fin.read())
+    return files
+
+
+def test_resumed_run_matches_uninterrupted_run(tmp_path, monkeypatch):
+    uninterrupted = tmp_path / 'uninterrupted'
+    uninterrupted.mkdir()
+    expected_counts = run_generation(generation_args(uninterrupted)).knot_counter
+
+    interrupted = tmp_path / 'interrupted'
+    interrupted.mkdir()
+    save_checkpoint = StickKnotGenerator.save_checkpoint
+    saved = []
+
+    def save_then_die(self, complete=False):
+        save_checkpoint(self, complete)
+        saved.append(self.segment)
+        if len(saved) == 2:
+            raise Interrupted()
+
+    monkeypatch.setattr(StickKnotGenerator, 'save_checkpoint', save_then_die)
+    with pytest.raises(Interrupted):
+        run_generation(generation_args(interrupted))
+    monkeypatch.setattr(StickKnotGenerator, 'save_checkpoint', save_checkpoint)
+
+    with open(str(interrupted / 'run.ckpt'), 'rb') as fin:
+        assert pickle.load(fin)['segment'] == 2
+    assert run_generation(generation_args(interrupted)).knot_counter == expected_counts
+    assert outputs(interrupted) == outputs(uninterrupted)
+
+
+def test_checkpoint_parameters_must_match(tmp_path):
+    run_generation(generation_args(tmp_path))
+    args = generation_args(tmp_path)
+    args.VERBOSITY = 2
+    with pytest.raises(ValueError):
+        StickKnotGenerator(args)
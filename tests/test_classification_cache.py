@@ -0,0 +1,71 @@
+import multiprocessing
+
+from identify_knot import ClassificationCache, Disambiguator
+
+
+def report_caches(settings, results):
+    #runs in a spawned process, which starts with the module's caches empty and disabled
+    import identify_knot
+    identify_knot.configure_caches(**settings)
+    results.put((identify_knot.classification_cache.get('key'), identify_knot.classification_cache.maxsize,
+                 identify_knot.homfly_index.enabled, identify_knot.disambiguator.enabled,
+                 identify_knot.disambiguator.stages))
+
+
+def test_lru_eviction():
+    cache = ClassificationCache(maxsize=2)
+    cache.put('a', '3_1')
+    cache.put('b', '4_1')
+    assert cache.get('a') == (True, '3_1')
+    cache.put('c', '5_1')
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+
+
+def test_new_items_are_handed_over_once(tmp_path):
+    path = str(tmp_path / 'cache.pkl')
+    cache = ClassificationCache(path=path)
+    cache.put('loaded', '3_1')
+    cache.save()
+
+    #a worker starts from the saved cache and only hands back what it learned itself
+    worker = ClassificationCache(path=path)
+    assert worker.take_new_items() == []
+    worker.put('learned', ['5_2', '6_1'])
+    assert worker.take_new_items() == [('learned', ['5_2', '6_1'])]
+    assert worker.take_new_items() == []
+
+    cache.merge([('learned', ['5_2', '6_1'])])
+    assert cache.get('learned') == (True, ['5_2', '6_1'])
+
+
+def test_evicted_items_are_not_handed_over():
+    cache = ClassificationCache(maxsize=1)
+    cache.put('a', '3_1')
+    cache.put('b', '4_1')
+    assert cache.take_new_items() == [('b', '4_1')]
+
+
+def test_disambiguator_merge_combines_stages():
+    disambiguator = Disambiguator()
+    key = ('10_129', '8_8')
+    disambiguator.put(key, {'alexander': {'8_8': 1.0, '10_129': 1.0}})
+    disambiguator.merge([(key, {'volume': {'8_8': 6.0, '10_129': 6.0}})])
+    assert sorted(disambiguator.get(key)[1]) == ['alexander', 'volume']
+
+
+def test_spawned_worker_loads_the_caches_it_is_handed(tmp_path):
+    path = str(tmp_path / 'cache.pkl')
+    cache = ClassificationCache(path=path)
+    cache.put('key', '3_1')
+    cache.save()
+    settings = {'classification_cache_path': path, 'classification_cache_size': 50,
+                'homfly_index_path': str(tmp_path / 'homfly.pkl'), 'disambiguation_cache_path': None,
+                'disambiguation_stages': ['volume']}
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=report_caches, args=(settings, results))
+    process.start()
+    reported = results.get(timeout=60)
+    process.join()
+    assert reported == ((True, '3_1'), 50, True, False, ['volume'])
@@ -0,0 +1,48 @@
+import os
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import identify_knot
+from identify_knot import classify_polygons, iter_generation_csv_polygons
+from result_writer import ResultWriter
+
+
+NUM_EDGES = 4
+
+
+def fake_classify(item):
+    #stands in for timed_classify in the workers; the polygon labelled "crash" kills its worker outright
+    label, vertices = item
+    if label == 'crash':
+        os._exit(3)
+    return label, 'n=%d' % len(vertices), 0.0
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason="the workers only see the patched classifier when forked")
+def test_dead_worker_gives_an_error_and_the_rest_finish(monkeypatch):
+    monkeypatch.setattr(identify_knot, 'timed_classify', fake_classify)
+    items = [('p%d' % i, np.zeros((i + 3, 3))) for i in range(10)]
+    items.insert(4, ('crash', np.zeros((4, 3))))
+    results = dict((label, identification) for label, identification, seconds in classify_polygons(items, 2))
+    assert sorted(results) == sorted(label for label, vertices in items)
+    assert results['crash'].startswith('ERROR: the worker process died')
+    assert results['p5'] == 'n=8'
+
+
+def test_csv_rows_without_string_repr_are_read_from_the_binary_file(tmp_path, capsys):
+    csv_path, binary_path = str(tmp_path / 'out.csv'), str(tmp_path / 'out.bin')
+    writer = ResultWriter(csv_path, chunk_size=2, binary_out=binary_path, num_edges=NUM_EDGES)
+    for i in range(3):
+        writer.record(i, 12345, 'BEST', '3_1', NUM_EDGES, 1.5, '', vertices=np.full((NUM_EDGES, 3), float(i)),
+                      label='3_1')
+    writer.close()
+
+    polygons = list(iter_generation_csv_polygons(csv_path, binary_path=binary_path))
+    assert [label for label, vertices in polygons] == ['12345_0', '12345_1', '12345_2']
+    assert np.array_equal(polygons[2][1], np.full((NUM_EDGES, 3), 2.0))
+
+    assert list(iter_generation_csv_polygons(csv_path)) == []
+    assert 'Skipped 3 rows' in capsys.readouterr().err
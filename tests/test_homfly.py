@@ -0,0 +1,80 @@
+import identify_knot
+from identify_knot import parse_plcurve_homfly, substitute_homfly_imaginary, plcurve_homfly_to_terms, \
+    homfly_terms_key, HomflyIndex
+
+
+class FakeCatalogueKnot(object):
+    def __init__(self, identifier):
+        self.identifier = identifier
+
+
+def test_parse_trefoil():
+    assert parse_plcurve_homfly("2a^{2} - a^{4} + a^{2}z^{2}") == {(2, 0): 2, (4, 0): -1, (2, 2): 1}
+
+
+def test_parse_negative_exponents_and_unit_coefficients():
+    assert parse_plcurve_homfly("a^{-2} - 1 + a^{2} - z^{2}") == {(-2, 0): 1, (0, 0): -1, (2, 0): 1, (0, 2): -1}
+    assert parse_plcurve_homfly("a^-2z^2") == {(-2, 2): 1}
+
+
+def test_parse_collects_repeated_monomials():
+    assert parse_plcurve_homfly("a^{2} + 3a^{2} - z") == {(2, 0): 4, (0, 1): -1}
+    #terms which cancel are dropped, and nothing left means no polynomial
+    assert parse_plcurve_homfly("a^{2} - a^{2}") is None
+
+
+def test_parse_rejects_malformed_output():
+    assert parse_plcurve_homfly("2a^{2} 3z") is None
+    assert parse_plcurve_homfly("2a^{2} + x") is None
+    assert parse_plcurve_homfly("") is None
+
+
+def test_imaginary_substitution():
+    #a -> ia, z -> iz multiplies a term by i to its total degree
+    assert substitute_homfly_imaginary({(2, 0): 2, (4, 0): -1, (2, 2): 1}) == {(2, 0): -2, (4, 0): -1, (2, 2): 1}
+    #links can have odd degree terms, which have no integer form
+    assert substitute_homfly_imaginary({(1, 0): 1}) is None
+
+
+def test_plcurve_homfly_to_terms():
+    assert plcurve_homfly_to_terms(None) is None
+    assert plcurve_homfly_to_terms("1") == {(0, 0): 1}
+    assert plcurve_homfly_to_terms("2a^{2} - a^{4} + a^{2}z^{2}") == {(2, 0): -2, (4, 0): -1, (2, 2): 1}
+
+
+def test_terms_key_is_order_independent():
+    assert homfly_terms_key({(2, 0): 1, (0, 2): -1}) == homfly_terms_key({(0, 2): -1, (2, 0): 1})
+
+
+def test_homfly_index_looks_each_polynomial_up_once(monkeypatch):
+    lookups = []
+
+    def from_invariants(homfly):
+        lookups.append(homfly)
+        return [FakeCatalogueKnot(name) for name in {'trefoil': ['3_1'], 'shared': ['5_1', '10_132']}[homfly]]
+
+    monkeypatch.setattr(identify_knot, 'from_invariants', from_invariants)
+    monkeypatch.setattr(identify_knot, 'homfly_terms_to_sympy',
+                        lambda terms: 'trefoil' if terms == {(2, 0): -2, (4, 0): -1, (2, 2): 1} else 'shared')
+
+    index = HomflyIndex(enabled=True)
+    trefoil = plcurve_homfly_to_terms("2a^{2} - a^{4} + a^{2}z^{2}")
+    shared = {(4, 0): 1, (6, 0): 1}
+    assert index.candidates(trefoil) == ['3_1']
+    assert index.candidates(shared) == ['5_1', '10_132']
+    assert index.candidates(dict(trefoil)) == ['3_1']
+    assert lookups == ['trefoil', 'shared']
+    assert (index.hits, index.misses) == (1, 2)
+
+
+def test_homfly_index_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(identify_knot, 'from_invariants', lambda homfly: [FakeCatalogueKnot('4_1')])
+    monkeypatch.setattr(identify_knot, 'homfly_terms_to_sympy', lambda terms: None)
+    path = str(tmp_path / 'homfly.pkl')
+    index = HomflyIndex(path=path)
+    terms = {(-2, 0): 1, (0, 0): -1, (2, 0): 1, (0, 2): -1}
+    index.candidates(terms)
+    index.save()
+
+    monkeypatch.setattr(identify_knot, 'from_invariants', None)
+    assert HomflyIndex(path=path).candidates(terms) == ['4_1']
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from knot_tables import MSEQ_KNOTS_DB, STICK_NUMBER_UPPER_BOUNDS_CSV, load_equilateral_stick_numbers, \
+    equilateral_stick_number, stick_number_upper_bound, knot_tuple_to_string, knot_string_to_tuple
+
+
+def test_equilateral_stick_numbers_from_shipped_tables():
+    if not os.path.exists(MSEQ_KNOTS_DB):
+        pytest.skip("stick_number/mseq_knots.db is not available")
+    #9_29 has an upper bound of 9 but its smallest known equilateral polygon has 10 sticks; 10_83 is
+    #realized with 10 equilateral sticks
+    assert stick_number_upper_bound(9, 29) == 9
+    assert equilateral_stick_number(9, 29) == 10
+    assert stick_number_upper_bound(10, 83) == 10
+    assert equilateral_stick_number(10, 83) == 10
+    assert equilateral_stick_number(3, 1) == 6
+    assert equilateral_stick_number(11, 1) is None
+
+
+def test_csv_value_is_used_without_the_database():
+    table = load_equilateral_stick_numbers(STICK_NUMBER_UPPER_BOUNDS_CSV, None)
+    assert table[9, 29] == 9
+    assert table[10, 83] == 10
+
+
+def test_knot_label_round_trip():
+    for label in ('3_1', '3_1 # 4_1', 'K11n34', 'K12a1'):
+        assert knot_tuple_to_string(knot_string_to_tuple(label)) == label
+    assert knot_string_to_tuple('not a knot') is None
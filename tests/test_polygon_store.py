@@ -0,0 +1,74 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from knot_tables import MSEQ_KNOTS_DB
+from polygon_store import load_polygons, load_database, load_directory, write_knotplot_files, sidecar_path
+
+
+@pytest.fixture(scope='module')
+def database():
+    if not os.path.exists(MSEQ_KNOTS_DB):
+        pytest.skip("stick_number/mseq_knots.db is not available")
+    return load_database(MSEQ_KNOTS_DB)
+
+
+def eval_polygons(db_path):
+    #the parsing shown in stick_number/README.md, which the bulk loader replaces
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT identifier, vertices FROM mseq_knots ORDER BY pkey;").fetchall()
+    finally:
+        conn.close()
+    return [(identifier, np.array(eval(vertices), dtype=np.float64)) for identifier, vertices in rows]
+
+
+def test_database_matches_eval(database):
+    expected = eval_polygons(MSEQ_KNOTS_DB)
+    assert len(database) == len(expected)
+    for (identifier, polygon), (expected_identifier, expected_polygon) in zip(database, expected):
+        assert identifier == expected_identifier
+        assert np.array_equal(polygon, expected_polygon)
+    assert np.array_equal(database.sticks, [len(polygon) for identifier, polygon in expected])
+
+
+def test_take_and_equal_length_array(database):
+    rows = np.flatnonzero(database.sticks == 8)[:5]
+    taken = database.take(rows)
+    assert list(taken.identifiers) == list(database.identifiers[rows])
+    stacked = taken.equal_length_array()
+    assert stacked.shape == (5, 8, 3)
+    for i, row in enumerate(rows):
+        assert np.array_equal(stacked[i], database.polygon(row))
+    with pytest.raises(ValueError):
+        database.take([0, int(np.flatnonzero(database.sticks != database.sticks[0])[0])]).equal_length_array()
+
+
+def test_knotplot_directory_matches_loadtxt(database, tmp_path):
+    directory = str(tmp_path / 'knots')
+    small = database.select(crossing_number=[3, 4, 5])
+    write_knotplot_files(small, directory)
+    loaded = load_directory(directory)
+    assert sorted(loaded.identifiers) == sorted(small.identifiers)
+    for identifier, polygon in loaded:
+        expected = np.loadtxt(os.path.join(directory, identifier + '.txt'), delimiter='\t')
+        assert np.array_equal(polygon, expected)
+        assert np.array_equal(polygon, small[identifier])
+    assert list(loaded.crossing_numbers) == [int(x.split('_')[0]) for x in loaded.identifiers]
+
+
+def test_sidecar_goes_stale_when_a_file_inside_changes(database, tmp_path):
+    directory = str(tmp_path / 'knots')
+    write_knotplot_files(database.select(crossing_number=3), directory)
+    load_directory(directory).save(sidecar_path(directory))
+    #backdate the knot files, then edit one in place, which leaves the directory's own mtime alone
+    for name in os.listdir(directory):
+        os.utime(os.path.join(directory, name), (0, 0))
+    os.utime(directory, (0, 0))
+    assert np.array_equal(load_polygons(directory)['3_1'], database['3_1'])
+
+    np.savetxt(os.path.join(directory, '3_1.txt'), database['3_1'] * 2, delimiter='\t')
+    os.utime(directory, (0, 0))
+    assert np.array_equal(load_polygons(directory)['3_1'], database['3_1'] * 2)
@@ -0,0 +1,69 @@
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import reduce_sticks
+from reduce_sticks import reduce_polygon, reduce_item, classify_polygon
+from knot_tables import MSEQ_KNOTS_DB
+from polygon_store import load_polygons
+from stick_geometry import is_certified_unknot, random_unit_vectors
+
+
+@pytest.fixture(scope='module')
+def minimal_polygons():
+    if not os.path.exists(MSEQ_KNOTS_DB):
+        pytest.skip("stick_number/mseq_knots.db is not available")
+    return load_polygons(MSEQ_KNOTS_DB)
+
+
+def subdivided(vertices, random_state):
+    #the polygon with a vertex added near the middle of each edge, so that it has sticks to lose
+    vertices = np.asarray(vertices, dtype=np.float64)
+    middles = (vertices + np.roll(vertices, -1, axis=0)) / 2 + random_state.normal(scale=0.02, size=vertices.shape)
+    polygon = np.empty((2 * len(vertices), 3))
+    polygon[0::2], polygon[1::2] = vertices, middles
+    return polygon
+
+
+@pytest.mark.parametrize('name', ['3_1', '4_1'])
+def test_reduction_keeps_the_knot_type(minimal_polygons, name):
+    pytest.importorskip('libpl')
+    minimal = np.asarray(minimal_polygons[name])
+    polygon = subdivided(minimal, np.random.RandomState(0))
+    knot = classify_polygon(polygon)
+    assert knot == classify_polygon(minimal)
+
+    reduced, counter = reduce_polygon(polygon, knot, np.random.RandomState(1), max_moves=300)
+    assert len(minimal) <= len(reduced) < len(polygon)
+    assert counter['removed'] == len(polygon) - len(reduced)
+    assert classify_polygon(reduced) == knot
+
+
+def test_geometric_moves_alone_keep_the_polygon_knotted(minimal_polygons, monkeypatch):
+    #with the classification check disabled, only the intersection tests stand between the trefoil and
+    #a change of knot type
+    monkeypatch.setattr(reduce_sticks, 'classify_polygon', lambda vertices: 'K')
+    polygon = subdivided(minimal_polygons['3_1'], np.random.RandomState(2))
+    reduced, counter = reduce_polygon(polygon, 'K', np.random.RandomState(3), max_moves=300)
+    assert len(reduced) >= 6
+    assert not is_certified_unknot(reduced, random_unit_vectors(np.random.RandomState(4), 200))
+
+
+def test_shared_homfly_is_rechecked_with_pyknotid(monkeypatch):
+    calls = []
+    monkeypatch.setattr(reduce_sticks, 'plcurve_classify', lambda vertices: '5_1')
+    monkeypatch.setattr(reduce_sticks, 'pyknotid_classify', lambda vertices: calls.append(1) or ['5_1', '10_132'])
+    vertices = np.random.RandomState(5).normal(size=(10, 3))
+    label, knot, sticks, reduced, counter, seconds, learned = reduce_item(('x', vertices, 6, {'max_moves': 10}))
+    #pyknotid could not choose, so the polygon is left alone
+    assert calls and knot == ['5_1', '10_132']
+    assert sticks == len(reduced) == 10 and counter == Counter()
+    np.testing.assert_array_equal(reduced, vertices)
+
+
+def test_unique_homfly_is_taken_from_plcurve(monkeypatch):
+    monkeypatch.setattr(reduce_sticks, 'plcurve_classify', lambda vertices: '3_1')
+    monkeypatch.setattr(reduce_sticks, 'pyknotid_classify', None)
+    assert classify_polygon(np.zeros((6, 3))) == '3_1'
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('pandas')
+
+from result_writer import ResultWriter
+from polygon_store import read_polygon_records
+
+
+NUM_EDGES = 4
+
+
+def record_rows(writer, rows):
+    for i in rows:
+        vertices = np.full((NUM_EDGES, 3), float(i))
+        writer.record(i, 12345, 'BEST' if i % 3 else 'WORSE', '3_1', NUM_EDGES, 1.5, 'row %d' % i,
+                      vertices=vertices, label='3_1')
+
+
+def make_writer(directory, **kwargs):
+    return ResultWriter(str(directory / 'out.csv'), chunk_size=2, binary_out=str(directory / 'out.bin'),
+                        num_edges=NUM_EDGES, **kwargs)
+
+
+def read_outputs(directory):
+    with open(str(directory / 'out.csv'), 'r') as fin:
+        csv_text = fin.read()
+    return csv_text, read_polygon_records(str(directory / 'out.bin'), mmap=False)
+
+
+def test_resume_discards_rows_after_the_checkpoint(tmp_path):
+    uninterrupted = tmp_path / 'uninterrupted'
+    uninterrupted.mkdir()
+    writer = make_writer(uninterrupted)
+    record_rows(writer, range(7))
+    writer.close()
+
+    interrupted = tmp_path / 'interrupted'
+    interrupted.mkdir()
+    writer = make_writer(interrupted)
+    record_rows(writer, range(3))
+    csv_offset, binary_offset = writer.csv_offset(), writer.binary_offset()
+    #rows recorded after the checkpoint reach the files before the run is killed
+    record_rows(writer, range(3, 5))
+    writer.flush()
+
+    writer = make_writer(interrupted, resume_offset=csv_offset, binary_resume_offset=binary_offset)
+    record_rows(writer, range(3, 7))
+    writer.close()
+
+    expected_csv, expected_records = read_outputs(uninterrupted)
+    csv_text, records = read_outputs(interrupted)
+    assert csv_text == expected_csv
+    assert csv_text.count('iteration') == 1
+    np.testing.assert_array_equal(records, expected_records)
+    assert list(records['iteration']) == list(range(7))
+
+
+def test_offsets_include_buffered_rows(tmp_path):
+    writer = make_writer(tmp_path)
+    assert writer.csv_offset() == 0
+    record_rows(writer, range(1))
+    offset = writer.csv_offset()
+    assert offset > 0 and writer.rows_written == 1
+    writer.close()
+    with open(str(tmp_path / 'out.csv'), 'r') as fin:
+        assert len(fin.read()) == offset
+
+
+def test_new_run_starts_an_empty_file(tmp_path):
+    with open(str(tmp_path / 'out.csv'), 'w') as fout:
+        fout.write('left over from an earlier run\n')
+    writer = make_writer(tmp_path)
+    writer.close()
+    csv_text, records = read_outputs(tmp_path)
+    assert csv_text.splitlines() == ['iteration,random_seed,is_best,knot,num_edges,confinement_radius,string_repr']
+    assert len(records) == 0
+
+
+def test_labels_too_long_for_the_records_are_refused(tmp_path):
+    writer = make_writer(tmp_path, binary_label_width=16)
+    candidates = "['K12n123', 'K12n456', 'K12n789']"
+    with pytest.raises(ValueError):
+        writer.record(0, 12345, 'UNCL', candidates, NUM_EDGES, 1.5, '', vertices=np.zeros((NUM_EDGES, 3)))
+    writer.record(1, 12345, 'BEST', '3_1 # 3_1', NUM_EDGES, 1.5, '', vertices=np.zeros((NUM_EDGES, 3)))
+    writer.close()
+    csv_text, records = read_outputs(tmp_path)
+    assert [x.decode('ascii') for x in records['knot']] == ['3_1 # 3_1']
@@ -0,0 +1,83 @@
+from seeds import derive_seed
+from generate_stick_knots_batch import parser, ShardManifest, MANIFEST_PARAMETERS, option_value
+
+
+MASTER_SEED = 2020
+
+
+def batch_args(total, batch_size, directory='out'):
+    return parser.parse_args(['-ne', '10', '-t', str(total), '-b', str(batch_size), '-c', directory,
+                              '-k', directory])
+
+
+def new_manifest(args, path=None):
+    parameters = dict((name, getattr(args, name)) for name in MANIFEST_PARAMETERS)
+    manifest = ShardManifest(MASTER_SEED, parameters, path=path)
+    manifest.extend(args, args.TOTAL_TO_GENERATE)
+    return manifest
+
+
+def test_shards_cover_the_total():
+    manifest = new_manifest(batch_args(25, 10))
+    assert [shard['iterations'] for shard in manifest.shards] == [10, 10, 5]
+    assert [shard['shard'] for shard in manifest.shards] == [0, 1, 2]
+    assert manifest.total_iterations() == 25
+    for shard in manifest.shards:
+        assert shard['seed'] == derive_seed(MASTER_SEED, 'shard', shard['shard'])
+        assert option_value(shard['command'], '-rs') == str(shard['seed'])
+        assert option_value(shard['command'], '-mi') == str(shard['iterations'])
+        assert shard['csv'] == 'out/10_%d.csv' % shard['seed']
+        assert shard['status'] == 'pending'
+
+
+def test_extension_keeps_existing_shards(tmp_path):
+    path = str(tmp_path / 'manifest.json')
+    manifest = new_manifest(batch_args(25, 10), path)
+    manifest.save()
+    first = [dict(shard) for shard in manifest.shards]
+
+    #a larger total, with a new batch size which only applies to the new shards
+    extended = ShardManifest.load(path)
+    args = batch_args(60, 20)
+    extended.extend(args, args.TOTAL_TO_GENERATE)
+    assert extended.shards[:3] == first
+    assert [shard['iterations'] for shard in extended.shards[3:]] == [20, 15]
+    assert [shard['seed'] for shard in extended.shards[3:]] == [derive_seed(MASTER_SEED, 'shard', i) for i in (3, 4)]
+
+    #the same total again adds nothing
+    extended.extend(args, args.TOTAL_TO_GENERATE)
+    assert extended.total_iterations() == 60 and len(extended.shards) == 5
+
+
+def test_same_master_seed_gives_same_shards():
+    assert new_manifest(batch_args(30, 7)).shards == new_manifest(batch_args(30, 7)).shards
+
+
+def test_results_are_recorded_and_saved(tmp_path):
+    path = str(tmp_path / 'manifest.json')
+    manifest = new_manifest(batch_args(30, 10), path)
+    commands = [shard['command'] for shard in manifest.shards]
+    manifest.record_result({'command': commands[0], 'error': None, 'skipped': False, 'seconds': 1.5})
+    manifest.record_result({'command': commands[1], 'error': 'The worker process running this batch died',
+                            'skipped': False, 'seconds': None})
+    manifest.record_result({'command': commands[2], 'error': None, 'skipped': True, 'seconds': 0.0})
+
+    loaded = ShardManifest.load(path)
+    assert [shard['status'] for shard in loaded.shards] == ['complete', 'failed', 'skipped']
+    assert loaded.shards[0]['seconds'] == 1.5
+    assert [shard['shard'] for shard in loaded.unfinished()] == [1]
+    assert loaded.master_seed == MASTER_SEED
+    assert loaded.parameters == manifest.parameters
+
+
+def test_superbridge_is_checked_against_the_manifest():
+    #a manifest made without -sb must not be run on with it, since its shards' output would differ
+    manifest = new_manifest(batch_args(30, 10))
+    args = parser.parse_args(['-ne', '10', '-t', '30', '-b', '10', '-c', 'out', '-k', 'out', '-sb'])
+    parameters = dict((name, getattr(args, name)) for name in MANIFEST_PARAMETERS)
+    assert manifest.changed_parameters(parameters) == [('SUPERBRIDGE', False, True)]
+
+    #manifests from before SUPERBRIDGE was recorded ran without it
+    del manifest.parameters['SUPERBRIDGE']
+    assert manifest.changed_parameters(dict(parameters, SUPERBRIDGE=False)) == []
+
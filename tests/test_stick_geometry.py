@@ -0,0 +1,93 @@
+import numpy as np
+
+from stick_geometry import batch_raw_crossings, raw_crossings, gauss_code_array, projection_crossing_counts, \
+    is_certified_unknot, random_unit_vectors, segments_meet_triangles, is_straight_line_isotopic, \
+    removal_blockers, vertex_moves_isotopic
+
+
+#a quadrilateral whose projection is a figure of eight: edge 0 passes over edge 2 at their midpoints
+BOWTIE = np.array([[0, 0, 0], [1, 1, 1], [1, 0, 0], [0, 1, 0]], dtype=np.float64)
+
+#a triangle with an edge (vertices 3 and 4) through the triangle at vertex 1, which blocks its removal
+PIERCED = np.array([[0, 0, 0], [1, 2, 0], [2, 0, 0], [1, 0.5, -1], [1, 0.5, 1]], dtype=np.float64)
+
+
+def trefoil(num_vertices=30):
+    #the usual trefoil curve, whose projection into the z = 0 plane is the standard three crossing diagram
+    t = np.linspace(0, 2 * np.pi, num_vertices, endpoint=False)
+    return np.stack([np.sin(t) + 2 * np.sin(2 * t), np.cos(t) - 2 * np.cos(2 * t), -np.sin(3 * t)], axis=1)
+
+
+def test_bowtie_crossing():
+    np.testing.assert_allclose(raw_crossings(BOWTIE), [[0.5, 2.5, 1, 1], [2.5, 0.5, -1, 1]])
+    np.testing.assert_array_equal(gauss_code_array(raw_crossings(BOWTIE)), [[1, 1, 1], [1, -1, 1]])
+
+
+def test_mirror_image_swaps_over_and_sign():
+    mirror = BOWTIE * [1, 1, -1]
+    np.testing.assert_allclose(raw_crossings(mirror), [[0.5, 2.5, -1, -1], [2.5, 0.5, 1, -1]])
+
+
+def test_projection_along_z_matches_default():
+    np.testing.assert_allclose(raw_crossings(trefoil(), [0, 0, 1]), raw_crossings(trefoil()))
+
+
+def test_trefoil_diagram():
+    code = gauss_code_array(raw_crossings(trefoil()))
+    #three crossings, each met once over and once under, alternating, all of the same sign
+    assert len(code) == 6
+    np.testing.assert_array_equal(code[:, 0], [1, 2, 3, 1, 2, 3])
+    np.testing.assert_array_equal(code[:, 1], [-1, 1, -1, 1, -1, 1])
+    assert abs(code[:, 2].sum()) == 6
+    assert projection_crossing_counts(trefoil(), [[0, 0, 1]])[0] == 3
+
+
+def test_batch_matches_single_polygons():
+    random_state = np.random.RandomState(0)
+    polygons = random_state.normal(size=(5, 12, 3))
+    directions = random_unit_vectors(random_state, 5)
+    for crossings, polygon, direction in zip(batch_raw_crossings(polygons, directions), polygons, directions):
+        np.testing.assert_allclose(crossings, raw_crossings(polygon, direction))
+    #a polygon with no crossings still gets its (empty) array
+    square = np.array([[0, 0, 0], [1, 0, 1], [1, 1, 0], [0, 1, 1]], dtype=np.float64)
+    assert [len(crossings) for crossings in batch_raw_crossings(np.stack([square, BOWTIE]))] == [0, 2]
+
+
+def test_certified_unknots():
+    directions = random_unit_vectors(np.random.RandomState(1), 20)
+    assert is_certified_unknot(BOWTIE, directions)
+    #every projection of a trefoil has at least three crossings
+    assert not is_certified_unknot(trefoil(), directions)
+
+
+def test_segments_meet_triangles():
+    a, b, c = np.array([0., 0, 0]), np.array([1., 0, 0]), np.array([0., 1, 0])
+    segments = np.array([[[0.25, 0.25, -1], [0.25, 0.25, 1]],
+                         [[1, 1, -1], [1, 1, 1]],
+                         [[0.25, 0.25, 0.5], [0.25, 0.25, 1]],
+                         [[-1, 0.25, 0], [1, 0.25, 0]],
+                         [[-1, 0.25, 1], [1, 0.25, 1]]])
+    meets = segments_meet_triangles(a, b, c, segments[:, 0], segments[:, 1])
+    #through the triangle, past it, short of it, in its plane, parallel to it
+    np.testing.assert_array_equal(meets, [True, False, False, True, False])
+
+
+def test_straight_line_isotopy():
+    assert is_straight_line_isotopic(trefoil(), trefoil())
+    assert is_straight_line_isotopic(trefoil(), trefoil() + 1e-3)
+    #pushing edge 0 of the bowtie down through edge 2 changes the crossing
+    assert not is_straight_line_isotopic(BOWTIE, BOWTIE - [[0, 0, 0], [0, 0, 2], [0, 0, 0], [0, 0, 0]])
+
+
+def test_removal_blockers():
+    blockers = removal_blockers(PIERCED)
+    assert blockers[1] == 1
+    #the blocking edge goes, and with it the block
+    assert removal_blockers(PIERCED[[0, 1, 2, 4]])[1] == 0
+
+
+def test_vertex_moves_isotopic():
+    moved = np.array([1, 1])
+    targets = np.array([[1, 3, 0], [1, -1, 0]], dtype=np.float64)
+    #moving vertex 1 further out is fine, pulling it back across the blocking edge is not
+    np.testing.assert_array_equal(vertex_moves_isotopic(PIERCED, moved, targets), [True, False])
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from polygon_store import load_polygons
+from knot_tables import MSEQ_KNOTS_DB, superbridge_index_bounds, knot_string_to_tuple
+from stick_geometry import random_unit_vectors
+from superbridge import superbridge_number, batch_bridge_counts, collection_superbridge_numbers, \
+    improves_superbridge_bound
+
+
+@pytest.fixture(scope='module')
+def minimal_polygons():
+    if not os.path.exists(MSEQ_KNOTS_DB):
+        pytest.skip("stick_number/mseq_knots.db is not available")
+    return load_polygons(MSEQ_KNOTS_DB)
+
+
+def test_known_small_knots(minimal_polygons):
+    #a polygon's superbridge number lies between the knot's superbridge index and half its number of
+    #sticks, which pins these down exactly
+    for name, expected in (('3_1', 3), ('4_1', 3), ('5_1', 4)):
+        assert superbridge_number(minimal_polygons[name]) == expected
+
+
+def test_within_bounds(minimal_polygons):
+    numbers = collection_superbridge_numbers(minimal_polygons)
+    for name, sticks, number in zip(minimal_polygons.identifiers, minimal_polygons.sticks, numbers):
+        assert number <= sticks // 2
+        knot_tuple = knot_string_to_tuple(name)
+        if knot_tuple is not None and len(knot_tuple) == 1 and len(knot_tuple[0]) == 2:
+            bounds = superbridge_index_bounds(knot_tuple[0][0], knot_tuple[0][1])
+            if bounds is not None:
+                assert number >= bounds[0]
+
+
+def test_no_direction_has_more_maxima(minimal_polygons):
+    directions = random_unit_vectors(np.random.RandomState(0), 500)
+    for name in ('3_1', '5_2', '6_1'):
+        vertices = np.asarray(minimal_polygons[name])
+        counts = batch_bridge_counts(vertices[np.newaxis], directions[np.newaxis])[0]
+        assert counts.max() <= superbridge_number(vertices)
+
+
+def test_planar_polygons():
+    #a convex planar polygon has one maximum in any direction not perpendicular to its plane; the regular
+    #hexagon's parallel edges also exercise the corners where several great circles cross
+    for num_edges in (3, 5, 6):
+        angles = 2 * np.pi * np.arange(num_edges) / num_edges
+        polygon = np.stack([np.cos(angles), np.sin(angles), np.zeros(num_edges)], axis=1)
+        assert superbridge_number(polygon) == 1
+
+
+def test_improves_superbridge_bound():
+    assert improves_superbridge_bound(((5, 2),), 3)
+    assert not improves_superbridge_bound(((5, 2),), 4)
+    assert not improves_superbridge_bound(((3, 1),), 3)
+    assert not improves_superbridge_bound(((3, 1), (3, 1)), 2)
+    assert not improves_superbridge_bound(None, 2)